@@ -7,6 +7,7 @@ load_dotenv()
 # Configurazioni TikTok
 TIKTOK_USERNAME = os.getenv('TIKTOK_USERNAME')
 TIKTOK_PASSWORD = os.getenv('TIKTOK_PASSWORD')
+TIKTOK_BASE_URL = os.getenv('TIKTOK_BASE_URL', 'https://www.tiktok.com')  # sito alternativo a www.tiktok.com (es. un mirror di test)
 
 # Configurazione OpenAI
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
@@ -14,6 +15,16 @@ GPT_MODEL = "gpt-4"
 
 # Configurazioni Database
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./tiktok_analyzer.db')
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'file')  # 'file' (JSON in OUTPUT_DIR) oppure 'sql'
+SNAPSHOT_COMPRESSION = os.getenv('SNAPSHOT_COMPRESSION', 'zstd')  # 'zstd' (.json.zst) oppure 'none' (.json)
+SNAPSHOT_COMPRESSION_LEVEL = int(os.getenv('SNAPSHOT_COMPRESSION_LEVEL', 3))
+PARQUET_EXPORT = os.getenv('PARQUET_EXPORT', 'true').lower() == 'true'  # copia colonnare per le analisi in PARQUET_DIR
+
+# Configurazioni coda di scraping distribuita
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 600))  # durata del lease, rinnovato dal heartbeat
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_RETRY_DELAY = int(os.getenv('JOB_RETRY_DELAY', 60))  # in secondi, moltiplicato per il numero di tentativi
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 15))  # attesa tra i controlli della coda senza job disponibili, in secondi
 
 # Configurazioni API
 API_HOST = os.getenv('API_HOST', '0.0.0.0')
@@ -24,11 +35,41 @@ API_DEBUG = bool(os.getenv('API_DEBUG', True))
 SCRAPING_INTERVAL = int(os.getenv('SCRAPING_INTERVAL', 3600))  # in secondi
 MAX_POSTS_PER_PROFILE = int(os.getenv('MAX_POSTS_PER_PROFILE', 50))
 BROWSER_HEADLESS = bool(os.getenv('BROWSER_HEADLESS', True))
+SCRAPER_CONCURRENCY = int(os.getenv('SCRAPER_CONCURRENCY', 4))  # contesti/pagine nel pool
+POST_INTERACTION_WORKERS = int(os.getenv('POST_INTERACTION_WORKERS', 4))  # pagine per profilo dedicate ai commenti
+SCRAPER_EXTRACTION_MODE = os.getenv('SCRAPER_EXTRACTION_MODE', 'dom')  # 'dom' oppure 'network'
+NETWORK_CAPTURE_TIMEOUT = float(os.getenv('NETWORK_CAPTURE_TIMEOUT', 15))  # in secondi
+INCREMENTAL_SCRAPING = os.getenv('INCREMENTAL_SCRAPING', 'false').lower() == 'true'
+INCREMENTAL_REFRESH_MAX_AGE = int(os.getenv('INCREMENTAL_REFRESH_MAX_AGE', 48 * 3600))  # età sotto cui i commenti vengono sempre riscaricati, in secondi
+STREAM_MAX_POSTS = int(os.getenv('STREAM_MAX_POSTS', 1000))
+STREAM_MAX_COMMENTS = int(os.getenv('STREAM_MAX_COMMENTS', 5000))  # per post
+STREAM_TIME_BUDGET = float(os.getenv('STREAM_TIME_BUDGET', 1800))  # in secondi
+STREAM_SCROLL_PAUSE = float(os.getenv('STREAM_SCROLL_PAUSE', 1.5))  # in secondi
+STREAM_MAX_IDLE_SCROLLS = int(os.getenv('STREAM_MAX_IDLE_SCROLLS', 3))  # scroll senza nuovi elementi prima di fermarsi
+REPLAY_MAX_POSTS = int(os.getenv('REPLAY_MAX_POSTS', 10))  # post registrati per profilo
+SESSION_MAX_AGE = int(os.getenv('SESSION_MAX_AGE', 7 * 24 * 3600))  # validità della sessione salvata, in secondi
+
+# Configurazioni filtro richieste (BLOCK_RESOURCES=false per il debug)
+BLOCK_RESOURCES = os.getenv('BLOCK_RESOURCES', 'true').lower() == 'true'
+BLOCKED_RESOURCE_TYPES = os.getenv('BLOCKED_RESOURCE_TYPES', 'image,media,font').split(',')
+BLOCKED_URL_PATTERNS = os.getenv(
+    'BLOCKED_URL_PATTERNS',
+    'google-analytics.com,googletagmanager.com,doubleclick.net,analytics.tiktok.com,mon.tiktokv.com,mcs.tiktokw.us'
+).split(',')
 
 # Configurazioni Analisi
 SENTIMENT_THRESHOLD = float(os.getenv('SENTIMENT_THRESHOLD', 0.3))
 ENGAGEMENT_RATE_THRESHOLD = float(os.getenv('ENGAGEMENT_RATE_THRESHOLD', 0.02))
 MIN_INTERACTIONS_THRESHOLD = int(os.getenv('MIN_INTERACTIONS_THRESHOLD', 5))
+SENTIMENT_WORKERS = int(os.getenv('SENTIMENT_WORKERS', 0))  # processi per il sentiment, 0 = uno per core
+SENTIMENT_BATCH_SIZE = int(os.getenv('SENTIMENT_BATCH_SIZE', 1000))  # testi inviati a un processo in una volta
+SENTIMENT_CACHE_SIZE = int(os.getenv('SENTIMENT_CACHE_SIZE', 200000))  # punteggi memorizzati per hash del testo
+SENTIMENT_ESCALATION_THRESHOLD = float(os.getenv('SENTIMENT_ESCALATION_THRESHOLD', 0.75))  # confidenza del modello locale sotto cui si chiede a GPT
+SENTIMENT_MAX_ESCALATIONS = int(os.getenv('SENTIMENT_MAX_ESCALATIONS', 0))  # testi incerti di ogni report etichettati da GPT (raggruppati e in cache), 0 per il solo modello locale
+INCREMENTAL_REPORTS = os.getenv('INCREMENTAL_REPORTS', 'false').lower() == 'true'  # aggiorna i report solo con post e commenti nuovi
+REPORT_NARRATIVE_THRESHOLD = float(os.getenv('REPORT_NARRATIVE_THRESHOLD', 0.15))  # variazione degli aggregati oltre cui GPT riscrive le analisi
+REPORT_NARRATIVE_MAX_AGE = int(os.getenv('REPORT_NARRATIVE_MAX_AGE', 7 * 24 * 3600))  # età massima delle analisi di GPT, in secondi
+REPORT_SEEN_COMMENTS_MAX_AGE = int(os.getenv('REPORT_SEEN_COMMENTS_MAX_AGE', 30 * 24 * 3600))  # commenti già contati di un post ricordati dopo la sua ultima comparsa, in secondi
 
 # Configurazioni Logging
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -37,7 +78,8 @@ LOG_FILE = 'logs/tiktok_analyzer.log'
 
 # Configurazioni Cache
 CACHE_TTL = int(os.getenv('CACHE_TTL', 3600))  # in secondi
-CACHE_TYPE = os.getenv('CACHE_TYPE', 'simple')
+CACHE_TYPE = os.getenv('CACHE_TYPE', 'simple')  # 'simple' (cache su disco in CACHE_DIR) oppure 'none'
+CACHE_MAX_SIZE_MB = int(os.getenv('CACHE_MAX_SIZE_MB', 512))  # oltre questa soglia le voci meno usate vengono rimosse
 
 # Configurazioni Security
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key')
@@ -47,12 +89,43 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # Configurazioni Rate Limiting
 RATE_LIMIT_CALLS = int(os.getenv('RATE_LIMIT_CALLS', 100))
 RATE_LIMIT_PERIOD = int(os.getenv('RATE_LIMIT_PERIOD', 3600))  # in secondi
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 5))  # navigazioni consentite in raffica
+RATE_LIMIT_BACKOFF_BASE = float(os.getenv('RATE_LIMIT_BACKOFF_BASE', 2))  # in secondi
+RATE_LIMIT_BACKOFF_MAX = float(os.getenv('RATE_LIMIT_BACKOFF_MAX', 300))  # in secondi
+RATE_LIMIT_MIN_FACTOR = float(os.getenv('RATE_LIMIT_MIN_FACTOR', 0.1))  # rate minimo rispetto a quello configurato
+RATE_LIMIT_MAX_RETRIES = int(os.getenv('RATE_LIMIT_MAX_RETRIES', 3))
+RATE_LIMIT_SLOW_RESPONSE = float(os.getenv('RATE_LIMIT_SLOW_RESPONSE', 10))  # navigazione considerata lenta, in secondi
 
 # Configurazioni AI
-AI_ANALYSIS_BATCH_SIZE = int(os.getenv('AI_ANALYSIS_BATCH_SIZE', 10))
+AI_ANALYSIS_BATCH_SIZE = int(os.getenv('AI_ANALYSIS_BATCH_SIZE', 10))  # elementi per richiesta GPT raggruppata, 1 per disattivare
+LLM_BATCH_MAX_TOKENS = int(os.getenv('LLM_BATCH_MAX_TOKENS', 6000))  # token stimati massimi del contenuto di una richiesta raggruppata
+LLM_BATCH_MAX_WAIT = float(os.getenv('LLM_BATCH_MAX_WAIT', 0.05))  # attesa di altri elementi prima dell'invio, in secondi
+MODEL_CONTEXT_TOKENS = int(os.getenv('MODEL_CONTEXT_TOKENS', 8192))  # contesto del modello GPT_MODEL
+LLM_RESPONSE_TOKENS = int(os.getenv('LLM_RESPONSE_TOKENS', 1024))  # token riservati alla risposta in ogni richiesta
+LLM_BATCH_ITEM_RESPONSE_TOKENS = int(os.getenv('LLM_BATCH_ITEM_RESPONSE_TOKENS', 256))  # risposta riservata a ogni elemento raggruppato, se il prompt non ne dichiara una propria
+LLM_CHUNK_TOKENS = int(os.getenv('LLM_CHUNK_TOKENS', 3000))  # token massimi di ogni parte di un contenuto troppo lungo
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 4))  # richieste GPT contemporanee nell'intero processo
+LLM_ANALYSIS_TIMEOUT = float(os.getenv('LLM_ANALYSIS_TIMEOUT', 120))  # tempo massimo di ogni analisi del report, in secondi
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'  # false per forzare nuove risposte
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', 7 * 24 * 3600))  # in secondi
+LLM_CACHE_MAX_SIZE_MB = int(os.getenv('LLM_CACHE_MAX_SIZE_MB', 256))
 TRENDING_TOPICS_MIN_OCCURRENCES = int(os.getenv('TRENDING_TOPICS_MIN_OCCURRENCES', 3))
 REPUTATION_RISK_THRESHOLD = float(os.getenv('REPUTATION_RISK_THRESHOLD', 0.7))
 
+# Configurazioni Trending
+TRENDING_ENABLED = os.getenv('TRENDING_ENABLED', 'true').lower() == 'true'  # aggiorna i trend a ogni snapshot salvato
+TRENDING_BUCKET_SECONDS = int(os.getenv('TRENDING_BUCKET_SECONDS', 3600))  # granularità delle finestre temporali
+TRENDING_RETENTION = int(os.getenv('TRENDING_RETENTION', 7 * 24 * 3600))  # finestra massima interrogabile, in secondi
+TRENDING_SKETCH_WIDTH = int(os.getenv('TRENDING_SKETCH_WIDTH', 2048))  # colonne del count-min sketch di ogni intervallo
+TRENDING_SKETCH_DEPTH = int(os.getenv('TRENDING_SKETCH_DEPTH', 4))  # righe (funzioni di hash) del count-min sketch
+TRENDING_CANDIDATES = int(os.getenv('TRENDING_CANDIDATES', 200))  # heavy hitter tracciati per intervallo e tipo
+TRENDING_SEEN_BITS = int(os.getenv('TRENDING_SEEN_BITS', 2 ** 23))  # bit di ogni filtro di Bloom dei contenuti già contati
+TRENDING_SEEN_GENERATIONS = int(os.getenv('TRENDING_SEEN_GENERATIONS', 7))  # filtri di Bloom ruotati nella retention
+TRENDING_SAVE_INTERVAL = float(os.getenv('TRENDING_SAVE_INTERVAL', 300))  # intervallo minimo tra due salvataggi, in secondi
+
+# Configurazioni Grafo delle interazioni
+INTERACTION_GRAPH_ENABLED = os.getenv('INTERACTION_GRAPH_ENABLED', 'true').lower() == 'true'  # aggiorna il grafo delle interazioni a ogni snapshot salvato
+
 # Configurazioni Dashboard
 DASHBOARD_UPDATE_INTERVAL = int(os.getenv('DASHBOARD_UPDATE_INTERVAL', 300))  # in secondi
 DASHBOARD_MAX_DATAPOINTS = int(os.getenv('DASHBOARD_MAX_DATAPOINTS', 1000))
@@ -62,7 +135,16 @@ INPUT_FILE_PATH = 'data/profiles.txt'
 OUTPUT_DIR = 'data/output'
 CACHE_DIR = 'data/cache'
 MODEL_DIR = 'data/models'
+SESSION_STATE_FILE = os.path.join(CACHE_DIR, 'storage_state.json')
+SENTIMENT_MODEL_FILE = os.path.join(MODEL_DIR, 'sentiment_model.joblib')
+SENTIMENT_LABELS_FILE = os.path.join(MODEL_DIR, 'sentiment_labels.jsonl')  # etichette di GPT per riaddestrare il modello
+REPLAY_DIR = 'data/replay'
+PARQUET_DIR = 'data/parquet'
+REPORT_STATE_DIR = 'data/report_state'
+RESOURCE_SIZES_FILE = os.path.join(CACHE_DIR, 'resource_sizes.json')  # dimensioni medie per tipo di risorsa osservate senza filtro
+TRENDING_STATE_FILE = os.path.join(CACHE_DIR, 'trending.npz')
+INTERACTION_GRAPH_FILE = os.path.join(CACHE_DIR, 'interaction_graph.npz')
 
 # Assicura che le directory necessarie esistano
-for directory in [OUTPUT_DIR, CACHE_DIR, MODEL_DIR, 'logs']:
+for directory in [OUTPUT_DIR, CACHE_DIR, MODEL_DIR, REPLAY_DIR, PARQUET_DIR, REPORT_STATE_DIR, 'logs']:
     os.makedirs(directory, exist_ok=True) 
\ No newline at end of file
@@ -1,52 +1,201 @@
+import asyncio
 import logging
-from typing import Dict, List, Tuple
+import time
+import weakref
+from typing import Awaitable, Dict, List, Optional, Tuple
 import json
 from pathlib import Path
+import numpy as np
 import openai
-from textblob import TextBlob
 from collections import Counter
 from datetime import datetime, timedelta
 
 from config.config import (
     OPENAI_API_KEY,
     GPT_MODEL,
+    AI_ANALYSIS_BATCH_SIZE,
     SENTIMENT_THRESHOLD,
+    SENTIMENT_ESCALATION_THRESHOLD,
+    SENTIMENT_MAX_ESCALATIONS,
+    INCREMENTAL_REPORTS,
     ENGAGEMENT_RATE_THRESHOLD,
     TRENDING_TOPICS_MIN_OCCURRENCES,
-    REPUTATION_RISK_THRESHOLD,
+    LLM_MAX_CONCURRENCY,
+    LLM_ANALYSIS_TIMEOUT,
+    LLM_RESPONSE_TOKENS,
     OUTPUT_DIR
 )
+from src.database.storage import get_storage
+from src.analyzer.chunking import ensure_fits, map_reduce
+from src.analyzer.llm_batcher import LLMBatcher
+from src.analyzer.llm_cache import get_llm_cache
+from src.analyzer.report_state import ProfileAggregates, risk_level
+from src.analyzer.sentiment_model import get_sentiment_model, parse_label, record_labels
+from src.analyzer.sentiment_service import get_sentiment_service
+from src.analyzer.trending import extract_hashtags, extract_mentions
+from src.analyzer.metrics_engine import (
+    add_rolling_engagement,
+    commenter_stats,
+    engagement_summary,
+    posts_frame,
+    to_records
+)
 
 openai.api_key = OPENAI_API_KEY
+SENTIMENT_LABEL_PROMPT = "Classifica il sentiment del seguente testo rispondendo con una sola parola: positive, neutral o negative."
+SENTIMENT_LABEL_TOKENS = 8  # risposta di una sola parola: molte etichette entrano in una richiesta raggruppata
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class AIAnalyzer:
-    def __init__(self):
-        self.output_dir = Path(OUTPUT_DIR)
+# Un semaforo per event loop: i semafori asyncio non possono essere condivisi tra loop diversi
+_llm_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
 
-    async def analyze_sentiment(self, text: str) -> Dict:
-        """Analizza il sentiment del testo usando TextBlob e GPT-4"""
-        try:
-            # Analisi base con TextBlob
-            blob = TextBlob(text)
-            basic_sentiment = blob.sentiment.polarity
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """Limite globale alle richieste GPT contemporanee, condiviso da tutti gli analyzer del processo"""
+    loop = asyncio.get_running_loop()
+    if loop not in _llm_semaphores:
+        _llm_semaphores[loop] = asyncio.Semaphore(max(1, LLM_MAX_CONCURRENCY))
+    return _llm_semaphores[loop]
 
-            # Analisi avanzata con GPT-4
+class AIAnalyzer:
+    def __init__(self, analysis_timeout: float = LLM_ANALYSIS_TIMEOUT, use_cache: bool = True,
+                 batch_size: int = AI_ANALYSIS_BATCH_SIZE, escalation_threshold: float = SENTIMENT_ESCALATION_THRESHOLD,
+                 incremental: bool = INCREMENTAL_REPORTS):
+        self.output_dir = Path(OUTPUT_DIR)
+        self.storage = get_storage()
+        self.analysis_timeout = analysis_timeout
+        self.llm_cache = get_llm_cache() if use_cache else None
+        self.sentiment = get_sentiment_service()
+        self.escalation_threshold = escalation_threshold
+        self.incremental = incremental
+        # Le richieste con lo stesso prompt di sistema (anche di profili diversi) viaggiano insieme
+        self.batcher = LLMBatcher(self._complete, batch_size=batch_size)
+
+    async def _complete(self, system_prompt: str, user_content: str) -> Tuple[str, Dict]:
+        """Invia una richiesta a GPT rispettando il limite globale di concorrenza"""
+        ensure_fits(system_prompt, user_content)
+        async with get_llm_semaphore():
             response = await openai.ChatCompletion.acreate(
                 model=GPT_MODEL,
                 messages=[
-                    {"role": "system", "content": "Analizza il sentiment e il mood del seguente testo, fornendo un'analisi dettagliata."},
-                    {"role": "user", "content": text}
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_content}
                 ]
             )
+        usage = getattr(response, 'usage', None)
+        return response.choices[0].message['content'], dict(usage) if usage else {}
+
+    async def _chat(self, system_prompt: str, user_content: str, response_tokens: Optional[int] = None) -> str:
+        """
+        Risposta di GPT per un singolo elemento: dalla cache o tramite una richiesta raggruppata.
+        response_tokens è la risposta attesa (LLM_BATCH_ITEM_RESPONSE_TOKENS se omessa); le risposte lunghe
+        come il report finale dichiarano LLM_RESPONSE_TOKENS e viaggiano da sole.
+        """
+        if self.llm_cache:
+            cached = self.llm_cache.get(GPT_MODEL, system_prompt, user_content)
+            if cached is not None:
+                return cached
+
+        content, usage = await self.batcher.submit(system_prompt, user_content, response_tokens)
+
+        if self.llm_cache:
+            self.llm_cache.set(GPT_MODEL, system_prompt, user_content, content, usage)
+        return content
+
+    async def _run_analyses(self, analyses: Dict[str, Awaitable[Dict]]) -> Dict[str, Dict]:
+        """Esegue le analisi in parallelo, ognuna con il proprio timeout; un fallimento non blocca le altre"""
+        async def timed(name: str, analysis: Awaitable[Dict]) -> Dict:
+            start = time.perf_counter()
+            try:
+                return await asyncio.wait_for(analysis, timeout=self.analysis_timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Analysis {name} timed out after {self.analysis_timeout:g}s")
+                return {'error': f'Timed out after {self.analysis_timeout:g}s'}
+            except Exception as e:
+                logger.error(f"Error in {name} analysis: {str(e)}")
+                return {'error': str(e)}
+            finally:
+                logger.info(f"Analysis {name} finished in {time.perf_counter() - start:.1f}s")
+
+        results = await asyncio.gather(*(timed(name, analysis) for name, analysis in analyses.items()))
+        return dict(zip(analyses, results))
+
+    async def _predict_sentiment(self, texts: List[str]) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Etichette e confidenze del modello locale, calcolate fuori dall'event loop; None se non è addestrato"""
+        model = get_sentiment_model()
+        if model is None:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(None, model.predict, texts)
+
+    async def classify_sentiments(self, texts: List[str],
+                                  max_escalations: int = SENTIMENT_MAX_ESCALATIONS) -> Optional[List[Dict]]:
+        """
+        Sentiment a livelli per le distribuzioni dei report: il modello locale classifica tutti i testi e GPT
+        etichetta al più max_escalations dei più incerti, con richieste raggruppate e in cache.
+        Con il valore predefinito (0) i report non fanno richieste GPT per il sentiment.
+        """
+        prediction = await self._predict_sentiment(texts)
+        if prediction is None:
+            return None
+        labels, confidence, _ = prediction
+        results = [{'label': label, 'confidence': float(score), 'escalated': False}
+                   for label, score in zip(labels, confidence)]
+
+        # I testi meno sicuri (una volta sola ciascuno) fino a max_escalations
+        below_threshold = int((confidence < self.escalation_threshold).sum())
+        uncertain = {}
+        for i in np.argsort(confidence, kind='stable'):
+            if confidence[i] >= self.escalation_threshold or len(uncertain) >= max_escalations:
+                break
+            uncertain.setdefault(texts[i], i)
+        responses = await asyncio.gather(
+            *(self._chat(SENTIMENT_LABEL_PROMPT, text, SENTIMENT_LABEL_TOKENS) for text in uncertain),
+            return_exceptions=True
+        )
+
+        escalated = {}
+        for text, response in zip(uncertain, responses):
+            label = parse_label(response) if isinstance(response, str) else None
+            if label:
+                escalated[text] = label
+        for i, text in enumerate(texts):
+            if text in escalated:
+                results[i].update(label=escalated[text], escalated=True)
+        if below_threshold:
+            logger.info(f"Sentiment of {len(texts)} texts: {below_threshold} below the confidence threshold, "
+                        f"{len(uncertain)} escalated to GPT, {len(escalated)} relabelled")
+        if escalated:
+            # Le risposte di GPT diventano esempi per il prossimo addestramento
+            record_labels(list(escalated), list(escalated.values()))
+        return results
 
-            return {
+    async def analyze_sentiment(self, text: str) -> Dict:
+        """Analizza il sentiment del testo con TextBlob e il modello locale, chiedendo a GPT-4 solo se incerto"""
+        try:
+            basic_sentiment, prediction = await asyncio.gather(
+                self.sentiment.polarity(text),
+                self._predict_sentiment([text])
+            )
+            result = {
                 'basic_sentiment': basic_sentiment,
-                'detailed_analysis': response.choices[0].message['content'],
                 'is_negative': basic_sentiment < -SENTIMENT_THRESHOLD
             }
 
+            if prediction is not None:
+                labels, confidence, _ = prediction
+                result.update(label=labels[0], confidence=float(confidence[0]))
+                if confidence[0] >= self.escalation_threshold:
+                    # Sentiment netto: l'analisi dettagliata di GPT-4 non è necessaria
+                    return {**result, 'detailed_analysis': None, 'escalated': False}
+
+            # Analisi avanzata con GPT-4
+            response = await map_reduce(
+                self._chat,
+                "Analizza il sentiment e il mood del seguente testo, fornendo un'analisi dettagliata.",
+                [text]
+            )
+            return {**result, 'detailed_analysis': response, 'escalated': True}
+
         except Exception as e:
             logger.error(f"Error in sentiment analysis: {str(e)}")
             return {'error': str(e)}
@@ -54,39 +203,42 @@ class AIAnalyzer:
     async def analyze_engagement(self, profile_data: Dict) -> Dict:
         """Calcola e analizza l'engagement rate"""
         try:
-            total_followers = int(profile_data['profile_info']['followers'].replace('K', '000').replace('M', '000000'))
-            
-            engagement_metrics = []
-            for post in profile_data['posts']:
-                likes = int(post['likes'].replace('K', '000').replace('M', '000000'))
-                comments = int(post['comments'].replace('K', '000').replace('M', '000000'))
-                shares = int(post['shares'].replace('K', '000').replace('M', '000000'))
-                
-                engagement_rate = (likes + comments + shares) / total_followers
-                engagement_metrics.append({
-                    'post_url': post['url'],
-                    'engagement_rate': engagement_rate,
+            # Conteggi ed engagement di tutti i post calcolati in un solo passaggio vettoriale
+            frame = add_rolling_engagement(posts_frame([profile_data])).sort_index()
+            if frame['followers'].isna().all():
+                raise ValueError("Follower count not available")
+
+            engagement_metrics = [
+                {
+                    'post_url': row['post_url'],
+                    'engagement_rate': row['engagement_rate'],
+                    'rolling_engagement': row['rolling_engagement'],
                     'metrics': {
-                        'likes': likes,
-                        'comments': comments,
-                        'shares': shares
+                        'likes': row['likes'],
+                        'comments': row['comments'],
+                        'shares': row['shares']
                     }
-                })
+                }
+                for row in to_records(frame[['post_url', 'engagement_rate', 'rolling_engagement',
+                                             'likes', 'comments', 'shares']])
+            ]
+            distribution = to_records(engagement_summary(frame))[0]
 
             # Analisi con GPT-4
-            avg_engagement = sum(m['engagement_rate'] for m in engagement_metrics) / len(engagement_metrics)
-            engagement_analysis = await openai.ChatCompletion.acreate(
-                model=GPT_MODEL,
-                messages=[
-                    {"role": "system", "content": "Analizza le metriche di engagement e fornisci insights strategici."},
-                    {"role": "user", "content": f"Analizza questi dati di engagement: {json.dumps(engagement_metrics)}"}
-                ]
+            avg_engagement = distribution['average_engagement']
+            engagement_analysis = await map_reduce(
+                self._chat,
+                "Analizza le metriche di engagement e fornisci insights strategici.",
+                [json.dumps(metric) for metric in engagement_metrics],
+                separator=', ',
+                render=lambda body: f"Analizza questi dati di engagement: [{body}]"
             )
 
             return {
                 'metrics': engagement_metrics,
                 'average_engagement': avg_engagement,
-                'analysis': engagement_analysis.choices[0].message['content'],
+                'distribution': distribution,
+                'analysis': engagement_analysis,
                 'is_performing_well': avg_engagement > ENGAGEMENT_RATE_THRESHOLD
             }
 
@@ -98,50 +250,49 @@ class AIAnalyzer:
         """Identifica i trending topics nei contenuti"""
         try:
             # Raccoglie tutto il testo dei post
-            all_content = ' '.join([post['description'] for post in profile_data['posts']])
+            descriptions = [post['description'] for post in profile_data['posts']]
+            all_content = ' '.join(descriptions)
             
-            # Analisi con GPT-4
-            response = await openai.ChatCompletion.acreate(
-                model=GPT_MODEL,
-                messages=[
-                    {"role": "system", "content": "Identifica i principali trend e topic ricorrenti nel contenuto."},
-                    {"role": "user", "content": all_content}
-                ]
+            # Analisi con GPT-4: trend e temi sono richieste indipendenti
+            response, content_themes = await asyncio.gather(
+                map_reduce(self._chat, "Identifica i principali trend e topic ricorrenti nel contenuto.",
+                           descriptions, separator=' '),
+                self._analyze_content_themes(descriptions)
             )
 
             # Estrae hashtag
-            hashtags = [word for word in all_content.split() if word.startswith('#')]
+            hashtags = extract_hashtags(all_content)
             hashtag_counts = Counter(hashtags)
             trending_hashtags = {tag: count for tag, count in hashtag_counts.items() 
                                if count >= TRENDING_TOPICS_MIN_OCCURRENCES}
 
             return {
-                'trending_topics': response.choices[0].message['content'],
+                'trending_topics': response,
                 'hashtag_analysis': trending_hashtags,
-                'content_themes': await self._analyze_content_themes(all_content)
+                'content_themes': content_themes
             }
 
         except Exception as e:
             logger.error(f"Error in trending topics analysis: {str(e)}")
             return {'error': str(e)}
 
-    async def _analyze_content_themes(self, content: str) -> Dict:
+    async def _analyze_content_themes(self, descriptions: List[str]) -> Dict:
         """Analizza i temi principali del contenuto"""
         try:
-            response = await openai.ChatCompletion.acreate(
-                model=GPT_MODEL,
-                messages=[
-                    {"role": "system", "content": "Identifica e categorizza i principali temi del contenuto."},
-                    {"role": "user", "content": content}
-                ]
+            response = await map_reduce(
+                self._chat,
+                "Identifica e categorizza i principali temi del contenuto.",
+                descriptions,
+                separator=' '
             )
             
-            return json.loads(response.choices[0].message['content'])
+            return json.loads(response)
         except Exception as e:
             logger.error(f"Error in content theme analysis: {str(e)}")
             return {}
 
-    async def analyze_reputation_risks(self, profile_data: Dict) -> Dict:
+    async def analyze_reputation_risks(self, profile_data: Dict,
+                                       max_escalations: int = SENTIMENT_MAX_ESCALATIONS) -> Dict:
         """Analizza potenziali rischi reputazionali"""
         try:
             # Raccoglie contenuti e commenti
@@ -153,26 +304,27 @@ class AIAnalyzer:
                     comments = profile_data['interactions'][post_url].get('comments', [])
                     all_content.extend([comment['text'] for comment in comments])
 
-            content_for_analysis = '\n'.join(all_content)
-
-            # Analisi con GPT-4
-            response = await openai.ChatCompletion.acreate(
-                model=GPT_MODEL,
-                messages=[
-                    {"role": "system", "content": "Analizza il contenuto per identificare potenziali rischi reputazionali, controversie o feedback negativi."},
-                    {"role": "user", "content": content_for_analysis}
-                ]
+            # Analisi con GPT-4, suddivisa in parti se commenti e descrizioni superano il contesto del modello,
+            # e sentiment generale calcolato nel pool di processi senza bloccare l'event loop
+            response, sentiment_scores, classified = await asyncio.gather(
+                map_reduce(
+                    self._chat,
+                    "Analizza il contenuto per identificare potenziali rischi reputazionali, controversie o feedback negativi.",
+                    all_content
+                ),
+                self.sentiment.score(all_content),
+                self.classify_sentiments(all_content, max_escalations)
             )
-
-            # Analisi del sentiment generale
-            sentiment_scores = [TextBlob(text).sentiment.polarity for text in all_content]
             avg_sentiment = sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 0
 
             return {
-                'risk_analysis': response.choices[0].message['content'],
+                'risk_analysis': response,
                 'average_sentiment': avg_sentiment,
-                'risk_level': 'high' if avg_sentiment < -REPUTATION_RISK_THRESHOLD else 'medium' if avg_sentiment < 0 else 'low',
-                'negative_content_percentage': len([s for s in sentiment_scores if s < -SENTIMENT_THRESHOLD]) / len(sentiment_scores) if sentiment_scores else 0
+                'risk_level': risk_level(avg_sentiment),
+                'negative_content_percentage': len([s for s in sentiment_scores if s < -SENTIMENT_THRESHOLD]) / len(sentiment_scores) if sentiment_scores else 0,
+                # Distribuzione del modello locale (None finché non è addestrato) e testi decisi da GPT
+                'sentiment_labels': dict(Counter(item['label'] for item in classified)) if classified is not None else None,
+                'escalated_texts': sum(item['escalated'] for item in classified) if classified is not None else 0
             }
 
         except Exception as e:
@@ -182,45 +334,26 @@ class AIAnalyzer:
     async def analyze_profile_interactions(self, profile_data: Dict) -> Dict:
         """Analizza le interazioni tra profili"""
         try:
-            interactions = {}
-            mentioned_users = set()
-            
-            # Raccoglie menzioni e interazioni
-            for post in profile_data['posts']:
-                post_url = post['url']
-                if post_url in profile_data['interactions']:
-                    comments = profile_data['interactions'][post_url].get('comments', [])
-                    for comment in comments:
-                        username = comment['username']
-                        if username not in interactions:
-                            interactions[username] = {
-                                'comment_count': 0,
-                                'total_likes': 0,
-                                'last_interaction': None
-                            }
-                        
-                        interactions[username]['comment_count'] += 1
-                        interactions[username]['total_likes'] += int(comment['likes'].replace('K', '000').replace('M', '000000'))
-                        interactions[username]['last_interaction'] = comment['date']
-
-                # Estrae menzioni dal testo del post
-                words = post['description'].split()
-                mentions = [word for word in words if word.startswith('@')]
-                mentioned_users.update(mentions)
+            interactions = commenter_stats(profile_data)
+
+            # Estrae menzioni dal testo dei post
+            mentioned_users = set(
+                mention for post in profile_data['posts'] for mention in extract_mentions(post['description'])
+            )
 
             # Analisi con GPT-4
-            interaction_analysis = await openai.ChatCompletion.acreate(
-                model=GPT_MODEL,
-                messages=[
-                    {"role": "system", "content": "Analizza il pattern di interazioni tra i profili e identifica relazioni significative."},
-                    {"role": "user", "content": f"Analizza queste interazioni: {json.dumps(interactions)}"}
-                ]
+            interaction_analysis = await map_reduce(
+                self._chat,
+                "Analizza il pattern di interazioni tra i profili e identifica relazioni significative.",
+                [f"{json.dumps(user)}: {json.dumps(stats)}" for user, stats in interactions.items()],
+                separator=', ',
+                render=lambda body: f"Analizza queste interazioni: {{{body}}}"
             )
 
             return {
                 'interactions': interactions,
                 'mentioned_users': list(mentioned_users),
-                'analysis': interaction_analysis.choices[0].message['content'],
+                'analysis': interaction_analysis,
                 'top_interactors': sorted(
                     interactions.items(),
                     key=lambda x: x[1]['comment_count'],
@@ -232,50 +365,97 @@ class AIAnalyzer:
             logger.error(f"Error in interaction analysis: {str(e)}")
             return {'error': str(e)}
 
-    async def generate_profile_report(self, username: str) -> Dict:
-        """Genera un report completo per un profilo"""
+    async def _full_report(self, username: str, profile_data: Dict,
+                           max_escalations: int = SENTIMENT_MAX_ESCALATIONS) -> Dict:
+        """Report completo: tutte le analisi sull'intero snapshot e il riepilogo finale di GPT-4"""
+        # Esegue tutte le analisi in parallelo
+        start = time.perf_counter()
+        analyses = await self._run_analyses({
+            'sentiment': self.analyze_sentiment(' '.join([post['description'] for post in profile_data['posts']])),
+            'engagement': self.analyze_engagement(profile_data),
+            'trending_topics': self.identify_trending_topics(profile_data),
+            'reputation_risks': self.analyze_reputation_risks(profile_data, max_escalations),
+            'interactions': self.analyze_profile_interactions(profile_data)
+        })
+        failed = [name for name, result in analyses.items() if 'error' in result]
+        logger.info(f"Analyses for {username} completed in {time.perf_counter() - start:.1f}s"
+                    + (f", failed: {', '.join(failed)}" if failed else ''))
+
+        # Genera il report finale con GPT-4
+        report_data = {
+            'profile_info': profile_data['profile_info'],
+            **analyses
+        }
+
+        # Il report finale usa l'intera risposta disponibile: non viene raggruppato con altri
+        final_analysis = await map_reduce(
+            lambda system_prompt, content: self._chat(system_prompt, content, LLM_RESPONSE_TOKENS),
+            "Genera un report dettagliato e professionale basato sui dati di analisi del profilo TikTok.",
+            [f"{json.dumps(key)}: {json.dumps(value)}" for key, value in report_data.items()],
+            separator=', ',
+            render=lambda body: f"Genera un report completo basato su questi dati: {{{body}}}"
+        )
+
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'username': username,
+            'raw_data': report_data,
+            'executive_summary': final_analysis,
+            'failed_analyses': failed
+        }
+
+    async def _incremental_report(self, username: str, profile_data: Dict) -> Tuple[Dict, ProfileAggregates]:
+        """
+        Aggiorna gli aggregati del profilo con i soli contenuti nuovi; GPT riscrive le analisi solo se cambiano
+        abbastanza. Lo stato aggiornato va salvato dal chiamante dopo il report.
+        """
+        state = ProfileAggregates.load(username)
+        new_posts, new_comments = state.new_content(profile_data)
+        new_texts = [post['description'] for post in new_posts] + [comment.get('text', '') for _, comment in new_comments]
+
+        scores, labels = await asyncio.gather(self.sentiment.score(new_texts), self.classify_sentiments(new_texts))
+        # Il limite di testi inviati a GPT vale per l'intero report, anche se le analisi vengono riscritte
+        escalated = {text for text, item in zip(new_texts, labels or []) if item['escalated']}
+        escalations_left = max(0, SENTIMENT_MAX_ESCALATIONS - len(escalated))
+        state.update(profile_data, new_posts, new_comments, scores, labels)
+
+        failed = []
+        reason = state.narrative_reason()
+        if reason:
+            logger.info(f"Regenerating narrative for {username}: {reason}")
+            full_report = await self._full_report(username, profile_data, escalations_left)
+            failed = full_report['failed_analyses']
+            state.set_narrative(full_report)
+
+        report = state.build_report(profile_data)
+        report['failed_analyses'] = failed
+        report['incremental'] = {
+            'new_posts': len(new_posts),
+            'new_comments': len(new_comments),
+            'narrative_regenerated': reason is not None,
+            'narrative_reason': reason
+        }
+        return report, state
+
+    async def generate_profile_report(self, username: str, incremental: Optional[bool] = None) -> Dict:
+        """Genera un report completo per un profilo, o lo aggiorna con i soli contenuti nuovi"""
         try:
             # Carica i dati del profilo
-            profile_file = list(self.output_dir.glob(f"{username}_*.json"))[-1]
-            with open(profile_file, 'r', encoding='utf-8') as f:
-                profile_data = json.load(f)
-
-            # Esegue tutte le analisi
-            sentiment_analysis = await self.analyze_sentiment(' '.join([post['description'] for post in profile_data['posts']]))
-            engagement_analysis = await self.analyze_engagement(profile_data)
-            trending_topics = await self.identify_trending_topics(profile_data)
-            reputation_risks = await self.analyze_reputation_risks(profile_data)
-            interaction_analysis = await self.analyze_profile_interactions(profile_data)
-
-            # Genera il report finale con GPT-4
-            report_data = {
-                'profile_info': profile_data['profile_info'],
-                'sentiment': sentiment_analysis,
-                'engagement': engagement_analysis,
-                'trending_topics': trending_topics,
-                'reputation_risks': reputation_risks,
-                'interactions': interaction_analysis
-            }
-
-            final_analysis = await openai.ChatCompletion.acreate(
-                model=GPT_MODEL,
-                messages=[
-                    {"role": "system", "content": "Genera un report dettagliato e professionale basato sui dati di analisi del profilo TikTok."},
-                    {"role": "user", "content": f"Genera un report completo basato su questi dati: {json.dumps(report_data)}"}
-                ]
-            )
+            profile_data = self.storage.load_latest_snapshot(username)
+            if profile_data is None:
+                raise ValueError(f"No snapshot found for {username}")
 
-            report = {
-                'timestamp': datetime.now().isoformat(),
-                'username': username,
-                'raw_data': report_data,
-                'executive_summary': final_analysis.choices[0].message['content']
-            }
+            state = None
+            if self.incremental if incremental is None else incremental:
+                report, state = await self._incremental_report(username, profile_data)
+            else:
+                report = await self._full_report(username, profile_data)
 
             # Salva il report
-            report_file = self.output_dir / f"{username}_report_{datetime.now().strftime('%Y%m%d')}.json"
-            with open(report_file, 'w', encoding='utf-8') as f:
-                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.storage.save_report(report)
+            # Lo stato avanza solo a report salvato: se il salvataggio fallisce, i contenuti restano nuovi
+            if state is not None:
+                state.save()
 
             return report
 
@@ -283,21 +463,33 @@ class AIAnalyzer:
             logger.error(f"Error generating report for {username}: {str(e)}")
             return {'error': str(e)}
 
-async def main():
-    analyzer = AIAnalyzer()
+async def main(use_cache: bool = True, incremental: bool = INCREMENTAL_REPORTS):
+    analyzer = AIAnalyzer(use_cache=use_cache, incremental=incremental)
     try:
         # Trova tutti i profili analizzati
-        profile_files = list(Path(OUTPUT_DIR).glob('*_[0-9]*.json'))
-        usernames = set(f.stem.split('_')[0] for f in profile_files)
+        usernames = analyzer.storage.list_profiles()
 
-        # Genera report per ogni profilo
-        for username in usernames:
-            logger.info(f"Generating report for {username}")
-            await analyzer.generate_profile_report(username)
+        # Genera i report di tutti i profili insieme, così le analisi dello stesso tipo condividono le richieste GPT
+        logger.info(f"Generating reports for {len(usernames)} profiles")
+        await asyncio.gather(*(analyzer.generate_profile_report(username) for username in usernames))
 
     except Exception as e:
         logger.error(f"Error in main execution: {str(e)}")
 
+    logger.info(f"LLM batching stats: {analyzer.batcher.stats()}")
+    logger.info(f"Sentiment stats: {analyzer.sentiment.stats()}")
+    analyzer.sentiment.close()
+
+    if analyzer.llm_cache:
+        logger.info(f"LLM cache stats: {analyzer.llm_cache.stats()}")
+
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main()) 
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Genera i report dei profili analizzati')
+    parser.add_argument('--no-llm-cache', action='store_true', help='Ignora le risposte GPT salvate')
+    parser.add_argument('--incremental', action=argparse.BooleanOptionalAction, default=INCREMENTAL_REPORTS,
+                        help='Aggiorna i report solo con post e commenti nuovi')
+    args = parser.parse_args()
+
+    asyncio.run(main(use_cache=not args.no_llm_cache, incremental=args.incremental)) 
\ No newline at end of file
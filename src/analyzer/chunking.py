@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Awaitable, Callable, List, Sequence
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+from config.config import (
+    GPT_MODEL,
+    MODEL_CONTEXT_TOKENS,
+    LLM_RESPONSE_TOKENS,
+    LLM_CHUNK_TOKENS
+)
+
+logger = logging.getLogger(__name__)
+
+# Funzione che invia a GPT prompt di sistema e contenuto e restituisce la risposta
+Chat = Callable[[str, str], Awaitable[str]]
+
+REDUCE_SEPARATOR = '\n\n---\n\n'
+REDUCE_PROMPT = (
+    "Il compito originale era: {task}\n"
+    "Riceverai le analisi parziali di parti diverse dello stesso contenuto, separate da '---'. "
+    "Uniscile in un'unica analisi coerente, nello stesso formato delle analisi parziali."
+)
+
+# Stima senza tiktoken: JSON, URL, hashtag e numeri scendono a 2,5-3 caratteri per token,
+# quindi 3 caratteri ASCII (2 byte per il resto: emoji, accenti) più un margine del 20%
+FALLBACK_ASCII_CHARS_PER_TOKEN = 3
+FALLBACK_NON_ASCII_BYTES_PER_TOKEN = 2
+FALLBACK_SAFETY_MARGIN = 1.2
+# Token aggiunti dal formato chat ai due messaggi di ogni richiesta
+MESSAGE_OVERHEAD_TOKENS = 12
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """Tokenizer di GPT_MODEL; None se tiktoken non è installato o non riesce a caricarlo (es. offline)"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(GPT_MODEL)
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, using the conservative token estimate: {str(e)}")
+        return None
+
+def estimate_tokens(text: str) -> int:
+    """Token del testo: conteggio esatto con tiktoken, altrimenti una stima per eccesso"""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    raw = len(text.encode('utf-8'))
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    estimate = ascii_chars / FALLBACK_ASCII_CHARS_PER_TOKEN + (raw - ascii_chars) / FALLBACK_NON_ASCII_BYTES_PER_TOKEN
+    return int(estimate * FALLBACK_SAFETY_MARGIN) + 1
+
+def prompt_budget(system_prompt: str, context_tokens: int = MODEL_CONTEXT_TOKENS,
+                  response_tokens: int = LLM_RESPONSE_TOKENS) -> int:
+    """Token disponibili per il contenuto di una richiesta con questo prompt di sistema"""
+    return context_tokens - response_tokens - MESSAGE_OVERHEAD_TOKENS - estimate_tokens(system_prompt)
+
+def ensure_fits(system_prompt: str, user_content: str):
+    """Solleva ValueError se la richiesta non entra nel contesto del modello"""
+    overflow = estimate_tokens(user_content) - prompt_budget(system_prompt)
+    if overflow > 0:
+        raise ValueError(f"Prompt exceeds the model context by about {overflow} tokens")
+
+def split_text(text: str, max_tokens: int) -> List[str]:
+    """Divide un testo troppo lungo in parti di al massimo max_tokens, preferibilmente tra due parole"""
+    pieces = []
+    while estimate_tokens(text) > max_tokens:
+        cut = max(1, len(text) * max_tokens // estimate_tokens(text))
+        while cut > 1 and estimate_tokens(text[:cut]) > max_tokens:
+            cut = cut * 9 // 10
+        space = max(text.rfind(' ', cut // 2, cut), text.rfind('\n', cut // 2, cut))
+        if space > 0:
+            cut = space
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+def chunk_texts(texts: Sequence[str], max_tokens: int, separator: str = '\n') -> List[str]:
+    """Raggruppa i testi, nell'ordine, in parti unite da separator che non superano max_tokens"""
+    chunks, current, used = [], [], 0
+    separator_tokens = estimate_tokens(separator)
+    for text in texts:
+        for piece in split_text(text, max_tokens - separator_tokens):
+            tokens = estimate_tokens(piece) + separator_tokens
+            if current and used + tokens > max_tokens:
+                chunks.append(separator.join(current))
+                current, used = [], 0
+            current.append(piece)
+            used += tokens
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+async def map_reduce(chat: Chat, system_prompt: str, texts: Sequence[str], separator: str = '\n',
+                     render: Callable[[str], str] = lambda body: body,
+                     chunk_tokens: int = LLM_CHUNK_TOKENS) -> str:
+    """
+    Analizza un contenuto di qualunque lunghezza: le parti vengono analizzate in parallelo
+    e i risultati parziali uniti a livelli, senza mai superare il contesto del modello.
+    Se il contenuto entra in una sola parte, la richiesta è identica a quella non suddivisa.
+    """
+    budget = min(chunk_tokens, prompt_budget(system_prompt)) - estimate_tokens(render(''))
+    chunks = chunk_texts(texts, budget, separator) or ['']
+    partials = await asyncio.gather(*(chat(system_prompt, render(chunk)) for chunk in chunks))
+    if len(partials) == 1:
+        return partials[0]
+
+    reduce_prompt = REDUCE_PROMPT.format(task=system_prompt)
+    budget = min(chunk_tokens, prompt_budget(reduce_prompt))
+    while True:
+        groups = chunk_texts(partials, budget, REDUCE_SEPARATOR)
+        if len(groups) == 1:
+            return await chat(reduce_prompt, groups[0])
+        if len(groups) >= len(partials):
+            raise ValueError("Partial results are too long to be merged within the model context")
+        partials = await asyncio.gather(*(chat(reduce_prompt, group) for group in groups))
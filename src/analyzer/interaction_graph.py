@@ -0,0 +1,407 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from config.config import INTERACTION_GRAPH_FILE
+from src.analyzer.trending import comment_key, extract_mentions
+from src.utils.file_lock import file_lock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+MAX_LISTED_USERS = 100
+
+def normalize_user(name: str) -> str:
+    """Nome utente confrontabile tra profili e commenti ('@Nome' e 'nome' sono lo stesso nodo)"""
+    return (name or '').strip().lstrip('@').casefold()
+
+def _content_key(post_url: str, comment: Dict) -> int:
+    # Stessa identità dei commenti usata da trend e report, come intero a 64 bit
+    return int(comment_key(post_url, comment), 16)
+
+class InteractionGraph:
+    """
+    Grafo delle interazioni tra tutti gli utenti dei profili analizzati, come matrice di adiacenza sparsa:
+    A[i, j] è il numero di commenti di i sotto i post di j, più le menzioni di j nelle descrizioni di i.
+    I nuovi archi vengono accumulati in formato COO e sommati alla matrice CSR solo alla prima interrogazione
+    o al salvataggio, così l'aggiornamento costa quanto i soli contenuti nuovi.
+    """
+
+    def __init__(self, path: str = INTERACTION_GRAPH_FILE):
+        self.path = path
+        self.users: List[str] = []
+        self.index: Dict[str, int] = {}
+        # Nodi dei profili analizzati (gli altri sono solo commentatori o utenti menzionati)
+        self.profiles: set = set()
+        self.matrix = sparse.csr_matrix((0, 0), dtype=np.int32)
+        # Chiavi a 64 bit, ordinate, dei contenuti già contati
+        self.seen = np.array([], dtype=np.uint64)
+        self.mtime: Optional[float] = None
+        # Contenuti e profili aggiunti dall'ultimo salvataggio, da riapplicare al grafo salvato da altri processi
+        self._pending_events: List[Tuple[int, str, str]] = []
+        self._pending_profiles: set = set()
+        self._rows: List[int] = []
+        self._cols: List[int] = []
+        self._undirected: Optional[sparse.csr_matrix] = None
+        self._components: Optional[Tuple[int, np.ndarray]] = None
+        self._lock = threading.RLock()
+
+    def _node(self, user: str) -> int:
+        node = self.index.get(user)
+        if node is None:
+            node = self.index[user] = len(self.users)
+            self.users.append(user)
+        return node
+
+    def _events(self, profile_data: Dict) -> List[Tuple[int, str, str]]:
+        username = normalize_user(profile_data.get('username', ''))
+        interactions = profile_data.get('interactions', {})
+        events = []
+        for post in profile_data.get('posts', []):
+            for mention in dict.fromkeys(extract_mentions(post.get('description', ''))):
+                key = _content_key(f"mention:{post['url']}", {'username': username, 'text': mention})
+                events.append((key, username, normalize_user(mention)))
+            for comment in (interactions.get(post['url']) or {}).get('comments', []):
+                events.append((_content_key(post['url'], comment), normalize_user(comment.get('username', '')), username))
+        return events
+
+    def ingest_snapshot(self, profile_data: Dict) -> int:
+        """Aggiunge gli archi di commenti e menzioni non ancora contati; restituisce gli archi aggiunti"""
+        username = normalize_user(profile_data.get('username', ''))
+        if not username:
+            return 0
+        events = self._events(profile_data)
+        with self._lock:
+            self._pending_profiles.add(username)
+            self._add_profile(username)
+            return self._add_events(events)
+
+    def _add_profile(self, username: str):
+        self.profiles.add(username)
+        self._node(username)
+
+    def _add_events(self, events: List[Tuple[int, str, str]]) -> int:
+        """Archi dei contenuti (chiave, autore, destinatario) non ancora visti"""
+        if not events:
+            return 0
+        keys = np.fromiter((key for key, _, _ in events), dtype=np.uint64, count=len(events))
+        # Primo contenuto per ogni chiave, escluso quanto già visto negli snapshot precedenti
+        keys, first = np.unique(keys, return_index=True)
+        positions = np.searchsorted(self.seen, keys)
+        new = self.seen[np.minimum(positions, self.seen.size - 1)] != keys if self.seen.size else np.ones(keys.size, bool)
+        added = 0
+        for position in first[new]:
+            event = events[position]
+            self._pending_events.append(event)
+            _, source, target = event
+            # Utenti anonimi e risposte del profilo ai propri post non sono interazioni
+            if source and target and source != target:
+                self._rows.append(self._node(source))
+                self._cols.append(self._node(target))
+                added += 1
+        # Inserimento ordinato: costa una copia dell'array, non un nuovo ordinamento
+        self.seen = np.insert(self.seen, positions[new], keys[new])
+        if added:
+            self._undirected = self._components = None
+        return added
+
+    @property
+    def adjacency(self) -> sparse.csr_matrix:
+        """Matrice CSR con gli archi in attesa già sommati"""
+        with self._lock:
+            size = len(self.users)
+            if self._rows or self.matrix.shape[0] != size:
+                delta = sparse.coo_matrix(
+                    (np.ones(len(self._rows), dtype=np.int32), (self._rows, self._cols)), shape=(size, size)
+                ).tocsr()
+                # I nodi nuovi hanno righe vuote: basta estendere indptr, senza copiare gli archi esistenti
+                indptr = np.pad(self.matrix.indptr, (0, size - self.matrix.shape[0]), mode='edge')
+                matrix = sparse.csr_matrix((self.matrix.data, self.matrix.indices, indptr), shape=(size, size))
+                self.matrix = (matrix + delta).tocsr()
+                self.matrix.sum_duplicates()
+                self._rows, self._cols = [], []
+            return self.matrix
+
+    def _links(self) -> sparse.csr_matrix:
+        # Relazione non orientata: i e j sono vicini se uno dei due ha interagito con l'altro
+        with self._lock:
+            if self._undirected is None:
+                matrix = self.adjacency
+                undirected = (matrix + matrix.T).tocsr()
+                undirected.data = np.ones_like(undirected.data, dtype=np.int8)
+                self._undirected = undirected
+            return self._undirected
+
+    def _labels(self) -> Tuple[int, np.ndarray]:
+        with self._lock:
+            if self._components is None:
+                self._components = connected_components(self._links(), directed=False)
+            return self._components
+
+    def _require(self, user: str) -> int:
+        node = self.index.get(normalize_user(user))
+        if node is None:
+            raise KeyError(f"Unknown user '{user}'")
+        return node
+
+    def shared_commenters(self, k: int = 20, profiles: Optional[Sequence[str]] = None, min_profiles: int = 2) -> List[Dict]:
+        """Utenti che commentano più profili tra quelli indicati (di default tutti i profili analizzati)"""
+        with self._lock:
+            matrix = self.adjacency
+            columns = sorted(self.index[name] for name in
+                             {normalize_user(profile) for profile in (profiles or self.profiles)} if name in self.index)
+            if not columns:
+                return []
+            # Solo le colonne dei profili: una matrice commentatori x profili
+            sub = matrix.tocsc()[:, columns].tocsr()
+            reached = np.diff(sub.indptr)
+            comments = np.asarray(sub.sum(axis=1)).ravel()
+            candidates = np.flatnonzero(reached >= max(1, min_profiles))
+            order = candidates[np.lexsort((-comments[candidates], -reached[candidates]))][:k]
+            return [
+                {
+                    'user': self.users[node],
+                    'profiles': int(reached[node]),
+                    'comments': int(comments[node]),
+                    'sample_profiles': sorted(self.users[columns[column]]
+                                              for column in sub.indices[sub.indptr[node]:sub.indptr[node + 1]])[:10]
+                }
+                for node in order
+            ]
+
+    def audience_overlap(self, username: str, k: int = 20) -> List[Dict]:
+        """Profili analizzati con più commentatori in comune con username"""
+        with self._lock:
+            node = self._require(username)
+            matrix = self.adjacency
+            commenters = matrix[:, node].tocsc().indices
+            total = len(commenters)
+            others = sorted(self.index[name] for name in self.profiles if self.index[name] != node)
+            if not total or not others:
+                return []
+            shared = np.diff(matrix[commenters][:, others].tocsc().indptr)
+            order = np.argsort(-shared, kind='stable')[:k]
+            return [
+                {'profile': self.users[others[column]], 'shared_commenters': int(shared[column]),
+                 'share': float(shared[column] / total)}
+                for column in order if shared[column]
+            ]
+
+    def mutual_pairs(self, k: int = 20) -> List[Dict]:
+        """Coppie di utenti che hanno interagito entrambi con l'altro, per intensità dell'interazione più debole"""
+        with self._lock:
+            matrix = self.adjacency
+            mutual = sparse.triu(matrix.minimum(matrix.T), k=1).tocoo()
+            order = np.lexsort((mutual.col, mutual.row, -mutual.data))[:k]
+            return [
+                {
+                    'users': [self.users[mutual.row[i]], self.users[mutual.col[i]]],
+                    'weight': int(mutual.data[i]),
+                    'interactions': [int(matrix[mutual.row[i], mutual.col[i]]),
+                                     int(matrix[mutual.col[i], mutual.row[i]])]
+                }
+                for i in order
+            ]
+
+    def neighbourhood(self, user: str, hops: int = 2, limit: int = MAX_LISTED_USERS) -> Dict:
+        """Utenti raggiungibili da user in al più hops passaggi, livello per livello (visita in ampiezza)"""
+        with self._lock:
+            start = self._require(user)
+            links = self._links()
+            visited = np.zeros(links.shape[0], dtype=bool)
+            visited[start] = True
+            frontier = np.array([start])
+            layers = []
+            for _ in range(max(0, hops)):
+                # Vicini di tutta la frontiera in un solo slicing della matrice
+                reached = np.unique(links[frontier].indices)
+                frontier = reached[~visited[reached]]
+                if not frontier.size:
+                    break
+                visited[frontier] = True
+                layers.append(frontier)
+            return {
+                'user': self.users[start],
+                'hops': hops,
+                'total': int(sum(layer.size for layer in layers)),
+                'layers': [{'hop': hop, 'size': int(layer.size),
+                            'users': [self.users[node] for node in layer[:limit]]}
+                           for hop, layer in enumerate(layers, start=1)]
+            }
+
+    def components(self, k: int = 10, limit: int = 10) -> Dict:
+        """Componenti connesse (comunità non collegate tra loro), dalla più grande"""
+        with self._lock:
+            count, labels = self._labels()
+            sizes = np.bincount(labels) if labels.size else np.array([], dtype=np.int64)
+            order = np.argsort(-sizes, kind='stable')[:k]
+            profile_nodes = np.array(sorted(self.index[name] for name in self.profiles), dtype=np.int64)
+            profile_labels = labels[profile_nodes] if profile_nodes.size else profile_nodes
+            return {
+                'components': int(count),
+                'users': int(labels.size),
+                'largest': [
+                    {
+                        'size': int(sizes[label]),
+                        'profiles': sorted(self.users[node] for node in profile_nodes[profile_labels == label])[:limit]
+                    }
+                    for label in order
+                ]
+            }
+
+    def component_of(self, user: str, limit: int = MAX_LISTED_USERS) -> Dict:
+        """Componente connessa di user, con i profili analizzati che contiene"""
+        with self._lock:
+            node = self._require(user)
+            _, labels = self._labels()
+            members = np.flatnonzero(labels == labels[node])
+            return {
+                'user': self.users[node],
+                'size': int(members.size),
+                'profiles': sorted(self.users[member] for member in members if self.users[member] in self.profiles)[:limit]
+            }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            matrix = self.adjacency
+            return {
+                'users': len(self.users),
+                'profiles': len(self.profiles),
+                'edges': int(matrix.nnz),
+                'interactions': int(matrix.data.sum(dtype=np.int64)),
+                'seen_contents': int(self.seen.size),
+                'matrix_bytes': int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes)
+            }
+
+    def _merge_saved(self):
+        """
+        Riapplica i contenuti non ancora salvati al grafo salvato nel frattempo da altri processi:
+        le matrici di adiacenza si sommano e i contenuti già contati altrove vengono ignorati.
+        """
+        saved = InteractionGraph.load(self.path)
+        for username in self._pending_profiles:
+            saved._add_profile(username)
+        saved._add_events(self._pending_events)
+        self.users, self.index, self.profiles = saved.users, saved.index, saved.profiles
+        self.matrix, self.seen = saved.adjacency, saved.seen
+        self._rows, self._cols = [], []
+        self._undirected = self._components = None
+
+    def save(self):
+        """
+        Salva matrice, nomi e contenuti visti su un file temporaneo e lo rinomina. Il file non è compresso:
+        viene riscritto a ogni snapshot e la compressione costerebbe più di dieci volte tanto.
+        Un lock tra processi protegge lettura e scrittura: se un altro processo ha salvato dopo l'ultimo
+        caricamento, gli archi nuovi di questo processo vengono uniti al suo grafo invece di sovrascriverlo.
+        """
+        with self._lock, file_lock(self.path):
+            mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+            if mtime is not None and mtime != self.mtime:
+                self._merge_saved()
+            matrix = self.adjacency
+            meta = {'version': STATE_VERSION, 'users': self.users, 'profiles': sorted(self.profiles)}
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr, seen=self.seen,
+                         meta=np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8))
+            os.replace(tmp_path, self.path)
+            self.mtime = os.path.getmtime(self.path)
+            self._pending_events, self._pending_profiles = [], set()
+
+    @classmethod
+    def load(cls, path: str = INTERACTION_GRAPH_FILE) -> 'InteractionGraph':
+        """Grafo salvato; vuoto se assente o di una versione precedente"""
+        graph = cls(path)
+        if not os.path.exists(path):
+            return graph
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            if meta.get('version') != STATE_VERSION:
+                logger.warning(f"Ignoring interaction graph in {path}: created by a different version")
+                return graph
+            size = len(meta['users'])
+            graph.matrix = sparse.csr_matrix((data['data'], data['indices'], data['indptr']), shape=(size, size))
+            graph.seen = data['seen']
+        graph.users = meta['users']
+        graph.index = {user: node for node, user in enumerate(graph.users)}
+        graph.profiles = set(meta['profiles'])
+        graph.mtime = os.path.getmtime(path)
+        return graph
+
+_graph: Optional[InteractionGraph] = None
+_graph_lock = threading.Lock()
+
+def get_interaction_graph(path: str = INTERACTION_GRAPH_FILE) -> InteractionGraph:
+    """Grafo condiviso dal processo, ricaricato se un altro processo ha salvato uno stato più recente"""
+    global _graph
+    with _graph_lock:
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if _graph is None or (mtime is not None and mtime != _graph.mtime):
+            _graph = InteractionGraph.load(path)
+        return _graph
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Grafo delle interazioni tra tutti i profili')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help='Aggiunge gli snapshot salvati (i contenuti già visti vengono ignorati)')
+    ingest_parser.add_argument('--history', action='store_true', help='Tutti gli snapshot, non solo gli ultimi')
+
+    shared_parser = subparsers.add_parser('shared', help='Commentatori in comune tra più profili')
+    shared_parser.add_argument('--k', type=int, default=20)
+    shared_parser.add_argument('--profiles', nargs='*', help='Profili da considerare, di default tutti')
+    shared_parser.add_argument('--min-profiles', type=int, default=2)
+
+    overlap_parser = subparsers.add_parser('overlap', help='Profili con più commentatori in comune con un profilo')
+    overlap_parser.add_argument('username')
+    overlap_parser.add_argument('--k', type=int, default=20)
+
+    mutual_parser = subparsers.add_parser('mutual', help='Coppie di utenti che interagiscono a vicenda')
+    mutual_parser.add_argument('--k', type=int, default=20)
+
+    neighbours_parser = subparsers.add_parser('neighbours', help='Utenti entro k passaggi da un utente')
+    neighbours_parser.add_argument('username')
+    neighbours_parser.add_argument('--hops', type=int, default=2)
+
+    components_parser = subparsers.add_parser('components', help='Componenti connesse più grandi')
+    components_parser.add_argument('--k', type=int, default=10)
+
+    subparsers.add_parser('stats', help='Dimensioni del grafo')
+    args = parser.parse_args()
+
+    graph = get_interaction_graph()
+    if args.command == 'ingest':
+        from src.database.storage import get_storage
+
+        storage = get_storage()
+        added = 0
+        for username in storage.list_profiles():
+            snapshots = storage.load_snapshots(username) if args.history else [storage.load_latest_snapshot(username)]
+            for snapshot in filter(None, snapshots):
+                added += graph.ingest_snapshot(snapshot)
+        graph.save()
+        result = {'added': added, **graph.stats()}
+    elif args.command == 'shared':
+        result = graph.shared_commenters(args.k, args.profiles, args.min_profiles)
+    elif args.command in ('overlap', 'neighbours'):
+        try:
+            result = (graph.audience_overlap(args.username, args.k) if args.command == 'overlap'
+                      else graph.neighbourhood(args.username, args.hops))
+        except KeyError as e:
+            raise SystemExit(e.args[0])
+    elif args.command == 'mutual':
+        result = graph.mutual_pairs(args.k)
+    elif args.command == 'components':
+        result = graph.components(args.k)
+    else:
+        result = graph.stats()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
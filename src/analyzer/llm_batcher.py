@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.config import (
+    AI_ANALYSIS_BATCH_SIZE,
+    LLM_BATCH_MAX_TOKENS,
+    LLM_BATCH_MAX_WAIT,
+    LLM_BATCH_ITEM_RESPONSE_TOKENS,
+    LLM_RESPONSE_TOKENS
+)
+from src.analyzer.chunking import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Funzione che invia una singola richiesta a GPT e restituisce contenuto e consumo di token
+Complete = Callable[[str, str], Awaitable[Tuple[str, Dict]]]
+
+BATCH_INSTRUCTIONS = (
+    "Riceverai un array JSON di elementi nel formato {\"id\": ..., \"content\": ...}. "
+    "Svolgi il compito separatamente per ciascun elemento, come se fosse l'unico ricevuto, "
+    "e rispondi solo con un oggetto JSON {\"results\": [{\"id\": ..., \"result\": ...}]} "
+    "contenente un risultato per ogni id."
+)
+# Token della risposta raggruppata occupati dall'involucro {"id": ..., "result": ...} di ogni elemento
+ITEM_ENVELOPE_TOKENS = 12
+CODE_FENCE = re.compile(r'^```(?:json)?\s*(.*?)\s*```$', re.DOTALL)
+
+BATCH_LENGTH_LIMIT = "Ogni risultato non deve superare circa {words} parole."
+
+def batch_system_prompt(system_prompt: str, item_tokens: Optional[int] = None) -> str:
+    instructions = BATCH_INSTRUCTIONS
+    if item_tokens:
+        # Circa 0,75 parole per token: le risposte devono restare nella parte riservata a ogni elemento
+        instructions += ' ' + BATCH_LENGTH_LIMIT.format(words=max(1, item_tokens * 3 // 4))
+    return f"{system_prompt}\n\n{instructions}"
+
+def encode_batch(contents: List[str]) -> str:
+    return json.dumps([{'id': i, 'content': content} for i, content in enumerate(contents)], ensure_ascii=False)
+
+def decode_batch(response: str, size: int) -> Dict[int, str]:
+    """Risultati per id della risposta raggruppata; gli id mancanti o non validi vengono ignorati"""
+    match = CODE_FENCE.match(response.strip())
+    payload = json.loads(match.group(1) if match else response)
+    results = payload.get('results', []) if isinstance(payload, dict) else payload
+
+    decoded = {}
+    for entry in results:
+        if not isinstance(entry, dict) or 'result' not in entry:
+            continue
+        try:
+            item_id = int(entry.get('id'))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= item_id < size:
+            result = entry['result']
+            # Le analisi che si aspettano JSON (es. i temi) ricevono lo stesso testo di una richiesta singola
+            decoded[item_id] = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+    return decoded
+
+def share_usage(usage: Optional[Dict], contents: List[str]) -> List[Dict]:
+    """Ripartisce il consumo di token della richiesta raggruppata in proporzione alla lunghezza di ogni elemento"""
+    total = sum(len(content) for content in contents) or 1
+    return [
+        {key: round(value * len(content) / total) for key, value in (usage or {}).items() if isinstance(value, (int, float))}
+        for content in contents
+    ]
+
+class _Pending:
+    def __init__(self):
+        self.items: List[Tuple[str, asyncio.Future]] = []
+        self.tokens = 0
+        self.response_tokens = 0
+        # Risposta più lunga dichiarata dagli elementi, indicata a GPT come limite di ogni risultato
+        self.item_tokens = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+class LLMBatcher:
+    """Raggruppa le richieste GPT con lo stesso prompt di sistema in un'unica richiesta strutturata"""
+
+    def __init__(self, complete: Complete, batch_size: int = AI_ANALYSIS_BATCH_SIZE,
+                 max_tokens: int = LLM_BATCH_MAX_TOKENS, max_wait: float = LLM_BATCH_MAX_WAIT,
+                 max_response_tokens: int = LLM_RESPONSE_TOKENS,
+                 item_response_tokens: int = LLM_BATCH_ITEM_RESPONSE_TOKENS):
+        self.complete = complete
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.max_wait = max_wait
+        self.max_response_tokens = max_response_tokens
+        self.item_response_tokens = item_response_tokens
+        self._pending: Dict[str, _Pending] = {}
+        self._tasks = set()
+
+        # Statistiche
+        self.items = 0
+        self.requests = 0
+        self.batched_requests = 0
+        self.fallbacks = 0
+
+    async def submit(self, system_prompt: str, user_content: str,
+                     response_tokens: Optional[int] = None) -> Tuple[str, Dict]:
+        """
+        Accoda un elemento e attende il suo risultato, con la stessa forma di una richiesta singola.
+        response_tokens è la lunghezza massima attesa della risposta dell'elemento: le risposte di tutti
+        gli elementi di un gruppo devono entrare insieme in max_response_tokens, altrimenti la risposta
+        raggruppata verrebbe troncata e ogni elemento pagato due volte.
+        """
+        self.items += 1
+        # Nella richiesta raggruppata il contenuto viaggia come stringa JSON, con i caratteri di escape
+        tokens = estimate_tokens(json.dumps(user_content, ensure_ascii=False))
+        item_tokens = response_tokens or self.item_response_tokens
+        reserved = item_tokens + ITEM_ENVELOPE_TOKENS
+        if self.batch_size <= 1 or tokens > self.max_tokens or 2 * reserved > self.max_response_tokens:
+            # Risposte lunghe: in un gruppo entrerebbe un solo elemento
+            return await self._single(system_prompt, user_content)
+
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.get(system_prompt)
+        if pending and (pending.tokens + tokens > self.max_tokens
+                        or pending.response_tokens + reserved > self.max_response_tokens):
+            self._flush(system_prompt)
+            pending = None
+        if pending is None:
+            pending = self._pending[system_prompt] = _Pending()
+            pending.timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush, system_prompt)
+
+        pending.items.append((user_content, future))
+        pending.tokens += tokens
+        pending.response_tokens += reserved
+        pending.item_tokens = max(pending.item_tokens, item_tokens)
+        if len(pending.items) >= self.batch_size:
+            self._flush(system_prompt)
+        return await future
+
+    def _flush(self, system_prompt: str):
+        pending = self._pending.pop(system_prompt, None)
+        if pending is None:
+            return
+        if pending.timer:
+            pending.timer.cancel()
+        task = asyncio.ensure_future(self._send(system_prompt, pending.items, pending.item_tokens))
+        # Riferimento forte finché la richiesta non termina
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _single(self, system_prompt: str, user_content: str) -> Tuple[str, Dict]:
+        self.requests += 1
+        return await self.complete(system_prompt, user_content)
+
+    async def _send(self, system_prompt: str, items: List[Tuple[str, asyncio.Future]],
+                    item_tokens: Optional[int] = None):
+        # Elementi il cui chiamante ha già rinunciato (es. timeout dell'analisi)
+        items = [(content, future) for content, future in items if not future.done()]
+        if not items:
+            return
+
+        results: Dict[int, str] = {}
+        usages: List[Dict] = [{} for _ in items]
+        if len(items) > 1:
+            contents = [content for content, _ in items]
+            try:
+                self.requests += 1
+                self.batched_requests += 1
+                response, usage = await self.complete(batch_system_prompt(system_prompt, item_tokens),
+                                                       encode_batch(contents))
+                results = decode_batch(response, len(items))
+                usages = share_usage(usage, contents)
+            except Exception as e:
+                logger.warning(f"Batched request of {len(items)} items failed, retrying one by one: {str(e)}")
+
+        for i, (_, future) in enumerate(items):
+            if i in results and not future.done():
+                future.set_result((results[i], usages[i]))
+
+        # Gli elementi senza risultato valido vengono inviati singolarmente
+        missing = [(content, future) for i, (content, future) in enumerate(items) if i not in results]
+        if missing and len(items) > 1:
+            self.fallbacks += len(missing)
+            logger.warning(f"{len(missing)} of {len(items)} batched items without a result, retrying one by one")
+        await asyncio.gather(*(self._resolve(system_prompt, content, future) for content, future in missing))
+
+    async def _resolve(self, system_prompt: str, user_content: str, future: asyncio.Future):
+        if future.done():
+            return
+        try:
+            result = await self._single(system_prompt, user_content)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict:
+        """Elementi richiesti, richieste effettivamente inviate e ripiegamenti su richieste singole"""
+        return {
+            'items': self.items,
+            'requests': self.requests,
+            'batched_requests': self.batched_requests,
+            'fallbacks': self.fallbacks,
+            'items_per_request': self.items / self.requests if self.requests else 0.0
+        }
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from config.config import (
+    CACHE_DIR,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_SIZE_MB
+)
+from src.utils.disk_cache import DiskCache
+
+class LLMCache:
+    """Cache persistente delle risposte GPT, indicizzata dall'hash di modello, prompt di sistema e contenuto"""
+
+    def __init__(self, cache_dir: str = os.path.join(CACHE_DIR, 'llm'), ttl: float = LLM_CACHE_TTL,
+                 max_bytes: int = LLM_CACHE_MAX_SIZE_MB * 1024 * 1024):
+        self.cache = DiskCache(cache_dir, ttl=ttl, max_bytes=max_bytes)
+        self._lock = threading.Lock()
+        self.saved_prompt_tokens = 0
+        self.saved_completion_tokens = 0
+
+    @staticmethod
+    def key(model: str, system_prompt: str, user_content: str) -> str:
+        """Hash del contenuto della richiesta: richieste identiche condividono la stessa voce"""
+        payload = json.dumps([model, system_prompt, user_content], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, model: str, system_prompt: str, user_content: str) -> Optional[str]:
+        """Restituisce la risposta salvata, contando i token che non è stato necessario pagare"""
+        entry = self.cache.get(self.key(model, system_prompt, user_content))
+        if entry is None:
+            return None
+        usage = entry.get('usage') or {}
+        with self._lock:
+            self.saved_prompt_tokens += usage.get('prompt_tokens', 0)
+            self.saved_completion_tokens += usage.get('completion_tokens', 0)
+        return entry['content']
+
+    def set(self, model: str, system_prompt: str, user_content: str, content: str, usage: Optional[Dict] = None):
+        """Salva una risposta con il consumo di token della richiesta originale"""
+        self.cache.set(self.key(model, system_prompt, user_content), {'content': content, 'usage': usage or {}})
+
+    def stats(self) -> Dict:
+        """Hit rate, token risparmiati e occupazione della cache"""
+        with self._lock:
+            saved = {
+                'saved_prompt_tokens': self.saved_prompt_tokens,
+                'saved_completion_tokens': self.saved_completion_tokens,
+                'saved_tokens': self.saved_prompt_tokens + self.saved_completion_tokens
+            }
+        return {**self.cache.stats(), **saved}
+
+_llm_cache: Optional[LLMCache] = None
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Restituisce la cache condivisa dal processo (None con LLM_CACHE_ENABLED=false)"""
+    global _llm_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _llm_cache is None:
+        _llm_cache = LLMCache()
+    return _llm_cache
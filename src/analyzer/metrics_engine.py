@@ -0,0 +1,110 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+COUNT_PATTERN = r'^\s*([\d.,]+)\s*([KkMmBb]?)\s*$'
+COUNT_MULTIPLIERS = {'': 1, 'K': 1e3, 'M': 1e6, 'B': 1e9}
+DEFAULT_PERCENTILES = (25, 50, 75, 90, 99)
+
+def _parse_unique_counts(values: pd.Series) -> np.ndarray:
+    result = pd.to_numeric(values, errors='coerce').astype(float)
+
+    # Solo i valori non numerici passano dall'espressione regolare
+    text = values[result.isna() & values.notna()].astype(str)
+    if not text.empty:
+        parts = text.str.extract(COUNT_PATTERN)
+        numbers = pd.to_numeric(parts[0].str.replace(',', '', regex=False), errors='coerce')
+        multipliers = parts[1].fillna('').str.upper().map(COUNT_MULTIPLIERS)
+        result.loc[text.index] = (numbers * multipliers).to_numpy()
+    return np.round(result.to_numpy(dtype=float))
+
+def parse_counts(values: Iterable) -> np.ndarray:
+    """Converte in blocco conteggi esatti (rete) o abbreviati ('1.2K', '3M') in float; NaN se illeggibili"""
+    series = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    # I conteggi abbreviati si ripetono molto: ogni valore distinto viene interpretato una sola volta
+    codes, uniques = pd.factorize(series.astype(object))
+    parsed = _parse_unique_counts(pd.Series(uniques, dtype=object))
+    return np.where(codes >= 0, parsed[np.maximum(codes, 0)] if len(parsed) else np.nan, np.nan)
+
+def parse_count(value) -> Optional[int]:
+    """Versione scalare di parse_counts; None se il conteggio è assente o illeggibile"""
+    parsed = parse_counts([value])[0]
+    return None if np.isnan(parsed) else int(parsed)
+
+def posts_frame(snapshots: Sequence[Dict]) -> pd.DataFrame:
+    """Un DataFrame con un post per riga, per uno o più snapshot, con conteggi numerici ed engagement rate"""
+    rows = [
+        (snapshot['username'], snapshot.get('timestamp'), snapshot.get('profile_info', {}).get('followers'),
+         post['url'], post.get('date', ''), post.get('likes'), post.get('comments'), post.get('shares'))
+        for snapshot in snapshots
+        for post in snapshot.get('posts', [])
+    ]
+    frame = pd.DataFrame(rows, columns=['username', 'snapshot', 'followers', 'post_url', 'date',
+                                        'likes', 'comments', 'shares'])
+    for column in ('followers', 'likes', 'comments', 'shares'):
+        frame[column] = pd.array(parse_counts(frame[column]), dtype='Int64')
+
+    followers = frame['followers'].where(frame['followers'] > 0)
+    frame['interactions'] = frame[['likes', 'comments', 'shares']].sum(axis=1, min_count=1)
+    frame['engagement_rate'] = frame['interactions'] / followers
+    frame['date'] = pd.to_datetime(frame['date'], errors='coerce', utc=True, format='ISO8601')
+    return frame
+
+def add_rolling_engagement(frame: pd.DataFrame, window: int = 5) -> pd.DataFrame:
+    """Aggiunge la media mobile dell'engagement per profilo, in ordine di pubblicazione"""
+    frame = frame.sort_values(['username', 'date'], kind='stable')
+    frame['rolling_engagement'] = (
+        frame.groupby('username', sort=False)['engagement_rate']
+        .transform(lambda rates: rates.rolling(window, min_periods=1).mean())
+    )
+    return frame
+
+def _percentiles(frame: pd.DataFrame, column: str, percentiles: Sequence[int]) -> pd.DataFrame:
+    quantiles = frame.groupby('username')[column].quantile([p / 100 for p in percentiles]).unstack()
+    quantiles.columns = [f'{column}_p{p}' for p in percentiles]
+    return quantiles
+
+def engagement_summary(frame: pd.DataFrame, percentiles: Sequence[int] = DEFAULT_PERCENTILES) -> pd.DataFrame:
+    """Distribuzione di engagement e interazioni per profilo: media, deviazione standard e percentili"""
+    grouped = frame.groupby('username')
+    summary = pd.DataFrame({
+        'posts': grouped['post_url'].count(),
+        'average_engagement': grouped['engagement_rate'].mean(),
+        'engagement_std': grouped['engagement_rate'].std(),
+        'average_likes': grouped['likes'].mean(),
+        'average_comments': grouped['comments'].mean(),
+        'average_shares': grouped['shares'].mean()
+    })
+    parts = [summary] + [_percentiles(frame, column, percentiles)
+                         for column in ('engagement_rate', 'likes', 'comments', 'shares')]
+    return pd.concat(parts, axis=1)
+
+def comments_frame(profile_data: Dict) -> pd.DataFrame:
+    """Un DataFrame con un commento per riga, nell'ordine di post e commenti dello snapshot"""
+    interactions = profile_data.get('interactions', {})
+    rows = [
+        (post['url'], comment.get('username', ''), comment.get('likes'), comment.get('date', ''))
+        for post in profile_data.get('posts', [])
+        for comment in (interactions.get(post['url']) or {}).get('comments', [])
+    ]
+    frame = pd.DataFrame(rows, columns=['post_url', 'username', 'likes', 'date'])
+    frame['likes'] = pd.array(parse_counts(frame['likes']), dtype='Int64')
+    return frame
+
+def commenter_stats(profile_data: Dict) -> Dict[str, Dict]:
+    """Numero di commenti, like totali e ultima interazione di ogni utente che ha commentato"""
+    frame = comments_frame(profile_data)
+    if frame.empty:
+        return {}
+    grouped = frame.groupby('username', sort=False)
+    stats = pd.DataFrame({
+        'comment_count': grouped.size(),
+        'total_likes': grouped['likes'].sum().astype(int),
+        'last_interaction': grouped['date'].last()
+    })
+    return stats.to_dict(orient='index')
+
+def to_records(frame: pd.DataFrame) -> List[Dict]:
+    """Righe del DataFrame come dizionari serializzabili in JSON (NaN diventa None)"""
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient='records')
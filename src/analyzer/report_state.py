@@ -0,0 +1,364 @@
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+
+from config.config import (
+    SENTIMENT_THRESHOLD,
+    ENGAGEMENT_RATE_THRESHOLD,
+    TRENDING_TOPICS_MIN_OCCURRENCES,
+    REPUTATION_RISK_THRESHOLD,
+    REPORT_NARRATIVE_THRESHOLD,
+    REPORT_NARRATIVE_MAX_AGE,
+    REPORT_SEEN_COMMENTS_MAX_AGE,
+    REPORT_STATE_DIR
+)
+from src.analyzer.metrics_engine import (
+    add_rolling_engagement,
+    commenter_stats,
+    engagement_summary,
+    posts_frame,
+    to_records
+)
+from src.analyzer.trending import comment_key, extract_hashtags, extract_mentions
+from src.utils.file_lock import file_lock
+from src.utils.json_io import EXTENSIONS, json_extension, read_json, write_json
+
+STATE_VERSION = 2
+# Lo stato della versione 1 (commenti visti senza post) viene convertito al caricamento
+COMPATIBLE_VERSIONS = (1, STATE_VERSION)
+# Gruppo dei commenti visti convertiti dalla versione 1, dimenticati dopo REPORT_SEEN_COMMENTS_MAX_AGE
+LEGACY_COMMENTS = ''
+# Testi scritti da GPT in ogni analisi, riutilizzati finché gli aggregati non cambiano abbastanza
+NARRATIVE_FIELDS = {
+    'sentiment': ('detailed_analysis',),
+    'engagement': ('analysis',),
+    'trending_topics': ('trending_topics', 'content_themes'),
+    'reputation_risks': ('risk_analysis',),
+    'interactions': ('analysis',)
+}
+ENGAGEMENT_COLUMNS = ['post_url', 'engagement_rate', 'likes', 'comments', 'shares', 'date']
+NARRATIVE_TOP_HASHTAGS = 3
+
+def risk_level(average_sentiment: float) -> str:
+    """Livello di rischio reputazionale dal sentiment medio di descrizioni e commenti"""
+    if average_sentiment < -REPUTATION_RISK_THRESHOLD:
+        return 'high'
+    return 'medium' if average_sentiment < 0 else 'low'
+
+def _relative_change(previous: Optional[float], current: Optional[float]) -> float:
+    if previous is None or current is None:
+        return 0.0 if previous == current else float('inf')
+    if previous == 0:
+        return 0.0 if current == 0 else float('inf')
+    return abs(current - previous) / abs(previous)
+
+class ProfileAggregates:
+    """
+    Stato aggregato di un profilo, aggiornato solo con i post e i commenti nuovi di ogni snapshot.
+    I commenti già contati sono raggruppati per post e dimenticati quando il post manca dagli snapshot da
+    REPORT_SEEN_COMMENTS_MAX_AGE: a quel punto non può più ricomparire tra i post recenti.
+    """
+
+    def __init__(self, username: str, state: Optional[Dict] = None, state_dir: str = REPORT_STATE_DIR):
+        state = state or {}
+        self.username = username
+        self.state_dir = Path(state_dir)
+        self.revision = state.get('revision', 0)
+        self.seen_posts = set(state.get('seen_posts', []))
+        seen_comments = state.get('seen_comments', {})
+        if isinstance(seen_comments, list):
+            seen_comments = {LEGACY_COMMENTS: seen_comments} if seen_comments else {}
+        self.seen_comments: Dict[str, Set[str]] = {post_url: set(keys) for post_url, keys in seen_comments.items()}
+        # Ultima comparsa in uno snapshot di ogni post con commenti visti
+        self.comments_seen_at: Dict[str, float] = state.get('comments_seen_at') or \
+            {post_url: time.time() for post_url in self.seen_comments}
+        # Polarità di descrizioni e commenti, e delle sole descrizioni
+        self.sentiment = state.get('sentiment', {'sum': 0.0, 'count': 0, 'negative': 0})
+        self.description_sentiment = state.get('description_sentiment', {'sum': 0.0, 'count': 0})
+        self.labels = Counter(state.get('labels', {}))
+        self.hashtags = Counter(state.get('hashtags', {}))
+        self.mentions = set(state.get('mentions', []))
+        self.interactors: Dict[str, Dict] = state.get('interactors', {})
+        # Metriche più recenti di ogni post visto, per la serie dell'engagement
+        self.posts: Dict[str, Dict] = state.get('posts', {})
+        self.narrative: Optional[Dict] = state.get('narrative')
+        self.texts_since_narrative = state.get('texts_since_narrative', 0)
+        # Aggiornamenti non ancora salvati, da riapplicare allo stato salvato nel frattempo da altri processi
+        self._pending: List[Tuple] = []
+
+    @property
+    def path(self) -> Path:
+        return self.state_dir / f"{self.username}{json_extension()}"
+
+    @property
+    def lock_path(self) -> str:
+        # Indipendente dall'estensione, che cambia con la compressione
+        return str(self.state_dir / self.username)
+
+    @classmethod
+    def load(cls, username: str, state_dir: str = REPORT_STATE_DIR) -> 'ProfileAggregates':
+        """Stato salvato del profilo; vuoto (report completo) se assente o di una versione precedente"""
+        for extension in EXTENSIONS:
+            path = Path(state_dir) / f"{username}{extension}"
+            if path.exists():
+                state = read_json(path)
+                if state.get('version') in COMPATIBLE_VERSIONS:
+                    return cls(username, state, state_dir)
+        return cls(username, state_dir=state_dir)
+
+    def save(self):
+        """
+        Salva lo stato sotto un lock tra processi. Se un altro processo ha salvato dopo il caricamento, gli
+        aggiornamenti di questo processo vengono riapplicati al suo stato (senza ricontare i contenuti che
+        ha già contato) invece di sovrascriverlo. Va chiamato solo dopo aver salvato il report.
+        """
+        with file_lock(self.lock_path):
+            saved = ProfileAggregates.load(self.username, str(self.state_dir))
+            target = self if saved.revision == self.revision else self._merged_into(saved)
+            target.revision += 1
+            target._write()
+            self._pending = []
+
+    def _merged_into(self, saved: 'ProfileAggregates') -> 'ProfileAggregates':
+        for profile_data, new_posts, new_comments, scores, labels in self._pending:
+            still_new_posts, still_new_comments = saved.new_content(profile_data)
+            post_urls = {post['url'] for post in still_new_posts}
+            comment_keys = {comment_key(post_url, comment) for post_url, comment in still_new_comments}
+            # Gli indici seguono l'ordine di scores: prima le descrizioni dei post, poi i commenti
+            kept = [i for i, post in enumerate(new_posts) if post['url'] in post_urls] + \
+                [len(new_posts) + i for i, (post_url, comment) in enumerate(new_comments)
+                 if comment_key(post_url, comment) in comment_keys]
+            saved.update(profile_data,
+                         [post for post in new_posts if post['url'] in post_urls],
+                         [(post_url, comment) for post_url, comment in new_comments
+                          if comment_key(post_url, comment) in comment_keys],
+                         [scores[i] for i in kept],
+                         [labels[i] for i in kept] if labels else labels)
+        if self.narrative and (not saved.narrative or self.narrative['generated_at'] > saved.narrative['generated_at']):
+            saved.narrative = self.narrative
+            saved.texts_since_narrative = self.texts_since_narrative
+        return saved
+
+    def _write(self):
+        write_json(self.path, {
+            'version': STATE_VERSION,
+            'revision': self.revision,
+            'username': self.username,
+            'updated_at': datetime.now().isoformat(),
+            'seen_posts': sorted(self.seen_posts),
+            'seen_comments': {post_url: sorted(keys) for post_url, keys in self.seen_comments.items()},
+            'comments_seen_at': self.comments_seen_at,
+            'sentiment': self.sentiment,
+            'description_sentiment': self.description_sentiment,
+            'labels': dict(self.labels),
+            'hashtags': dict(self.hashtags),
+            'mentions': sorted(self.mentions),
+            'interactors': self.interactors,
+            'posts': self.posts,
+            'narrative': self.narrative,
+            'texts_since_narrative': self.texts_since_narrative
+        })
+        # Un solo file di stato per profilo, anche se la compressione cambia
+        for extension in EXTENSIONS:
+            sibling = self.state_dir / f"{self.username}{extension}"
+            if sibling != self.path and sibling.exists():
+                sibling.unlink()
+
+    def new_content(self, profile_data: Dict) -> Tuple[List[Dict], List[Tuple[str, Dict]]]:
+        """Post e commenti dello snapshot non ancora inclusi negli aggregati"""
+        new_posts = [post for post in profile_data.get('posts', []) if post['url'] not in self.seen_posts]
+        new_comments, keys = [], set()
+        for post in profile_data.get('posts', []):
+            for comment in (profile_data.get('interactions', {}).get(post['url']) or {}).get('comments', []):
+                key = comment_key(post['url'], comment)
+                if not self._comment_seen(post['url'], key) and key not in keys:
+                    keys.add(key)
+                    new_comments.append((post['url'], comment))
+        return new_posts, new_comments
+
+    def _comment_seen(self, post_url: str, key: str) -> bool:
+        return key in self.seen_comments.get(post_url, ()) or key in self.seen_comments.get(LEGACY_COMMENTS, ())
+
+    def _expire_seen_comments(self, now: float, max_age: float = REPORT_SEEN_COMMENTS_MAX_AGE):
+        for post_url in [post_url for post_url, seen_at in self.comments_seen_at.items() if now - seen_at > max_age]:
+            self.seen_comments.pop(post_url, None)
+            del self.comments_seen_at[post_url]
+
+    def update(self, profile_data: Dict, new_posts: List[Dict], new_comments: List[Tuple[str, Dict]],
+               scores: Sequence[float], labels: Optional[List[Dict]] = None):
+        """
+        Aggiunge agli aggregati i contenuti nuovi. scores (e labels, se presenti) seguono l'ordine
+        delle descrizioni dei nuovi post e poi dei testi dei nuovi commenti.
+        """
+        description_scores = list(scores[:len(new_posts)])
+        self.sentiment['sum'] += float(sum(scores))
+        self.sentiment['count'] += len(scores)
+        self.sentiment['negative'] += sum(1 for score in scores if score < -SENTIMENT_THRESHOLD)
+        self.description_sentiment['sum'] += float(sum(description_scores))
+        self.description_sentiment['count'] += len(description_scores)
+        if labels:
+            self.labels.update(item['label'] for item in labels)
+
+        for post in new_posts:
+            self.hashtags.update(extract_hashtags(post.get('description', '')))
+            self.mentions.update(extract_mentions(post.get('description', '')))
+
+        # Statistiche dei soli commenti nuovi, sommate a quelle già accumulate
+        new_interactions = {}
+        for post_url, comment in new_comments:
+            new_interactions.setdefault(post_url, {'comments': []})['comments'].append(comment)
+        delta = commenter_stats({'posts': [{'url': url} for url in new_interactions], 'interactions': new_interactions})
+        for user, stats in delta.items():
+            current = self.interactors.setdefault(user, {'comment_count': 0, 'total_likes': 0, 'last_interaction': ''})
+            current['comment_count'] += int(stats['comment_count'])
+            current['total_likes'] += int(stats['total_likes'])
+            current['last_interaction'] = stats['last_interaction'] or current['last_interaction']
+
+        # I conteggi dei post già visti cambiano nel tempo: si aggiornano quelli presenti nello snapshot
+        frame = posts_frame([profile_data])
+        for record in to_records(frame[ENGAGEMENT_COLUMNS]):
+            record['date'] = record['date'].isoformat() if record['date'] is not None else None
+            self.posts[record['post_url']] = record
+
+        self.seen_posts.update(post['url'] for post in new_posts)
+        for post_url, comment in new_comments:
+            self.seen_comments.setdefault(post_url, set()).add(comment_key(post_url, comment))
+        now = time.time()
+        for post in profile_data.get('posts', []):
+            if post['url'] in self.seen_comments:
+                self.comments_seen_at[post['url']] = now
+        self._expire_seen_comments(now)
+        self.texts_since_narrative += len(scores)
+        self._pending.append((profile_data, new_posts, new_comments, list(scores), labels))
+
+    def _engagement_frame(self) -> pd.DataFrame:
+        frame = pd.DataFrame(list(self.posts.values()), columns=ENGAGEMENT_COLUMNS)
+        frame['username'] = self.username
+        for column in ('engagement_rate', 'likes', 'comments', 'shares'):
+            frame[column] = pd.to_numeric(frame[column], errors='coerce')
+        frame['date'] = pd.to_datetime(frame['date'], errors='coerce', utc=True, format='ISO8601')
+        return add_rolling_engagement(frame)
+
+    def summary(self) -> Dict:
+        """Valori confrontati con quelli dell'ultima narrativa per decidere se rigenerarla"""
+        engagement = pd.to_numeric(pd.Series([post['engagement_rate'] for post in self.posts.values()], dtype=object),
+                                   errors='coerce')
+        count = self.sentiment['count']
+        return {
+            'average_engagement': float(engagement.mean()) if engagement.notna().any() else None,
+            'average_sentiment': self.sentiment['sum'] / count if count else 0.0,
+            'negative_share': self.sentiment['negative'] / count if count else 0.0,
+            'top_hashtags': [tag for tag, _ in self.hashtags.most_common(NARRATIVE_TOP_HASHTAGS)],
+            'texts': count
+        }
+
+    def narrative_reason(self, threshold: float = REPORT_NARRATIVE_THRESHOLD,
+                         max_age: float = REPORT_NARRATIVE_MAX_AGE) -> Optional[str]:
+        """Motivo per cui GPT deve riscrivere le analisi; None se quelle precedenti sono ancora valide"""
+        if not self.narrative:
+            return 'no previous narrative'
+        if time.time() - self.narrative['generated_at'] > max_age:
+            return 'narrative too old'
+
+        previous, current = self.narrative['summary'], self.summary()
+        if _relative_change(previous['average_engagement'], current['average_engagement']) > threshold:
+            return 'engagement changed'
+        # Sentiment e quote sono già su scala fissa: si confronta la differenza assoluta
+        if abs(current['average_sentiment'] - previous['average_sentiment']) > threshold:
+            return 'sentiment changed'
+        if abs(current['negative_share'] - previous['negative_share']) > threshold:
+            return 'negative share changed'
+        if current['texts'] and self.texts_since_narrative / current['texts'] > threshold:
+            return 'new content'
+        if set(current['top_hashtags']) != set(previous['top_hashtags']):
+            return 'top hashtags changed'
+        return None
+
+    def set_narrative(self, report: Dict):
+        """Conserva i testi di GPT di un report completo; quelli delle analisi fallite restano i precedenti"""
+        texts = dict((self.narrative or {}).get('texts', {}))
+        for analysis, fields in NARRATIVE_FIELDS.items():
+            result = report['raw_data'].get(analysis, {})
+            if 'error' not in result:
+                texts[analysis] = {field: result.get(field) for field in fields}
+        self.narrative = {
+            'generated_at': time.time(),
+            'summary': self.summary(),
+            'texts': texts,
+            'executive_summary': report['executive_summary']
+        }
+        self.texts_since_narrative = 0
+
+    def build_report(self, profile_data: Dict) -> Dict:
+        """Report con la stessa struttura di quello completo: numeri dagli aggregati, testi dall'ultima narrativa"""
+        narrative = self.narrative or {}
+        text = lambda analysis, field: narrative.get('texts', {}).get(analysis, {}).get(field)
+
+        metrics, distribution, average_engagement = [], {}, None
+        if self.posts:
+            frame = self._engagement_frame()
+            metrics = [
+                {
+                    'post_url': row['post_url'],
+                    'engagement_rate': row['engagement_rate'],
+                    'rolling_engagement': row['rolling_engagement'],
+                    'metrics': {'likes': row['likes'], 'comments': row['comments'], 'shares': row['shares']}
+                }
+                for row in to_records(frame[['post_url', 'engagement_rate', 'rolling_engagement',
+                                             'likes', 'comments', 'shares']])
+            ]
+            distribution = to_records(engagement_summary(frame))[0]
+            average_engagement = distribution['average_engagement']
+
+        description_count = self.description_sentiment['count']
+        basic_sentiment = self.description_sentiment['sum'] / description_count if description_count else 0.0
+        summary = self.summary()
+
+        raw_data = {
+            'profile_info': profile_data['profile_info'],
+            'sentiment': {
+                'basic_sentiment': basic_sentiment,
+                'detailed_analysis': text('sentiment', 'detailed_analysis'),
+                'is_negative': basic_sentiment < -SENTIMENT_THRESHOLD
+            },
+            'engagement': {
+                'metrics': metrics,
+                'average_engagement': average_engagement,
+                'distribution': distribution,
+                'analysis': text('engagement', 'analysis'),
+                'is_performing_well': average_engagement is not None and average_engagement > ENGAGEMENT_RATE_THRESHOLD
+            },
+            'trending_topics': {
+                'trending_topics': text('trending_topics', 'trending_topics'),
+                'hashtag_analysis': {tag: count for tag, count in self.hashtags.most_common()
+                                     if count >= TRENDING_TOPICS_MIN_OCCURRENCES},
+                'content_themes': text('trending_topics', 'content_themes') or {}
+            },
+            'reputation_risks': {
+                'risk_analysis': text('reputation_risks', 'risk_analysis'),
+                'average_sentiment': summary['average_sentiment'],
+                'risk_level': risk_level(summary['average_sentiment']),
+                'negative_content_percentage': summary['negative_share'],
+                'sentiment_labels': dict(self.labels) if self.labels else None
+            },
+            'interactions': {
+                'interactions': self.interactors,
+                'mentioned_users': sorted(self.mentions),
+                'analysis': text('interactions', 'analysis'),
+                'top_interactors': sorted(
+                    self.interactors.items(),
+                    key=lambda x: x[1]['comment_count'],
+                    reverse=True
+                )[:10]
+            }
+        }
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'username': self.username,
+            'raw_data': raw_data,
+            'executive_summary': narrative.get('executive_summary')
+        }
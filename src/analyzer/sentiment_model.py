@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import FeatureUnion, Pipeline
+
+from config.config import (
+    SENTIMENT_ESCALATION_THRESHOLD,
+    SENTIMENT_MODEL_FILE,
+    SENTIMENT_LABELS_FILE
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LABELS = ('negative', 'neutral', 'positive')
+# Solo le polarità TextBlob nette diventano etichette di partenza; le altre sono lasciate a GPT
+WEAK_LABEL_POLARITY = 0.5
+
+def weak_label(polarity: float, subjectivity: float) -> Optional[str]:
+    """Etichetta ricavata da TextBlob, solo quando il testo è chiaramente positivo, negativo o oggettivo"""
+    if polarity >= WEAK_LABEL_POLARITY:
+        return 'positive'
+    if polarity <= -WEAK_LABEL_POLARITY:
+        return 'negative'
+    if polarity == 0 and subjectivity == 0:
+        return 'neutral'
+    return None
+
+def parse_label(response: str) -> Optional[str]:
+    """Etichetta contenuta nella risposta di GPT; None se assente o ambigua"""
+    found = [label for label in LABELS if label in response.lower()]
+    return found[0] if len(found) == 1 else None
+
+class SentimentModel:
+    """Classificatore locale del sentiment: TF-IDF su parole e caratteri (per emoji e slang) e regressione logistica"""
+
+    def __init__(self, pipeline: Pipeline, metrics: Optional[Dict] = None):
+        self.pipeline = pipeline
+        self.metrics = metrics or {}
+
+    @classmethod
+    def train(cls, texts: Sequence[str], labels: Sequence[str]) -> 'SentimentModel':
+        pipeline = Pipeline([
+            ('features', FeatureUnion([
+                ('words', TfidfVectorizer(ngram_range=(1, 2), min_df=2, sublinear_tf=True)),
+                ('chars', TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 5), min_df=2, sublinear_tf=True))
+            ])),
+            ('classifier', LogisticRegression(max_iter=1000, class_weight='balanced'))
+        ])
+        pipeline.fit(list(texts), list(labels))
+        return cls(pipeline)
+
+    def predict(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Etichetta, confidenza e polarità (P(positivo) - P(negativo)) di tutti i testi in un solo passaggio"""
+        if not len(texts):
+            return np.array([], dtype=object), np.array([]), np.array([])
+        probabilities = self.pipeline.predict_proba(list(texts))
+        classes = [str(label) for label in self.pipeline.classes_]
+        best = probabilities.argmax(axis=1)
+        column = lambda label: probabilities[:, classes.index(label)] if label in classes else 0.0
+        polarity = column('positive') - column('negative')
+        return np.asarray(classes, dtype=object)[best], probabilities.max(axis=1), polarity
+
+    def save(self, path: str = SENTIMENT_MODEL_FILE):
+        # Scrittura atomica: i processi che stanno caricando il modello non leggono mai un file parziale
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump({'pipeline': self.pipeline, 'metrics': self.metrics, 'trained_at': time.time()}, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = SENTIMENT_MODEL_FILE) -> 'SentimentModel':
+        data = joblib.load(path)
+        return cls(data['pipeline'], data.get('metrics'))
+
+_model: Optional[SentimentModel] = None
+_model_mtime: Optional[float] = None
+_model_lock = threading.Lock()
+
+def get_sentiment_model(path: str = SENTIMENT_MODEL_FILE) -> Optional[SentimentModel]:
+    """Modello condiviso dal processo, ricaricato se il file cambia; None se non è ancora stato addestrato"""
+    global _model, _model_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _model_lock:
+        if _model is None or mtime != _model_mtime:
+            _model = SentimentModel.load(path)
+            _model_mtime = mtime
+            logger.info(f"Loaded sentiment model from {path}")
+        return _model
+
+def record_labels(texts: Sequence[str], labels: Sequence[str], path: str = SENTIMENT_LABELS_FILE):
+    """Aggiunge le etichette decise da GPT al dataset usato per riaddestrare il modello"""
+    with _model_lock, open(path, 'a', encoding='utf-8') as f:
+        for text, label in zip(texts, labels):
+            f.write(json.dumps({'text': text, 'label': label}, ensure_ascii=False) + '\n')
+
+def load_labels(path: str = SENTIMENT_LABELS_FILE) -> Dict[str, str]:
+    """Etichette salvate (le più recenti prevalgono)"""
+    labels = {}
+    if not Path(path).exists():
+        return labels
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get('label') in LABELS and entry.get('text'):
+                labels[entry['text']] = entry['label']
+    return labels
+
+def snapshot_texts() -> List[str]:
+    """Descrizioni e commenti dell'ultimo snapshot di ogni profilo salvato"""
+    from src.database.storage import get_storage
+
+    storage = get_storage()
+    texts = []
+    for username in storage.list_profiles():
+        snapshot = storage.load_latest_snapshot(username) or {}
+        for post in snapshot.get('posts', []):
+            texts.append(post.get('description', ''))
+            comments = (snapshot.get('interactions', {}).get(post['url']) or {}).get('comments', [])
+            texts.extend(comment.get('text', '') for comment in comments)
+    return [text for text in dict.fromkeys(texts) if text.strip()]
+
+def training_data(texts: Iterable[str], labels_file: str = SENTIMENT_LABELS_FILE) -> Tuple[List[str], List[str], int]:
+    """Testi ed etichette: quelle di GPT dove presenti, altrimenti quelle nette di TextBlob"""
+    from textblob import TextBlob
+
+    gold = load_labels(labels_file)
+    data = dict(gold)
+    for text in texts:
+        if text not in data:
+            sentiment = TextBlob(text).sentiment
+            label = weak_label(sentiment.polarity, sentiment.subjectivity)
+            if label:
+                data[text] = label
+    return list(data), list(data.values()), len(gold)
+
+def evaluate(model: SentimentModel, texts: Sequence[str], labels: Sequence[str],
+             threshold: float = SENTIMENT_ESCALATION_THRESHOLD) -> Dict:
+    """Accuratezza complessiva e sui soli testi che il modello tratterrebbe senza chiedere a GPT"""
+    predicted, confidence, _ = model.predict(texts)
+    labels = np.asarray(labels, dtype=object)
+    confident = confidence >= threshold
+    return {
+        'samples': len(labels),
+        'accuracy': float(accuracy_score(labels, predicted)),
+        'macro_f1': float(f1_score(labels, predicted, average='macro')),
+        'threshold': threshold,
+        # Quota di testi risolti localmente e loro accuratezza
+        'coverage': float(confident.mean()) if len(labels) else 0.0,
+        'confident_accuracy': float((predicted[confident] == labels[confident]).mean()) if confident.any() else 0.0
+    }
+
+def train_model(texts: Sequence[str], labels_file: str = SENTIMENT_LABELS_FILE, test_size: float = 0.2,
+                path: str = SENTIMENT_MODEL_FILE) -> Dict:
+    """Addestra, valuta su una parte esclusa dall'addestramento, riaddestra su tutto e salva il modello"""
+    texts, labels, gold = training_data(texts, labels_file)
+    if len(set(labels)) < 2:
+        raise ValueError("Not enough labelled texts to train the sentiment model")
+
+    train_texts, test_texts, train_labels, test_labels = train_test_split(
+        texts, labels, test_size=test_size, random_state=42, stratify=labels
+    )
+    metrics = evaluate(SentimentModel.train(train_texts, train_labels), test_texts, test_labels)
+    metrics.update({'training_samples': len(texts), 'gpt_labels': gold})
+
+    model = SentimentModel.train(texts, labels)
+    model.metrics = metrics
+    model.save(path)
+    return metrics
+
+def run_benchmark(texts: Sequence[str], model: SentimentModel, threshold: float = SENTIMENT_ESCALATION_THRESHOLD,
+                  llm_latency: float = 2.0, llm_concurrency: int = 4) -> Dict:
+    """
+    Confronta il percorso attuale (TextBlob più una richiesta GPT per testo) con quello a livelli.
+    Le richieste GPT non vengono eseguite: il loro tempo è stimato da latenza e concorrenza indicate.
+    """
+    from textblob import TextBlob
+
+    start = time.perf_counter()
+    [TextBlob(text).sentiment.polarity for text in texts]
+    textblob_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, confidence, _ = model.predict(texts)
+    local_s = time.perf_counter() - start
+    escalated = int((confidence < threshold).sum())
+
+    llm_time = lambda calls: -(-calls // max(1, llm_concurrency)) * llm_latency
+    return {
+        'texts': len(texts),
+        'threshold': threshold,
+        'current': {'llm_calls': len(texts), 'local_s': textblob_s, 'estimated_s': textblob_s + llm_time(len(texts))},
+        'tiered': {'llm_calls': escalated, 'local_s': local_s, 'estimated_s': local_s + llm_time(escalated),
+                   'texts_per_s': len(texts) / local_s if local_s else 0.0},
+        'llm_calls_saved': 1 - escalated / len(texts) if len(texts) else 0.0
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Modello locale del sentiment')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help='Addestra il modello su snapshot ed etichette di GPT')
+    train_parser.add_argument('--labels', default=SENTIMENT_LABELS_FILE, help='File JSONL {"text", "label"}')
+
+    evaluate_parser = subparsers.add_parser('evaluate', help='Valuta il modello salvato su un file etichettato')
+    evaluate_parser.add_argument('--labels', required=True,
+                                 help=f'File JSONL {{"text", "label"}} escluso dall\'addestramento (non {SENTIMENT_LABELS_FILE})')
+    evaluate_parser.add_argument('--threshold', type=float, default=SENTIMENT_ESCALATION_THRESHOLD)
+
+    benchmark_parser = subparsers.add_parser('benchmark', help='Confronta il percorso attuale con quello a livelli')
+    benchmark_parser.add_argument('--threshold', type=float, default=SENTIMENT_ESCALATION_THRESHOLD)
+    benchmark_parser.add_argument('--llm-latency', type=float, default=2.0, help='Secondi stimati per richiesta GPT')
+    benchmark_parser.add_argument('--llm-concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        print(json.dumps(train_model(snapshot_texts(), args.labels), indent=2))
+    else:
+        model = get_sentiment_model()
+        if model is None:
+            raise SystemExit(f"No sentiment model at {SENTIMENT_MODEL_FILE}, run the train command first")
+        if args.command == 'evaluate':
+            # Il modello salvato è addestrato anche su SENTIMENT_LABELS_FILE: valutarlo lì misurerebbe la memoria,
+            # non l'accuratezza (quella su una parte esclusa è in model.metrics, stampata da train)
+            if not os.path.exists(args.labels):
+                raise SystemExit(f"Labels file not found: {args.labels}")
+            if os.path.exists(SENTIMENT_LABELS_FILE) and os.path.samefile(args.labels, SENTIMENT_LABELS_FILE):
+                raise SystemExit(f"{args.labels} is the training set, pass a held-out labels file")
+            held_out = load_labels(args.labels)
+            training = load_labels()
+            labelled = {text: label for text, label in held_out.items() if text not in training}
+            if not labelled:
+                raise SystemExit(f"No labelled texts in {args.labels} outside the training set")
+            metrics = evaluate(model, list(labelled), list(labelled.values()), args.threshold)
+            metrics['excluded_training_texts'] = len(held_out) - len(labelled)
+            print(json.dumps(metrics, indent=2))
+        else:
+            print(json.dumps(run_benchmark(snapshot_texts(), model, args.threshold,
+                                           args.llm_latency, args.llm_concurrency), indent=2))
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from textblob import TextBlob
+
+from config.config import (
+    SENTIMENT_WORKERS,
+    SENTIMENT_BATCH_SIZE,
+    SENTIMENT_CACHE_SIZE
+)
+
+def score_batch(texts: List[str]) -> List[float]:
+    """Polarità TextBlob di un gruppo di testi; eseguita nei processi del pool"""
+    return [TextBlob(text).sentiment.polarity for text in texts]
+
+def text_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+class SentimentService:
+    """Calcolo del sentiment fuori dall'event loop, in un pool di processi, con memoizzazione per hash del testo"""
+
+    def __init__(self, max_workers: int = SENTIMENT_WORKERS, batch_size: int = SENTIMENT_BATCH_SIZE,
+                 cache_size: int = SENTIMENT_CACHE_SIZE):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = max(1, batch_size)
+        self.cache_size = cache_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._scores: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Statistiche
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # Il pool viene creato al primo utilizzo, così importare il modulo non avvia processi
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _lookup(self, keys: List[bytes]) -> Dict[bytes, float]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    found[key] = self._scores[key]
+        return found
+
+    def _remember(self, scores: Dict[bytes, float]):
+        with self._lock:
+            self._scores.update(scores)
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+
+    def _prepare(self, texts: Sequence[str]) -> Tuple[List[bytes], Dict[bytes, float], Dict[bytes, str]]:
+        keys = [text_hash(text) for text in texts]
+        known = self._lookup(list(dict.fromkeys(keys)))
+
+        # Un solo calcolo per ogni testo distinto non ancora memorizzato
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in known and key not in pending:
+                pending[key] = text
+        return keys, known, pending
+
+    async def score(self, texts: Sequence[str]) -> List[float]:
+        """Polarità di ogni testo, nello stesso ordine; testi ripetuti o già visti non vengono ricalcolati"""
+        loop = asyncio.get_running_loop()
+        if len(texts) > self.batch_size:
+            # Con molti testi anche calcolare gli hash occuperebbe l'event loop
+            keys, known, pending = await loop.run_in_executor(None, self._prepare, texts)
+        else:
+            keys, known, pending = self._prepare(texts)
+        self.hits += len(texts) - len(pending)
+        self.misses += len(pending)
+
+        if pending:
+            pending_keys = list(pending)
+            pending_texts = list(pending.values())
+            # Gruppi abbastanza piccoli da occupare tutti i processi, abbastanza grandi da ammortizzare il passaggio dei dati
+            size = min(self.batch_size, -(-len(pending_texts) // self.max_workers))
+            batches = [pending_texts[i:i + size] for i in range(0, len(pending_texts), size)]
+            results = await asyncio.gather(*(loop.run_in_executor(self.executor, score_batch, batch) for batch in batches))
+            computed = dict(zip(pending_keys, (score for batch in results for score in batch)))
+            self._remember(computed)
+            known.update(computed)
+
+        return [known[key] for key in keys]
+
+    async def polarity(self, text: str) -> float:
+        """Polarità di un singolo testo"""
+        return (await self.score([text]))[0]
+
+    def stats(self) -> Dict:
+        """Testi serviti dalla memoria, testi calcolati e dimensione della memoria"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'cached_scores': len(self._scores),
+            'workers': self.max_workers
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+_sentiment_service: Optional[SentimentService] = None
+
+def get_sentiment_service() -> SentimentService:
+    """Restituisce il servizio condiviso dal processo"""
+    global _sentiment_service
+    if _sentiment_service is None:
+        _sentiment_service = SentimentService()
+    return _sentiment_service
+
+def close_sentiment_service():
+    """Chiude il pool di processi del servizio condiviso, se è stato creato"""
+    if _sentiment_service is not None:
+        _sentiment_service.close()
@@ -0,0 +1,431 @@
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config.config import (
+    TRENDING_BUCKET_SECONDS,
+    TRENDING_RETENTION,
+    TRENDING_SKETCH_WIDTH,
+    TRENDING_SKETCH_DEPTH,
+    TRENDING_CANDIDATES,
+    TRENDING_SEEN_BITS,
+    TRENDING_SEEN_GENERATIONS,
+    TRENDING_SAVE_INTERVAL,
+    TRENDING_STATE_FILE
+)
+from src.utils.file_lock import file_lock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 2
+# Hashtag e menzioni non preceduti da lettere (esclude email e 'a#b'); le menzioni possono contenere punti interni
+TOKEN_PATTERN = re.compile(r'(?<![\w#@])(?:#(\w+)|@(\w(?:[\w.]*\w)?))')
+KINDS = ('hashtag', 'mention')
+MAX_TRACKED_PROFILES = 100
+WINDOW_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+# Funzioni di hash dei filtri di Bloom dei contenuti visti: circa 1% di falsi positivi a 800 mila contenuti per filtro
+SEEN_HASHES = 7
+
+def extract_tokens(text: str) -> List[str]:
+    """Hashtag ('#tag') e menzioni ('@utente') del testo, normalizzati in minuscolo"""
+    return [f"#{hashtag.casefold()}" if hashtag else f"@{mention.casefold()}"
+            for hashtag, mention in TOKEN_PATTERN.findall(text or '')]
+
+def extract_hashtags(text: str) -> List[str]:
+    return [token for token in extract_tokens(text) if token[0] == '#']
+
+def extract_mentions(text: str) -> List[str]:
+    return [token for token in extract_tokens(text) if token[0] == '@']
+
+def token_kind(token: str) -> str:
+    return 'hashtag' if token[0] == '#' else 'mention'
+
+def comment_key(post_url: str, comment: Dict) -> str:
+    """Identità di un commento tra snapshot diversi (la data relativa, es. '2d ago', cambia e viene esclusa)"""
+    payload = json.dumps([post_url, comment.get('username', ''), comment.get('text', '')], ensure_ascii=False)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+def parse_window(window: str) -> int:
+    """Durata in secondi di una finestra come '30m', '24h' o '7d'"""
+    match = re.fullmatch(r'\s*(\d+)\s*([mhd])\s*', window.lower())
+    if not match:
+        raise ValueError(f"Invalid window '{window}', expected e.g. 30m, 24h or 7d")
+    return int(match.group(1)) * WINDOW_UNITS[match.group(2)]
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+class SpaceSaving:
+    """
+    Heavy hitter con memoria limitata (algoritmo Space-Saving, aggiornato a blocchi): al massimo capacity
+    elementi, ognuno con un conteggio che sovrastima quello reale di al più 'error'.
+    """
+
+    def __init__(self, capacity: int, entries: Optional[Dict[str, List]] = None, floor: int = 0):
+        self.capacity = capacity
+        # token -> [conteggio, errore, profili]
+        self.entries: Dict[str, List] = {token: [count, error, set(profiles)]
+                                         for token, (count, error, profiles) in (entries or {}).items()}
+        # Conteggio massimo di un elemento non tracciato
+        self.floor = floor
+
+    def update(self, counts: Dict[str, int], username: Optional[str] = None):
+        for token, count in counts.items():
+            entry = self.entries.get(token)
+            if entry is None:
+                entry = self.entries[token] = [self.floor, self.floor, set()]
+            entry[0] += count
+            if username and len(entry[2]) < MAX_TRACKED_PROFILES:
+                entry[2].add(username)
+
+        if len(self.entries) > self.capacity:
+            kept = heapq.nlargest(self.capacity, self.entries.items(), key=lambda item: item[1][0])
+            kept_tokens = {token for token, _ in kept}
+            self.floor = max([self.floor] + [entry[0] for token, entry in self.entries.items() if token not in kept_tokens])
+            self.entries = dict(kept)
+
+    def to_dict(self) -> Dict:
+        return {
+            'floor': self.floor,
+            'entries': {token: [count, error, sorted(profiles)] for token, (count, error, profiles) in self.entries.items()}
+        }
+
+class _Bucket:
+    def __init__(self, start: int, depth: int, width: int, capacity: int):
+        self.start = start
+        self.sketch = np.zeros((depth, width), dtype=np.uint32)
+        self.hitters = {kind: SpaceSaving(capacity) for kind in KINDS}
+
+class TrendingEngine:
+    """
+    Trend di hashtag e menzioni su tutti i profili, per intervalli di TRENDING_BUCKET_SECONDS.
+    Ogni intervallo ha un count-min sketch (conteggi stimati di qualunque token) e un riepilogo
+    Space-Saving per tipo (i candidati più frequenti): la memoria resta limitata a prescindere dal volume
+    e una finestra scorrevole si ottiene sommando gli intervalli che la compongono.
+    Anche i contenuti già contati stanno in memoria fissa: un filtro di Bloom per generazione, ruotato come
+    gli intervalli. Un falso positivo fa saltare un contenuto nuovo, quindi i conteggi possono solo difettare.
+    """
+
+    def __init__(self, path: str = TRENDING_STATE_FILE, bucket_seconds: int = TRENDING_BUCKET_SECONDS,
+                 retention: int = TRENDING_RETENTION, width: int = TRENDING_SKETCH_WIDTH,
+                 depth: int = TRENDING_SKETCH_DEPTH, capacity: int = TRENDING_CANDIDATES,
+                 seen_bits: int = TRENDING_SEEN_BITS, seen_generations: int = TRENDING_SEEN_GENERATIONS):
+        self.path = path
+        self.bucket_seconds = bucket_seconds
+        self.retention = retention
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.seen_bits = -(-seen_bits // 8) * 8
+        self.seen_generations = seen_generations
+        # Durata di una generazione dei contenuti visti, multipla degli intervalli
+        self.seen_span = max(1, retention // max(1, seen_generations) // bucket_seconds) * bucket_seconds
+        self.buckets: Dict[int, _Bucket] = {}
+        # Post e commenti già contati, per non ricontarli: inizio generazione -> filtro di Bloom (bit impaccati)
+        self.seen: Dict[int, np.ndarray] = {}
+        self.mtime: Optional[float] = None
+        self.saved_at = time.monotonic()
+        # Contenuti contati dall'ultimo salvataggio, da riapplicare allo stato salvato da altri processi
+        self._pending_counts: Dict[str, Tuple[int, List[str], Optional[str]]] = {}
+        self._dirty = False
+        self._rows = np.arange(depth)
+        self._seen_rows = np.arange(SEEN_HASHES, dtype=np.uint64)
+        self._lock = threading.Lock()
+
+    def _indices(self, token: str) -> np.ndarray:
+        # Doppio hashing: le depth funzioni di hash derivano da un solo digest
+        digest = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+        first, second = digest & 0xffffffff, (digest >> 32) | 1
+        return (first + self._rows * second) % self.width
+
+    def _seen_indices(self, keys: List[str]) -> np.ndarray:
+        """Posizioni dei bit di ogni contenuto nei filtri di Bloom, una riga per chiave"""
+        digests = np.array([int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+                            for key in keys], dtype=np.uint64).reshape(-1, 1)
+        first, second = digests & np.uint64(0xffffffff), (digests >> np.uint64(32)) | np.uint64(1)
+        return (first + self._seen_rows * second) % np.uint64(self.seen_bits)
+
+    def _is_seen(self, indices: np.ndarray) -> np.ndarray:
+        """Per ogni riga di _seen_indices, se il contenuto compare in una delle generazioni conservate"""
+        found = np.zeros(len(indices), dtype=bool)
+        for bits in self.seen.values():
+            found |= ((bits[indices >> np.uint64(3)] >> (indices & np.uint64(7))) & 1).all(axis=1)
+        return found
+
+    def _mark_seen(self, indices: np.ndarray, now: float):
+        start = int(now // self.seen_span) * self.seen_span
+        bits = self.seen.get(start)
+        if bits is None:
+            bits = self.seen[start] = np.zeros(self.seen_bits // 8, dtype=np.uint8)
+        np.bitwise_or.at(bits, indices >> np.uint64(3), (np.uint64(1) << (indices & np.uint64(7))).astype(np.uint8))
+
+    def _expire(self, now: float):
+        oldest = now - self.retention
+        for start in [start for start in self.buckets if start + self.bucket_seconds <= oldest]:
+            del self.buckets[start]
+        for start in [start for start in self.seen if start + self.seen_span <= oldest]:
+            del self.seen[start]
+
+    def _events(self, profile_data: Dict, now: float) -> Iterable[Tuple[str, float, str]]:
+        snapshot_time = _timestamp(profile_data.get('timestamp')) or now
+        interactions = profile_data.get('interactions', {})
+        for post in profile_data.get('posts', []):
+            # Gli hashtag della descrizione contano dal momento della pubblicazione
+            yield f"post:{post['url']}", _timestamp(post.get('date')) or snapshot_time, post.get('description', '')
+            # Le date dei commenti sono relative ('2d ago'): si usa l'istante dello snapshot
+            for comment in (interactions.get(post['url']) or {}).get('comments', []):
+                yield f"comment:{comment_key(post['url'], comment)}", snapshot_time, comment.get('text', '')
+
+    def ingest_snapshot(self, profile_data: Dict, now: Optional[float] = None) -> int:
+        """Conta hashtag e menzioni di post e commenti non ancora visti; restituisce i contenuti contati"""
+        now = now or time.time()
+        username = profile_data.get('username')
+        counted = 0
+        events = list(self._events(profile_data, now))
+        if not events:
+            return 0
+        indices = self._seen_indices([key for key, _, _ in events])
+        with self._lock:
+            self._expire(now)
+            contents = {}
+            for (key, ts, text), seen in zip(events, self._is_seen(indices)):
+                ts = min(ts, now)
+                if seen or key in contents or ts < now - self.retention:
+                    continue
+                counted += 1
+                # Un token ripetuto nello stesso testo conta una volta sola
+                tokens = list(dict.fromkeys(extract_tokens(text)))
+                contents[key] = (int(ts // self.bucket_seconds) * self.bucket_seconds, tokens, username)
+            # Anche i contenuti rivisti entrano nella generazione corrente: vengono dimenticati solo dopo
+            # TRENDING_RETENTION senza comparire negli snapshot
+            self._mark_seen(indices, now)
+            self._dirty = True
+            contents = {key: content for key, content in contents.items() if content[1]}
+            self._pending_counts.update(contents)
+            self._count(contents.values())
+        return counted
+
+    def _count(self, contents: Iterable[Tuple[int, List[str], Optional[str]]]):
+        """Somma ai count-min sketch e ai candidati i token dei contenuti (intervallo, token, profilo)"""
+        per_bucket: Dict[Tuple[int, Optional[str]], Counter] = defaultdict(Counter)
+        for start, tokens, username in contents:
+            per_bucket[start, username].update(tokens)
+
+        for (start, username), counts in per_bucket.items():
+            bucket = self.buckets.get(start)
+            if bucket is None:
+                bucket = self.buckets[start] = _Bucket(start, self.depth, self.width, self.capacity)
+            for token, count in counts.items():
+                bucket.sketch[self._rows, self._indices(token)] += count
+            for kind in KINDS:
+                bucket.hitters[kind].update({token: count for token, count in counts.items()
+                                             if token_kind(token) == kind}, username)
+
+    def _window(self, window: float, now: float) -> List[_Bucket]:
+        start = now - window
+        return [bucket for bucket in self.buckets.values() if bucket.start + self.bucket_seconds > start]
+
+    def top(self, window: float, k: int = 20, kind: str = 'hashtag', now: Optional[float] = None) -> Dict:
+        """Token più frequenti nella finestra, con il numero di profili in cui compaiono"""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind '{kind}', expected one of {', '.join(KINDS)}")
+        now = now or time.time()
+        with self._lock:
+            self._expire(now)
+            buckets = self._window(window, now)
+            if buckets:
+                sketch = np.sum([bucket.sketch for bucket in buckets], axis=0, dtype=np.uint64)
+            else:
+                sketch = np.zeros((self.depth, self.width), dtype=np.uint64)
+            candidates: Dict[str, Set[str]] = defaultdict(set)
+            for bucket in buckets:
+                for token, (_, _, profiles) in bucket.hitters[kind].entries.items():
+                    candidates[token].update(profiles)
+
+            items = [
+                {'token': token, 'count': int(sketch[self._rows, self._indices(token)].min()),
+                 'profiles': len(profiles), 'sample_profiles': sorted(profiles)[:5]}
+                for token, profiles in candidates.items()
+            ]
+        items.sort(key=lambda item: (-item['count'], item['token']))
+        total = int(sketch[0].sum())
+        return {
+            'kind': kind,
+            'window_seconds': int(window),
+            'from': datetime.fromtimestamp(now - window).isoformat(),
+            'to': datetime.fromtimestamp(now).isoformat(),
+            'total': total,
+            # Sovrastima massima dei conteggi del count-min sketch (con probabilità 1 - e^-depth)
+            'error_bound': math.ceil(math.e / self.width * total),
+            'items': items[:k]
+        }
+
+    def estimate(self, token: str, window: float, now: Optional[float] = None) -> int:
+        """Conteggio stimato di un token qualunque nella finestra"""
+        now = now or time.time()
+        with self._lock:
+            buckets = self._window(window, now)
+            indices = self._indices(token.casefold())
+            return int(min(sum(int(bucket.sketch[row, indices[row]]) for bucket in buckets) for row in self._rows))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'buckets': len(self.buckets),
+                'seen_filters': len(self.seen),
+                'seen_bytes': sum(bits.nbytes for bits in self.seen.values()),
+                # Frazione di bit accesi della generazione più piena: oltre ~0,5 i falsi positivi crescono in fretta
+                'seen_fill_ratio': max((float(np.unpackbits(bits).mean()) for bits in self.seen.values()), default=0.0),
+                'sketch_bytes': sum(bucket.sketch.nbytes for bucket in self.buckets.values()),
+                'oldest_bucket': datetime.fromtimestamp(min(self.buckets)).isoformat() if self.buckets else None
+            }
+
+    def _config(self) -> Dict:
+        return {'bucket_seconds': self.bucket_seconds, 'width': self.width, 'depth': self.depth,
+                'seen_bits': self.seen_bits, 'seen_span': self.seen_span}
+
+    def _merge_saved(self, now: float):
+        """
+        Riapplica i contenuti non ancora salvati allo stato salvato nel frattempo da altri processi:
+        i count-min sketch si sommano, i contenuti già contati altrove vengono ignorati e i filtri di Bloom
+        della stessa generazione si uniscono con un OR bit a bit.
+        """
+        saved = TrendingEngine.load(self.path, bucket_seconds=self.bucket_seconds, retention=self.retention,
+                                    width=self.width, depth=self.depth, capacity=self.capacity,
+                                    seen_bits=self.seen_bits, seen_generations=self.seen_generations)
+        saved._expire(now)
+        if self._pending_counts:
+            new = ~saved._is_seen(saved._seen_indices(list(self._pending_counts)))
+            saved._count([content for content, is_new in zip(self._pending_counts.values(), new) if is_new])
+        for start, bits in self.seen.items():
+            if start in saved.seen:
+                saved.seen[start] |= bits
+            else:
+                saved.seen[start] = bits
+        saved._expire(now)
+        self.buckets, self.seen = saved.buckets, saved.seen
+
+    def save(self):
+        """
+        Salva sketch e candidati su un file temporaneo e lo rinomina. Un lock tra processi protegge
+        lettura e scrittura: se un altro processo ha salvato dopo l'ultimo caricamento, i contenuti
+        nuovi di questo processo vengono uniti al suo stato invece di sovrascriverlo.
+        """
+        with self._lock, file_lock(self.path):
+            mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+            if mtime is not None and mtime != self.mtime:
+                self._merge_saved(time.time())
+            starts = sorted(self.buckets)
+            sketches = (np.stack([self.buckets[start].sketch for start in starts]) if starts
+                        else np.zeros((0, self.depth, self.width), dtype=np.uint32))
+            seen_starts = sorted(self.seen)
+            seen = (np.stack([self.seen[start] for start in seen_starts]) if seen_starts
+                    else np.zeros((0, self.seen_bits // 8), dtype=np.uint8))
+            meta = {
+                'version': STATE_VERSION,
+                **self._config(),
+                'starts': starts,
+                'hitters': [{kind: self.buckets[start].hitters[kind].to_dict() for kind in KINDS} for start in starts],
+                'seen_starts': seen_starts
+            }
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, sketches=sketches, seen=seen, meta=np.array(json.dumps(meta)))
+            os.replace(tmp_path, self.path)
+            self.mtime = os.path.getmtime(self.path)
+            self.saved_at = time.monotonic()
+            self._pending_counts, self._dirty = {}, False
+
+    def save_if_due(self, interval: float = TRENDING_SAVE_INTERVAL) -> bool:
+        """
+        Salva solo se ci sono contenuti nuovi e l'ultimo salvataggio risale ad almeno interval secondi:
+        lo scraper lo chiama dopo ogni profilo e con interval=0 alla chiusura.
+        """
+        if not self._dirty or time.monotonic() - self.saved_at < interval:
+            return False
+        self.save()
+        return True
+
+    @classmethod
+    def load(cls, path: str = TRENDING_STATE_FILE, **kwargs) -> 'TrendingEngine':
+        """Stato salvato; vuoto se assente o creato con dimensioni di sketch o intervalli diversi"""
+        engine = cls(path, **kwargs)
+        if not os.path.exists(path):
+            return engine
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != STATE_VERSION or any(meta.get(key) != value for key, value in engine._config().items()):
+                logger.warning(f"Ignoring trending state in {path}: created with a different configuration")
+                return engine
+            for start, sketch, hitters in zip(meta['starts'], data['sketches'], meta['hitters']):
+                bucket = _Bucket(start, engine.depth, engine.width, engine.capacity)
+                bucket.sketch = sketch.copy()
+                bucket.hitters = {kind: SpaceSaving(engine.capacity, hitters[kind]['entries'], hitters[kind]['floor'])
+                                  for kind in KINDS}
+                engine.buckets[start] = bucket
+            engine.seen = {start: bits.copy() for start, bits in zip(meta['seen_starts'], data['seen'])}
+        engine.mtime = os.path.getmtime(path)
+        return engine
+
+_engine: Optional[TrendingEngine] = None
+_engine_lock = threading.Lock()
+
+def get_trending_engine(path: str = TRENDING_STATE_FILE) -> TrendingEngine:
+    """Motore condiviso dal processo, ricaricato se un altro processo ha salvato uno stato più recente"""
+    global _engine
+    with _engine_lock:
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if _engine is None or (mtime is not None and mtime != _engine.mtime):
+            _engine = TrendingEngine.load(path)
+        return _engine
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Trend di hashtag e menzioni su tutti i profili')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help='Conta gli snapshot salvati (i contenuti già visti vengono ignorati)')
+    ingest_parser.add_argument('--history', action='store_true', help='Tutti gli snapshot, non solo gli ultimi')
+
+    top_parser = subparsers.add_parser('top', help='Token più frequenti in una finestra')
+    top_parser.add_argument('--window', default='24h', help='Es. 30m, 24h, 7d')
+    top_parser.add_argument('--k', type=int, default=20)
+    top_parser.add_argument('--kind', choices=KINDS, default='hashtag')
+
+    subparsers.add_parser('stats', help='Occupazione dello stato')
+    args = parser.parse_args()
+
+    engine = get_trending_engine()
+    if args.command == 'ingest':
+        from src.database.storage import get_storage
+
+        storage = get_storage()
+        counted = 0
+        for username in storage.list_profiles():
+            snapshots = storage.load_snapshots(username) if args.history else [storage.load_latest_snapshot(username)]
+            for snapshot in filter(None, snapshots):
+                counted += engine.ingest_snapshot(snapshot)
+        engine.save()
+        print(json.dumps({'counted': counted, **engine.stats()}, indent=2))
+    elif args.command == 'top':
+        print(json.dumps(engine.top(parse_window(args.window), args.k, args.kind), indent=2, ensure_ascii=False))
+    else:
+        print(json.dumps(engine.stats(), indent=2))
@@ -3,8 +3,6 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict
-import json
-from pathlib import Path
 from datetime import datetime, timedelta
 import asyncio
 import logging
@@ -12,12 +10,18 @@ import logging
 from config.config import (
     JWT_SECRET_KEY,
     JWT_ALGORITHM,
-    ACCESS_TOKEN_EXPIRE_MINUTES,
-    OUTPUT_DIR
+    ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
-from src.scraper.tiktok_scraper import TikTokScraper
+from src.scraper.tiktok_scraper import TikTokScraper, get_scrape_cache
+from src.scraper.rate_limiter import get_rate_limiter
 from src.analyzer.ai_analyzer import AIAnalyzer
+from src.analyzer.llm_cache import get_llm_cache
+from src.analyzer.sentiment_service import close_sentiment_service
+from src.analyzer.trending import KINDS, get_trending_engine, parse_window
+from src.analyzer.interaction_graph import get_interaction_graph, normalize_user
+from src.database.storage import get_storage
+from src.database.parquet_store import ParquetStore
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -38,6 +42,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("shutdown")
+def shutdown():
+    # Il pool di processi del sentiment non si chiude da solo e lascerebbe processi orfani
+    close_sentiment_service()
+
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -78,9 +87,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 # Background task functions
 async def scrape_profile(username: str):
     try:
+        # Il browser viene avviato solo se qualche dato non è già nella cache di scraping
         scraper = TikTokScraper()
-        await scraper.init_browser()
-        await scraper.login()
         await scraper.analyze_profile(username)
         await scraper.close()
     except Exception as e:
@@ -132,15 +140,9 @@ async def get_profile_status(
     Controlla lo stato dell'analisi di un profilo
     """
     try:
-        output_dir = Path(OUTPUT_DIR)
-        profile_files = list(output_dir.glob(f"{username}_*.json"))
-        report_files = list(output_dir.glob(f"{username}_report_*.json"))
-
         return {
             "username": username,
-            "data_collected": len(profile_files) > 0,
-            "analysis_completed": len(report_files) > 0,
-            "last_update": max([f.stat().st_mtime for f in profile_files + report_files]) if profile_files or report_files else None
+            **get_storage().get_status(username)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -154,16 +156,10 @@ async def get_profile_report(
     Ottiene il report completo di un profilo
     """
     try:
-        output_dir = Path(OUTPUT_DIR)
-        report_files = list(output_dir.glob(f"{username}_report_*.json"))
+        report = get_storage().load_latest_report(username)
         
-        if not report_files:
+        if report is None:
             raise HTTPException(status_code=404, detail="Report not found")
-        
-        latest_report = max(report_files, key=lambda f: f.stat().st_mtime)
-        
-        with open(latest_report, 'r', encoding='utf-8') as f:
-            report = json.load(f)
             
         return report
     except HTTPException:
@@ -181,17 +177,11 @@ async def get_profile_metrics(
     Ottiene metriche specifiche per un profilo
     """
     try:
-        output_dir = Path(OUTPUT_DIR)
-        report_files = list(output_dir.glob(f"{username}_report_*.json"))
+        report = get_storage().load_latest_report(username)
         
-        if not report_files:
+        if report is None:
             raise HTTPException(status_code=404, detail="Report not found")
         
-        latest_report = max(report_files, key=lambda f: f.stat().st_mtime)
-        
-        with open(latest_report, 'r', encoding='utf-8') as f:
-            report = json.load(f)
-        
         if metric_type not in report['raw_data']:
             raise HTTPException(status_code=404, detail=f"Metric type {metric_type} not found")
             
@@ -201,15 +191,119 @@ async def get_profile_metrics(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/scraper/metrics")
+async def get_scraper_metrics(current_user: User = Depends(get_current_user)):
+    """
+    Metriche del rate limiter condiviso dello scraper
+    """
+    return get_rate_limiter().metrics()
+
+@app.get("/scraper/cache")
+async def get_scraper_cache_stats(current_user: User = Depends(get_current_user)):
+    """
+    Statistiche della cache dei risultati di scraping
+    """
+    scrape_cache = get_scrape_cache()
+    return scrape_cache.stats() if scrape_cache else {"enabled": False}
+
+@app.get("/analyzer/cache")
+async def get_analyzer_cache_stats(current_user: User = Depends(get_current_user)):
+    """
+    Statistiche della cache delle risposte GPT
+    """
+    llm_cache = get_llm_cache()
+    return llm_cache.stats() if llm_cache else {"enabled": False}
+
+@app.get("/analytics/engagement")
+async def get_engagement_analytics(
+    usernames: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Engagement per profilo e giorno dallo store Parquet (usernames separati da virgola, date YYYYMMDD)
+    """
+    try:
+        summary = ParquetStore().engagement_summary(usernames.split(',') if usernames else None, start, end)
+        return {
+            "rows": summary.to_dict(orient='records'),
+            "count": len(summary)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/trending")
+async def get_trending(
+    window: str = '24h',
+    k: int = 20,
+    kind: str = 'hashtag',
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Hashtag (o menzioni) più frequenti su tutti i profili nella finestra indicata (es. 24h, 7d)
+    """
+    if kind not in KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(KINDS)}")
+    try:
+        window_seconds = parse_window(window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return get_trending_engine().top(window_seconds, k, kind)
+
+@app.get("/graph/shared-commenters")
+async def get_shared_commenters(
+    k: int = 20,
+    profiles: Optional[str] = None,
+    min_profiles: int = 2,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Utenti che commentano più profili (profiles: elenco separato da virgole, di default tutti)
+    """
+    selected = [profile for profile in profiles.split(',') if profile.strip()] if profiles else None
+    return get_interaction_graph().shared_commenters(k, selected, min_profiles)
+
+@app.get("/graph/mutual")
+async def get_mutual_pairs(k: int = 20, current_user: User = Depends(get_current_user)):
+    """
+    Coppie di utenti che interagiscono a vicenda
+    """
+    return get_interaction_graph().mutual_pairs(k)
+
+@app.get("/graph/components")
+async def get_graph_components(k: int = 10, current_user: User = Depends(get_current_user)):
+    """
+    Componenti connesse più grandi del grafo delle interazioni
+    """
+    return get_interaction_graph().components(k)
+
+@app.get("/graph/users/{username}")
+async def get_user_graph(
+    username: str,
+    hops: int = 2,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Vicinato entro hops passaggi, componente connessa e profili con pubblico in comune di un utente
+    """
+    graph = get_interaction_graph()
+    try:
+        return {
+            'neighbourhood': graph.neighbourhood(username, hops),
+            'component': graph.component_of(username),
+            'audience_overlap': graph.audience_overlap(username) if normalize_user(username) in graph.profiles else []
+        }
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 @app.get("/profiles")
 async def list_profiles(current_user: User = Depends(get_current_user)):
     """
     Lista tutti i profili analizzati
     """
     try:
-        output_dir = Path(OUTPUT_DIR)
-        profile_files = list(output_dir.glob('*_[0-9]*.json'))
-        profiles = set(f.stem.split('_')[0] for f in profile_files)
+        profiles = get_storage().list_profiles()
         
         return {
             "profiles": list(profiles),
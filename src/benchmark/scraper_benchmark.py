@@ -0,0 +1,143 @@
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List
+
+from config.config import REPLAY_DIR
+from src.scraper.tiktok_scraper import TikTokScraper, CANONICAL_BASE_URL
+from src.scraper.network_capture import POST_LIST_API
+from src.scraper.replay import HarReplay
+from src.scraper.rate_limiter import AdaptiveRateLimiter
+from src.database.storage import FileStorage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _process_tree_rss(root_pid: int) -> int:
+    """Somma la memoria residente (byte) del processo e dei suoi figli, inclusi i processi di Chromium"""
+    children: Dict[int, List[int]] = {}
+    rss_pages: Dict[int, int] = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            # Campi successivi al nome del processo: ppid è il 4° campo di /proc/pid/stat, rss il 24°
+            children.setdefault(int(fields[1]), []).append(int(entry))
+            rss_pages[int(entry)] = int(fields[21])
+        except (OSError, IndexError, ValueError):
+            continue
+
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += rss_pages.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total * os.sysconf('SC_PAGE_SIZE')
+
+def _summarize(samples: List[float]) -> Dict:
+    """Calcola media e percentili di una serie di durate, in millisecondi"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'max_ms': ordered[-1] * 1000
+    }
+
+async def run_configuration(usernames: List[str], replay: HarReplay, concurrency: int, mode: str) -> Dict:
+    """Esegue lo scraping dei profili registrati con una configurazione e ne misura le prestazioni"""
+    # Il replay è locale: il rate limit di produzione falserebbe le misure
+    unlimited = AdaptiveRateLimiter(calls=10 ** 6, period=1, burst=10 ** 6)
+    scraper = TikTokScraper(pool_size=concurrency, extraction_mode=mode, base_url=CANONICAL_BASE_URL,
+                            rate_limiter=unlimited)
+    scraper.request_filter.enabled = True
+    scraper.context_setup.append(replay.install)
+    replay.reset_stats()
+    # I risultati del benchmark non devono finire tra gli snapshot reali
+    scraper.output_dir = scraper.cache_dir = Path(REPLAY_DIR) / 'benchmark_output'
+    scraper.output_dir.mkdir(parents=True, exist_ok=True)
+    scraper.storage = FileStorage(scraper.output_dir)
+    scraper.parquet_store = None
+    scraper.trending = None
+    scraper.interaction_graph = None
+    scraper.scrape_cache = None
+
+    await scraper.init_browser()
+    await scraper.init_context_pool()
+    rss_before = _process_tree_rss(os.getpid())
+    tracemalloc.start()
+
+    start = time.perf_counter()
+    try:
+        await scraper.analyze_profiles(usernames)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, python_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = _process_tree_rss(os.getpid())
+        await scraper.close()
+
+    # Senza le API dei post la pagina non si è idratata: le misure non rappresenterebbero lo scraping reale
+    post_list_hits = sum(count for path, count in replay.hits_by_path.items() if path.startswith(POST_LIST_API))
+    if post_list_hits == 0 or (mode == 'network' and scraper.capture_stats['post_list'] == 0):
+        raise RuntimeError(f"Replay run (mode={mode}) captured no {POST_LIST_API} payload: "
+                           f"replay {replay.get_stats()}, captures {dict(scraper.capture_stats)}")
+
+    pages = len(scraper.stage_timings['goto'])
+    return {
+        'concurrency': concurrency,
+        'mode': mode,
+        'profiles': len(usernames),
+        'elapsed_s': elapsed,
+        'pages': pages,
+        'pages_per_s': pages / elapsed if elapsed else 0,
+        'stages': {stage: _summarize(samples) for stage, samples in scraper.stage_timings.items()},
+        'python_peak_bytes_per_profile': python_peak / max(1, len(usernames)),
+        'rss_delta_bytes_per_profile': (rss_after - rss_before) / max(1, len(usernames)),
+        'requests': scraper.request_filter.get_stats(),
+        'replay': replay.get_stats(),
+        'captures': dict(scraper.capture_stats)
+    }
+
+async def run_benchmark(usernames: List[str], concurrency_levels: List[int], modes: List[str],
+                        replay_dir: str = REPLAY_DIR) -> List[Dict]:
+    """Confronta livelli di concorrenza e modalità di estrazione sulle pagine registrate"""
+    replay = HarReplay(replay_dir)
+    replay.load()
+    results = []
+    for mode in modes:
+        for concurrency in concurrency_levels:
+            result = await run_configuration(usernames, replay, concurrency, mode)
+            logger.info(f"mode={mode} concurrency={concurrency}: {result['pages_per_s']:.2f} pages/s, "
+                        f"{result['elapsed_s']:.1f}s total, replay misses={result['replay']['misses']}")
+            results.append(result)
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark dello scraper su pagine registrate')
+    parser.add_argument('usernames', nargs='*', help='Profili registrati (default: tutti i file HAR)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--modes', nargs='+', choices=['dom', 'network'], default=['dom', 'network'])
+    parser.add_argument('--replay-dir', default=REPLAY_DIR)
+    parser.add_argument('--output', help='File JSON in cui salvare i risultati')
+    args = parser.parse_args()
+
+    usernames = args.usernames or [path.stem for path in sorted(Path(args.replay_dir).glob('*.har'))]
+    results = asyncio.run(run_benchmark(usernames, args.concurrency, args.modes, args.replay_dir))
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(report, encoding='utf-8')
+    print(report)
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Dict, List
+
+from textblob import TextBlob
+
+from src.analyzer.sentiment_service import SentimentService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WORDS = ['video', 'love', 'great', 'bad', 'funny', 'boring', 'amazing', 'hate', 'nice', 'ciao', 'wow', 'top',
+         'worst', 'best', 'cute', 'fake', '😂', '🔥', '❤️']
+# Commenti brevi che sotto i video si ripetono identici
+COMMON_COMMENTS = ['first', '😂😂😂', 'love this', '🔥🔥', 'so funny', 'who is here in 2024?', 'wow', 'fake']
+
+def synthetic_comments(total: int, repeated_share: float = 0.3, seed: int = 42) -> List[str]:
+    """Commenti sintetici: una parte ripete testi comuni, il resto combina parole a caso"""
+    rng = random.Random(seed)
+    return [
+        rng.choice(COMMON_COMMENTS) if rng.random() < repeated_share
+        else ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 15)))
+        for _ in range(total)
+    ]
+
+async def _max_stall(work, interval: float = 0.01) -> Dict:
+    """Esegue work misurando il ritardo massimo con cui l'event loop riesce a servire un'altra coroutine"""
+    stall = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal stall
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            stall = max(stall, time.perf_counter() - start - interval)
+
+    ticker_task = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - start
+    done.set()
+    await ticker_task
+    return {'elapsed_s': elapsed, 'max_event_loop_stall_s': stall}
+
+async def run_benchmark(total: int = 100_000, workers: int = 0) -> Dict[str, Dict]:
+    """Confronta il calcolo in linea nella coroutine con il servizio a processi, a freddo e con la memoria piena"""
+    comments = synthetic_comments(total)
+
+    async def inline():
+        # Calcolo precedente di analyze_reputation_risks
+        return [TextBlob(text).sentiment.polarity for text in comments]
+
+    service = SentimentService(max_workers=workers)
+    try:
+        # Avvia i processi prima di misurare
+        await service.score(['warm up'])
+        results = {
+            'inline': await _max_stall(inline),
+            'service_cold': await _max_stall(lambda: service.score(comments)),
+            'service_warm': await _max_stall(lambda: service.score(comments))
+        }
+        stats = service.stats()
+    finally:
+        service.close()
+
+    for result in results.values():
+        result['comments_per_s'] = total / result['elapsed_s'] if result['elapsed_s'] else 0.0
+    results['service'] = stats
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark del servizio di sentiment')
+    parser.add_argument('--comments', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=0, help='Processi del pool, 0 = uno per core')
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run_benchmark(args.comments, args.workers)), indent=2))
@@ -0,0 +1,106 @@
+import json
+import logging
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from config.config import OUTPUT_DIR
+from src.utils.json_io import encode_json, json_stem, read_json, write_json
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WORDS = ['tiktok', 'video', 'trend', 'dance', 'music', 'fyp', 'viral', 'love', 'ciao', 'grazie', 'wow', 'top']
+
+def synthetic_snapshot(posts: int, comments_per_post: int, seed: int = 42) -> Dict:
+    """Snapshot con la stessa struttura di analyze_profile, per account di grandi dimensioni"""
+    rng = random.Random(seed)
+    text = lambda n: ' '.join(rng.choice(WORDS) for _ in range(n))
+    post_list = [
+        {
+            'url': f'https://www.tiktok.com/@benchmark/video/{7000000000000000000 + i}',
+            'thumbnail': f'https://p16-sign.tiktokcdn.com/obj/{rng.getrandbits(64):x}.jpeg',
+            'description': text(20) + ' #' + rng.choice(WORDS),
+            'likes': f'{rng.randint(1, 999)}.{rng.randint(0, 9)}K',
+            'comments': str(rng.randint(0, 5000)),
+            'shares': str(rng.randint(0, 900)),
+            'date': datetime(2024, 1, 1 + i % 28).isoformat()
+        }
+        for i in range(posts)
+    ]
+    return {
+        'username': 'benchmark',
+        'timestamp': datetime.now().isoformat(),
+        'profile_info': {'username': 'benchmark', 'bio': text(10), 'followers': '1.2M', 'following': '321', 'likes': '45.6M'},
+        'posts': post_list,
+        'interactions': {
+            post['url']: {'comments': [
+                {'username': f'user{rng.randint(0, 10 ** 6)}', 'text': text(12), 'likes': str(rng.randint(0, 999)),
+                 'date': post['date']}
+                for _ in range(comments_per_post)
+            ]}
+            for post in post_list
+        }
+    }
+
+def _pretty_json(path: Path, data: Dict):
+    # Formato precedente: JSON indentato scritto direttamente sul file finale
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+FORMATS: Dict[str, Callable[[Path, Dict], None]] = {
+    'pretty_json': _pretty_json,
+    'compact_json': lambda path, data: write_json(path, data, compression='none'),
+    'zstd_json': lambda path, data: write_json(path, data, compression='zstd')
+}
+
+def _median_time(action: Callable[[], object], repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        action()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def run_benchmark(snapshots: List[Dict], repeats: int = 5) -> Dict[str, Dict]:
+    """Misura dimensione su disco, tempo di scrittura e tempo di lettura di ogni formato"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, writer in FORMATS.items():
+            paths = [Path(tmp_dir) / f"{name}_{i}.json" for i in range(len(snapshots))]
+            write_s = _median_time(lambda: [writer(path, data) for path, data in zip(paths, snapshots)], repeats)
+            load_s = _median_time(lambda: [read_json(path) for path in paths], repeats)
+            results[name] = {
+                'bytes': sum(path.stat().st_size for path in paths),
+                'write_s': write_s,
+                'load_s': load_s
+            }
+
+    baseline = results['pretty_json']
+    for result in results.values():
+        result['size_ratio'] = result['bytes'] / baseline['bytes']
+        result['load_speedup'] = baseline['load_s'] / result['load_s'] if result['load_s'] else 0.0
+    return results
+
+def load_output_snapshots(output_dir: str = OUTPUT_DIR) -> List[Dict]:
+    """Snapshot reali già presenti in OUTPUT_DIR, in qualunque formato"""
+    return [read_json(path) for path in sorted(Path(output_dir).glob('*_[0-9]*.json*'))
+            if json_stem(path) and json_stem(path)[-8:].isdigit()]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Confronta i formati di salvataggio degli snapshot')
+    parser.add_argument('--from-output', action='store_true', help='Usa gli snapshot presenti in OUTPUT_DIR')
+    parser.add_argument('--posts', type=int, default=500)
+    parser.add_argument('--comments', type=int, default=50, help='Commenti per post nello snapshot sintetico')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    snapshots = load_output_snapshots() if args.from_output else [synthetic_snapshot(args.posts, args.comments)]
+    logger.info(f"Benchmarking {len(snapshots)} snapshots, {len(encode_json(snapshots, 'none')) / 1e6:.1f} MB of compact JSON")
+    print(json.dumps(run_benchmark(snapshots, args.repeats), indent=2))
@@ -5,17 +5,15 @@ import plotly.express as px
 import plotly.graph_objs as go
 import pandas as pd
 import requests
-import json
 from datetime import datetime, timedelta
 import logging
-from pathlib import Path
 
 from config.config import (
-    OUTPUT_DIR,
     DASHBOARD_UPDATE_INTERVAL,
     API_HOST,
     API_PORT
 )
+from src.database.storage import get_storage
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -116,9 +114,7 @@ app.layout = html.Div([
 )
 def update_profile_list(n_intervals, n_clicks):
     try:
-        output_dir = Path(OUTPUT_DIR)
-        profile_files = list(output_dir.glob('*_report_*.json'))
-        profiles = set(f.stem.split('_')[0] for f in profile_files)
+        profiles = get_storage().list_reported_profiles()
         
         return [{'label': f'@{profile}', 'value': profile} for profile in profiles]
     except Exception as e:
@@ -140,23 +136,17 @@ def update_metrics(selected_profile, n_intervals):
 
     try:
         # Carica il report più recente
-        output_dir = Path(OUTPUT_DIR)
-        report_files = list(output_dir.glob(f"{selected_profile}_report_*.json"))
+        report = get_storage().load_latest_report(selected_profile)
         
-        if not report_files:
+        if report is None:
             return 'N/A', 'N/A', 'N/A', 'Nessun dato disponibile'
         
-        latest_report = max(report_files, key=lambda f: f.stat().st_mtime)
-        
-        with open(latest_report, 'r', encoding='utf-8') as f:
-            report = json.load(f)
-        
         # Estrai le metriche
         engagement = report['raw_data']['engagement']['average_engagement']
         sentiment = report['raw_data']['sentiment']['basic_sentiment']
         risk_level = report['raw_data']['reputation_risks']['risk_level']
         
-        last_update = datetime.fromtimestamp(latest_report.stat().st_mtime)
+        last_update = datetime.fromisoformat(report['timestamp'])
         update_info = f'Ultimo aggiornamento: {last_update.strftime("%Y-%m-%d %H:%M:%S")}'
         
         return f'{engagement:.2%}', f'{sentiment:.2f}', risk_level.upper(), update_info
@@ -176,17 +166,11 @@ def update_engagement_timeline(selected_profile, n_intervals):
         return go.Figure()
 
     try:
-        output_dir = Path(OUTPUT_DIR)
-        report_files = list(output_dir.glob(f"{selected_profile}_report_*.json"))
+        report = get_storage().load_latest_report(selected_profile)
         
-        if not report_files:
+        if report is None:
             return go.Figure()
         
-        latest_report = max(report_files, key=lambda f: f.stat().st_mtime)
-        
-        with open(latest_report, 'r', encoding='utf-8') as f:
-            report = json.load(f)
-        
         # Prepara i dati per il grafico
         engagement_data = report['raw_data']['engagement']['metrics']
         df = pd.DataFrame(engagement_data)
@@ -212,17 +196,11 @@ def update_sentiment_distribution(selected_profile, n_intervals):
         return go.Figure()
 
     try:
-        output_dir = Path(OUTPUT_DIR)
-        report_files = list(output_dir.glob(f"{selected_profile}_report_*.json"))
+        report = get_storage().load_latest_report(selected_profile)
         
-        if not report_files:
+        if report is None:
             return go.Figure()
         
-        latest_report = max(report_files, key=lambda f: f.stat().st_mtime)
-        
-        with open(latest_report, 'r', encoding='utf-8') as f:
-            report = json.load(f)
-        
         # Estrai i dati del sentiment
         sentiment_scores = [
             comment['sentiment'] for post in report['raw_data']['posts']
@@ -250,17 +228,11 @@ def update_top_hashtags(selected_profile, n_intervals):
         return go.Figure()
 
     try:
-        output_dir = Path(OUTPUT_DIR)
-        report_files = list(output_dir.glob(f"{selected_profile}_report_*.json"))
+        report = get_storage().load_latest_report(selected_profile)
         
-        if not report_files:
+        if report is None:
             return go.Figure()
         
-        latest_report = max(report_files, key=lambda f: f.stat().st_mtime)
-        
-        with open(latest_report, 'r', encoding='utf-8') as f:
-            report = json.load(f)
-        
         # Estrai i dati degli hashtag
         hashtags = report['raw_data']['trending_topics']['hashtag_analysis']
         df = pd.DataFrame(list(hashtags.items()), columns=['hashtag', 'count'])
@@ -287,17 +259,11 @@ def update_interaction_network(selected_profile, n_intervals):
         return go.Figure()
 
     try:
-        output_dir = Path(OUTPUT_DIR)
-        report_files = list(output_dir.glob(f"{selected_profile}_report_*.json"))
+        report = get_storage().load_latest_report(selected_profile)
         
-        if not report_files:
+        if report is None:
             return go.Figure()
         
-        latest_report = max(report_files, key=lambda f: f.stat().st_mtime)
-        
-        with open(latest_report, 'r', encoding='utf-8') as f:
-            report = json.load(f)
-        
         # Estrai i dati delle interazioni
         interactions = report['raw_data']['interactions']['interactions']
         
@@ -344,17 +310,11 @@ def update_analysis_summary(selected_profile, n_intervals):
         return 'Seleziona un profilo per vedere il sommario dell\'analisi'
 
     try:
-        output_dir = Path(OUTPUT_DIR)
-        report_files = list(output_dir.glob(f"{selected_profile}_report_*.json"))
+        report = get_storage().load_latest_report(selected_profile)
         
-        if not report_files:
+        if report is None:
             return 'Nessun dato disponibile per questo profilo'
         
-        latest_report = max(report_files, key=lambda f: f.stat().st_mtime)
-        
-        with open(latest_report, 'r', encoding='utf-8') as f:
-            report = json.load(f)
-        
         return html.Div([
             html.H3('Sommario dell\'Analisi'),
             html.P(report['executive_summary'])
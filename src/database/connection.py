@@ -0,0 +1,23 @@
+from functools import lru_cache
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from config.config import DATABASE_URL
+
+Base = declarative_base()
+
+@lru_cache(maxsize=None)
+def get_engine(database_url: str = DATABASE_URL) -> Engine:
+    """Restituisce l'engine SQLAlchemy condiviso per DATABASE_URL"""
+    connect_args = {}
+    if database_url.startswith('sqlite'):
+        # L'API e i worker usano la connessione da thread diversi
+        connect_args['check_same_thread'] = False
+    return create_engine(database_url, connect_args=connect_args, pool_pre_ping=True)
+
+def get_session_factory(database_url: str = DATABASE_URL) -> sessionmaker:
+    """Crea le tabelle mancanti e restituisce una factory di sessioni"""
+    engine = get_engine(database_url)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine, expire_on_commit=False)
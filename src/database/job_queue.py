@@ -0,0 +1,177 @@
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import Column, DateTime, Integer, String, Text, UniqueConstraint, Index, and_, func, select, update
+
+from config.config import (
+    DATABASE_URL,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_DELAY
+)
+from src.database.connection import Base, get_session_factory
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+def default_worker_id() -> str:
+    """Identificativo del worker: host e PID, univoco tra i nodi"""
+    return os.getenv('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+
+def current_cycle() -> str:
+    """Ciclo di scraping corrente, uno al giorno come gli snapshot"""
+    return datetime.utcnow().strftime('%Y%m%d')
+
+class ScrapeJob(Base):
+    __tablename__ = 'scrape_jobs'
+    __table_args__ = (
+        UniqueConstraint('username', 'cycle', name='uq_scrape_jobs_username_cycle'),
+        Index('ix_scrape_jobs_claimable', 'status', 'available_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    username = Column(String(255), nullable=False)
+    cycle = Column(String(32), nullable=False)
+    status = Column(String(16), nullable=False, default=PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    lease_owner = Column(String(255))
+    lease_expires_at = Column(DateTime)
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class ScrapeJobQueue:
+    """Coda di job di scraping condivisa tra più nodi tramite DATABASE_URL"""
+
+    def __init__(self, database_url: str = DATABASE_URL, lease_seconds: int = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, retry_delay: int = JOB_RETRY_DELAY):
+        self.Session = get_session_factory(database_url)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    def enqueue(self, usernames: List[str], cycle: Optional[str] = None) -> int:
+        """Inserisce i job del ciclo, ignorando gli username già presenti"""
+        cycle = cycle or current_cycle()
+        with self.Session() as session:
+            existing = set(session.scalars(
+                select(ScrapeJob.username).where(ScrapeJob.cycle == cycle, ScrapeJob.username.in_(usernames))
+            ))
+            new_jobs = [ScrapeJob(username=username, cycle=cycle) for username in dict.fromkeys(usernames)
+                        if username not in existing]
+            session.add_all(new_jobs)
+            session.commit()
+        logger.info(f"Enqueued {len(new_jobs)} jobs for cycle {cycle}")
+        return len(new_jobs)
+
+    def requeue_expired(self) -> int:
+        """Rimette in coda i job il cui lease è scaduto, o li segna falliti oltre il limite di tentativi"""
+        now = datetime.utcnow()
+        expired = and_(ScrapeJob.status == LEASED, ScrapeJob.lease_expires_at < now)
+        with self.Session() as session:
+            failed = session.execute(
+                update(ScrapeJob)
+                .where(expired, ScrapeJob.attempts >= self.max_attempts)
+                .values(status=FAILED, lease_owner=None, last_error='Lease expired', updated_at=now)
+            ).rowcount
+            requeued = session.execute(
+                update(ScrapeJob)
+                .where(expired)
+                .values(status=PENDING, lease_owner=None, available_at=now, updated_at=now)
+            ).rowcount
+            session.commit()
+
+        if failed or requeued:
+            logger.warning(f"Expired leases: {requeued} requeued, {failed} failed")
+        return requeued
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """Prende in carico il prossimo job disponibile con un lease a tempo"""
+        self.requeue_expired()
+        now = datetime.utcnow()
+        claimable = and_(ScrapeJob.status == PENDING, ScrapeJob.available_at <= now)
+
+        with self.Session() as session:
+            candidates = session.scalars(
+                select(ScrapeJob.id).where(claimable).order_by(ScrapeJob.available_at, ScrapeJob.id).limit(10)
+            ).all()
+            for job_id in candidates:
+                # L'UPDATE condizionato è atomico: se un altro nodo ha già preso il job, rowcount è 0
+                claimed = session.execute(
+                    update(ScrapeJob)
+                    .where(ScrapeJob.id == job_id, claimable)
+                    .values(status=LEASED, lease_owner=worker_id, attempts=ScrapeJob.attempts + 1,
+                            lease_expires_at=now + timedelta(seconds=self.lease_seconds), updated_at=now)
+                ).rowcount
+                session.commit()
+                if claimed:
+                    job = session.get(ScrapeJob, job_id)
+                    return {'id': job.id, 'username': job.username, 'cycle': job.cycle, 'attempts': job.attempts}
+        return None
+
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """Estende il lease di un job ancora in lavorazione; False se il lease è stato perso"""
+        now = datetime.utcnow()
+        with self.Session() as session:
+            extended = session.execute(
+                update(ScrapeJob)
+                .where(ScrapeJob.id == job_id, ScrapeJob.status == LEASED, ScrapeJob.lease_owner == worker_id)
+                .values(lease_expires_at=now + timedelta(seconds=self.lease_seconds), updated_at=now)
+            ).rowcount
+            session.commit()
+        return bool(extended)
+
+    def complete(self, job_id: int, worker_id: str) -> bool:
+        """Segna un job come completato"""
+        with self.Session() as session:
+            completed = session.execute(
+                update(ScrapeJob)
+                .where(ScrapeJob.id == job_id, ScrapeJob.status == LEASED, ScrapeJob.lease_owner == worker_id)
+                .values(status=DONE, lease_expires_at=None, updated_at=datetime.utcnow())
+            ).rowcount
+            session.commit()
+        return bool(completed)
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> bool:
+        """Registra un errore: il job torna in coda con ritardo finché restano tentativi"""
+        now = datetime.utcnow()
+        with self.Session() as session:
+            attempts = session.scalar(select(ScrapeJob.attempts).where(ScrapeJob.id == job_id))
+            if attempts is None:
+                return False
+            if attempts >= self.max_attempts:
+                outcome = dict(status=FAILED)
+            else:
+                outcome = dict(status=PENDING, available_at=now + timedelta(seconds=self.retry_delay * attempts))
+            # UPDATE condizionato come in complete(): se il lease è scaduto e un altro nodo ha ripreso il job
+            # (cambiando owner o tentativi), rowcount è 0 e il suo lease resta intatto
+            failed = session.execute(
+                update(ScrapeJob)
+                .where(ScrapeJob.id == job_id, ScrapeJob.status == LEASED, ScrapeJob.lease_owner == worker_id,
+                       ScrapeJob.attempts == attempts)
+                .values(last_error=error, lease_owner=None, lease_expires_at=None, updated_at=now, **outcome)
+            ).rowcount
+            session.commit()
+        return bool(failed)
+
+    def open_jobs(self) -> int:
+        """Job in attesa o in lavorazione di qualunque ciclo: claim() li preleva tutti, non solo quelli di oggi"""
+        with self.Session() as session:
+            return session.scalar(select(func.count()).where(ScrapeJob.status.in_([PENDING, LEASED])))
+
+    def stats(self, cycle: Optional[str] = None) -> Dict[str, int]:
+        """Conta i job per stato nel ciclo indicato"""
+        cycle = cycle or current_cycle()
+        with self.Session() as session:
+            rows = session.execute(
+                select(ScrapeJob.status, func.count()).where(ScrapeJob.cycle == cycle).group_by(ScrapeJob.status)
+            ).all()
+        return {status: count for status, count in rows}
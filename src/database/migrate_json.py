@@ -0,0 +1,43 @@
+import logging
+from pathlib import Path
+from typing import Dict
+
+from config.config import OUTPUT_DIR, DATABASE_URL
+from src.database.storage import SQLStorage, parse_output_filename
+from src.utils.json_io import read_json
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def migrate(output_dir: str = OUTPUT_DIR, database_url: str = DATABASE_URL) -> Dict[str, int]:
+    """Importa snapshot e report JSON esistenti nel database; rieseguibile senza creare duplicati"""
+    storage = SQLStorage(database_url)
+    counts = {'snapshots': 0, 'reports': 0, 'skipped': 0, 'errors': 0}
+
+    for path in sorted(Path(output_dir).glob('*.json*')):
+        parsed = parse_output_filename(path)
+        try:
+            if parsed and parsed[0] == 'reports':
+                storage.save_report(read_json(path))
+                counts['reports'] += 1
+            elif parsed and parsed[0] == 'snapshots':
+                storage.save_snapshot(read_json(path))
+                counts['snapshots'] += 1
+            else:
+                counts['skipped'] += 1
+        except Exception as e:
+            logger.error(f"Error migrating {path.name}: {str(e)}")
+            counts['errors'] += 1
+
+    logger.info(f"Migration completed: {counts}")
+    return counts
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Migra gli snapshot e i report JSON nel database')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--database-url', default=DATABASE_URL)
+    args = parser.parse_args()
+
+    migrate(args.output_dir, args.database_url)
@@ -0,0 +1,79 @@
+from datetime import datetime
+from sqlalchemy import JSON, Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.orm import relationship
+
+from src.database.connection import Base
+
+class Profile(Base):
+    __tablename__ = 'profiles'
+
+    id = Column(Integer, primary_key=True)
+    username = Column(String(255), nullable=False, unique=True, index=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    snapshots = relationship('Snapshot', back_populates='profile')
+    reports = relationship('Report', back_populates='profile')
+
+class Snapshot(Base):
+    __tablename__ = 'snapshots'
+    __table_args__ = (
+        UniqueConstraint('profile_id', 'captured_at', name='uq_snapshots_profile_captured'),
+        Index('ix_snapshots_profile_captured', 'profile_id', 'captured_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    profile_id = Column(Integer, ForeignKey('profiles.id'), nullable=False)
+    captured_at = Column(DateTime, nullable=False)
+    snapshot_date = Column(String(8), nullable=False, index=True)  # YYYYMMDD, come nei nomi dei file JSON
+    profile_info = Column(JSON, nullable=False, default=dict)
+    refresh = Column(JSON)
+
+    profile = relationship('Profile', back_populates='snapshots')
+    posts = relationship('Post', back_populates='snapshot', order_by='Post.position', cascade='all, delete-orphan')
+
+class Post(Base):
+    __tablename__ = 'posts'
+
+    id = Column(Integer, primary_key=True)
+    snapshot_id = Column(Integer, ForeignKey('snapshots.id'), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    url = Column(String(512), nullable=False, index=True)
+    description = Column(Text, default='')
+    thumbnail = Column(Text, default='')
+    posted_at = Column(String(64), default='')
+    # I conteggi restano nel formato estratto: testo abbreviato (DOM) o intero esatto (rete)
+    likes = Column(JSON)
+    comments_count = Column(JSON)
+    shares = Column(JSON)
+    has_interactions = Column(Boolean, nullable=False, default=False)
+
+    snapshot = relationship('Snapshot', back_populates='posts')
+    comments = relationship('Comment', back_populates='post', order_by='Comment.position', cascade='all, delete-orphan')
+
+class Comment(Base):
+    __tablename__ = 'comments'
+
+    id = Column(Integer, primary_key=True)
+    post_id = Column(Integer, ForeignKey('posts.id'), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    username = Column(String(255), index=True)
+    text = Column(Text, default='')
+    likes = Column(JSON)
+    posted_at = Column(String(64), default='')
+
+    post = relationship('Post', back_populates='comments')
+
+class Report(Base):
+    __tablename__ = 'reports'
+    __table_args__ = (
+        UniqueConstraint('profile_id', 'created_at', name='uq_reports_profile_created'),
+        Index('ix_reports_profile_created', 'profile_id', 'created_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    profile_id = Column(Integer, ForeignKey('profiles.id'), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    report_date = Column(String(8), nullable=False, index=True)
+    data = Column(JSON, nullable=False)
+
+    profile = relationship('Profile', back_populates='reports')
@@ -0,0 +1,236 @@
+import logging
+import os
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from config.config import PARQUET_DIR
+from src.database.storage import get_storage
+from src.analyzer.metrics_engine import comments_frame, posts_frame
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TABLES = ('posts', 'comments', 'engagement')
+
+# Le colonne di partizione sono nel percorso (snapshot_date=YYYYMMDD/username=...), non nei file
+PARTITIONING = ds.partitioning(
+    pa.schema([('snapshot_date', pa.string()), ('username', pa.string())]),
+    flavor='hive'
+)
+
+SCHEMAS = {
+    'posts': pa.schema([
+        ('captured_at', pa.timestamp('s')),
+        ('position', pa.int32()),
+        ('url', pa.string()),
+        ('description', pa.string()),
+        ('posted_at', pa.string()),
+        ('likes', pa.int64()),
+        ('comments', pa.int64()),
+        ('shares', pa.int64())
+    ]),
+    'comments': pa.schema([
+        ('captured_at', pa.timestamp('s')),
+        ('post_url', pa.string()),
+        ('commenter', pa.string()),
+        ('text', pa.string()),
+        ('likes', pa.int64()),
+        ('posted_at', pa.string())
+    ]),
+    'engagement': pa.schema([
+        ('captured_at', pa.timestamp('s')),
+        ('post_url', pa.string()),
+        ('followers', pa.int64()),
+        ('likes', pa.int64()),
+        ('comments', pa.int64()),
+        ('shares', pa.int64()),
+        ('engagement_rate', pa.float64())
+    ])
+}
+
+def _dataset_schema(table: str) -> pa.Schema:
+    return pa.unify_schemas([SCHEMAS[table], PARTITIONING.schema])
+
+def _date_key(value: Union[date, datetime, str]) -> str:
+    return value if isinstance(value, str) else value.strftime('%Y%m%d')
+
+class ParquetStore:
+    """Post, commenti ed engagement di ogni snapshot in Parquet partizionato per data e username"""
+
+    def __init__(self, root: str = PARQUET_DIR, memory_map: bool = True):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.filesystem = fs.LocalFileSystem(use_mmap=memory_map)
+
+    def _partition_file(self, table: str, snapshot_date: str, username: str) -> Path:
+        return self.root / table / f"snapshot_date={snapshot_date}" / f"username={username}" / 'part-0.parquet'
+
+    def _build_tables(self, profile_data: Dict) -> Dict[str, pa.Table]:
+        captured_at = datetime.fromisoformat(profile_data['timestamp']).replace(microsecond=0)
+        posts = profile_data.get('posts', [])
+        # Conteggi ed engagement vengono dal motore di metriche, convertiti per colonna e non per valore
+        metrics = posts_frame([profile_data])
+        comments = comments_frame(profile_data)
+        interactions = profile_data.get('interactions', {})
+        comment_texts = [
+            comment.get('text', '')
+            for post in posts
+            for comment in (interactions.get(post['url']) or {}).get('comments', [])
+        ]
+        column = lambda values, type: pa.array(values, type=type, from_pandas=True)
+
+        data = {
+            'posts': {
+                'captured_at': [captured_at] * len(posts),
+                'position': list(range(len(posts))),
+                'url': [post['url'] for post in posts],
+                'description': [post.get('description', '') for post in posts],
+                'posted_at': [post.get('date', '') for post in posts],
+                'likes': column(metrics['likes'], pa.int64()),
+                'comments': column(metrics['comments'], pa.int64()),
+                'shares': column(metrics['shares'], pa.int64())
+            },
+            'comments': {
+                'captured_at': [captured_at] * len(comments),
+                'post_url': comments['post_url'].tolist(),
+                'commenter': comments['username'].tolist(),
+                'text': comment_texts,
+                'likes': column(comments['likes'], pa.int64()),
+                'posted_at': comments['date'].tolist()
+            },
+            'engagement': {
+                'captured_at': [captured_at] * len(posts),
+                'post_url': metrics['post_url'].tolist(),
+                'followers': column(metrics['followers'], pa.int64()),
+                'likes': column(metrics['likes'], pa.int64()),
+                'comments': column(metrics['comments'], pa.int64()),
+                'shares': column(metrics['shares'], pa.int64()),
+                'engagement_rate': column(metrics['engagement_rate'], pa.float64())
+            }
+        }
+        return {table: pa.Table.from_pydict(data[table], schema=SCHEMAS[table]) for table in TABLES}
+
+    def write_snapshot(self, profile_data: Dict) -> Dict[str, int]:
+        """Scrive le tabelle di uno snapshot, sostituendo la partizione dello stesso giorno"""
+        snapshot_date = _date_key(datetime.fromisoformat(profile_data['timestamp']))
+        row_counts = {}
+        for table, data in self._build_tables(profile_data).items():
+            path = self._partition_file(table, snapshot_date, profile_data['username'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # ds.dataset ignora i file che iniziano con '.': un lettore non vede mai il file parziale
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                pq.write_table(data, tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+            row_counts[table] = data.num_rows
+        return row_counts
+
+    def dataset(self, table: str) -> Optional[ds.Dataset]:
+        """Dataset Arrow di una tabella; None se non è ancora stato scritto nulla"""
+        path = self.root / table
+        if not path.exists():
+            return None
+        return ds.dataset(str(path.resolve()), schema=_dataset_schema(table), format='parquet',
+                          partitioning=PARTITIONING, filesystem=self.filesystem)
+
+    def read(self, table: str, columns: Optional[List[str]] = None, usernames: Optional[List[str]] = None,
+             start: Optional[Union[date, datetime, str]] = None, end: Optional[Union[date, datetime, str]] = None,
+             where: Optional[ds.Expression] = None) -> pa.Table:
+        """Legge una tabella leggendo solo le colonne richieste e le partizioni che soddisfano i filtri"""
+        dataset = self.dataset(table)
+        if dataset is None:
+            empty = _dataset_schema(table).empty_table()
+            return empty.select(columns) if columns else empty
+
+        # I filtri su username e data scartano intere directory; gli altri usano le statistiche dei row group
+        conditions = []
+        if usernames:
+            conditions.append(ds.field('username').isin(list(usernames)))
+        if start:
+            conditions.append(ds.field('snapshot_date') >= _date_key(start))
+        if end:
+            conditions.append(ds.field('snapshot_date') <= _date_key(end))
+        if where is not None:
+            conditions.append(where)
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return dataset.to_table(columns=columns, filter=expression)
+
+    def read_pandas(self, table: str, **kwargs) -> pd.DataFrame:
+        """Come read(), ma restituisce un DataFrame pandas"""
+        return self.read(table, **kwargs).to_pandas()
+
+    def engagement_summary(self, usernames: Optional[List[str]] = None,
+                           start: Optional[Union[date, datetime, str]] = None,
+                           end: Optional[Union[date, datetime, str]] = None) -> pd.DataFrame:
+        """Engagement medio e interazioni totali per profilo e giorno di snapshot"""
+        data = self.read('engagement', columns=['username', 'snapshot_date', 'engagement_rate', 'likes', 'comments', 'shares'],
+                         usernames=usernames, start=start, end=end)
+        if data.num_rows == 0:
+            return pd.DataFrame(columns=['username', 'snapshot_date', 'posts', 'average_engagement',
+                                         'likes', 'comments', 'shares'])
+
+        summary = data.group_by(['username', 'snapshot_date']).aggregate([
+            ('engagement_rate', 'count'),
+            ('engagement_rate', 'mean'),
+            ('likes', 'sum'),
+            ('comments', 'sum'),
+            ('shares', 'sum')
+        ])
+        summary = summary.sort_by([('username', 'ascending'), ('snapshot_date', 'ascending')])
+        return summary.rename_columns([
+            'posts' if name == 'engagement_rate_count' else
+            'average_engagement' if name == 'engagement_rate_mean' else
+            name.removesuffix('_sum')
+            for name in summary.column_names
+        ]).to_pandas()
+
+    def top_posts(self, usernames: Optional[List[str]] = None, start: Optional[Union[date, datetime, str]] = None,
+                  end: Optional[Union[date, datetime, str]] = None, limit: int = 10) -> pd.DataFrame:
+        """Post con l'engagement rate più alto nell'intervallo, tra tutti i profili indicati"""
+        data = self.read('engagement', columns=['username', 'snapshot_date', 'post_url', 'engagement_rate'],
+                         usernames=usernames, start=start, end=end,
+                         where=ds.field('engagement_rate').is_valid())
+        return data.sort_by([('engagement_rate', 'descending')]).slice(0, limit).to_pandas()
+
+def backfill(storage=None, store: Optional[ParquetStore] = None) -> Dict[str, int]:
+    """Esporta in Parquet tutti gli snapshot già presenti nel backend di storage"""
+    storage = storage or get_storage()
+    store = store or ParquetStore()
+    totals = {table: 0 for table in TABLES}
+    for username in storage.list_profiles():
+        for snapshot in storage.load_snapshots(username):
+            for table, rows in store.write_snapshot(snapshot).items():
+                totals[table] += rows
+    logger.info(f"Parquet backfill completed: {totals}")
+    return totals
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Store Parquet degli snapshot per le analisi')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('backfill', help='esporta gli snapshot esistenti')
+    summary_parser = subparsers.add_parser('summary', help='engagement per profilo e giorno')
+    summary_parser.add_argument('usernames', nargs='*')
+    summary_parser.add_argument('--start')
+    summary_parser.add_argument('--end')
+    args = parser.parse_args()
+
+    if args.command == 'backfill':
+        backfill()
+    else:
+        print(ParquetStore().engagement_summary(args.usernames or None, args.start, args.end).to_string(index=False))
@@ -0,0 +1,473 @@
+import logging
+import re
+import threading
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+
+from config.config import (
+    DATABASE_URL,
+    OUTPUT_DIR,
+    STORAGE_BACKEND
+)
+from src.database.connection import get_session_factory
+from src.database.models import Comment, Post, Profile, Report, Snapshot
+from src.utils.file_lock import file_lock
+from src.utils.json_io import EXTENSIONS, json_extension, json_stem, read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+# Gli username di TikTok contengono solo lettere, cifre, '_' e '.': uno stem che termina con '_report' non può
+# essere uno snapshot, che termina sempre con la data
+SNAPSHOT_FILE = re.compile(r'(?P<username>.+)_(?P<date>\d{8})')
+REPORT_FILE = re.compile(r'(?P<username>.+)_(?P<date>\d{8})_report')
+# Nome dei report delle versioni precedenti, ambiguo con gli snapshot degli username che terminano con '_report'
+LEGACY_REPORT_FILE = re.compile(r'(?P<username>.+)_report_(?P<date>\d{8})')
+
+def _is_report(path: Path) -> bool:
+    """Distingue dal contenuto un report da uno snapshot con lo stesso nome"""
+    try:
+        return 'raw_data' in read_json(path)
+    except (OSError, ValueError):
+        return False
+
+def parse_output_filename(path: Path) -> Optional[Tuple[str, str, str]]:
+    """Riconosce un file di OUTPUT_DIR: ('snapshots' | 'reports', username, YYYYMMDD), anche con '_' nello username"""
+    stem = json_stem(path)
+    if stem is None:
+        return None
+    match = REPORT_FILE.fullmatch(stem)
+    if match:
+        return 'reports', match['username'], match['date']
+    match = SNAPSHOT_FILE.fullmatch(stem)
+    if match is None:
+        return None
+    # Solo i nomi nel formato precedente richiedono di leggere il file
+    legacy = LEGACY_REPORT_FILE.fullmatch(stem)
+    if legacy and _is_report(path):
+        return 'reports', legacy['username'], legacy['date']
+    return 'snapshots', match['username'], match['date']
+
+def _date_suffix(timestamp: Optional[str]) -> str:
+    """Data YYYYMMDD usata per nomi di file e partizioni"""
+    moment = datetime.fromisoformat(timestamp) if timestamp else datetime.now()
+    return moment.strftime('%Y%m%d')
+
+class FileStorage:
+    """Snapshot e report come file JSON giornalieri in OUTPUT_DIR, compressi secondo SNAPSHOT_COMPRESSION"""
+
+    def __init__(self, output_dir: str = OUTPUT_DIR):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.output_dir / MANIFEST_FILE
+        self._manifest: Optional[Dict] = None
+        self._manifest_mtime: Optional[float] = None
+        self._manifest_lock = threading.Lock()
+
+    def _file_entry(self, path: Path) -> Dict:
+        stat = path.stat()
+        return {'file': path.name, 'mtime': stat.st_mtime, 'size': stat.st_size}
+
+    def _scan(self) -> Dict:
+        """Indice di snapshot e report ricavato dai file presenti in OUTPUT_DIR"""
+        profiles: Dict[str, Dict] = {}
+        for path in self.output_dir.glob('*.json*'):
+            parsed = parse_output_filename(path)
+            if parsed is None:
+                continue
+            try:
+                entry = self._file_entry(path)
+            except FileNotFoundError:
+                continue
+            kind, username, date_key = parsed
+            entries = profiles.setdefault(username, {'snapshots': {}, 'reports': {}})[kind]
+            # Con lo stesso giorno in due formati vale il file scritto per ultimo
+            if date_key not in entries or entries[date_key]['mtime'] < entry['mtime']:
+                entries[date_key] = entry
+        return {'version': MANIFEST_VERSION, 'profiles': profiles}
+
+    def rebuild_manifest(self) -> Dict:
+        """Ricostruisce l'indice di snapshot e report scansionando OUTPUT_DIR"""
+        with self._manifest_lock, file_lock(str(self.manifest_path)):
+            self._manifest = self._scan()
+            self._save_manifest()
+        logger.info(f"Rebuilt output manifest with {len(self._manifest['profiles'])} profiles")
+        return self._manifest
+
+    def _save_manifest(self):
+        # write_json scrive su un file temporaneo e lo rinomina: i lettori non vedono mai un indice parziale
+        write_json(self.manifest_path, self._manifest, compression='none')
+        self._manifest_mtime = self.manifest_path.stat().st_mtime
+
+    def _load_manifest(self) -> Optional[Tuple[Dict, float]]:
+        """Indice salvato e sua data di modifica; None se assente, illeggibile o di un'altra versione"""
+        try:
+            mtime = self.manifest_path.stat().st_mtime
+            manifest = read_json(self.manifest_path)
+        except (FileNotFoundError, ValueError):
+            return None
+        if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+            return None
+        return manifest, mtime
+
+    def _current_manifest(self) -> Dict:
+        """Indice in memoria, riletto solo se un altro processo lo ha aggiornato"""
+        try:
+            mtime = self.manifest_path.stat().st_mtime
+        except FileNotFoundError:
+            return self.rebuild_manifest()
+        if self._manifest is None or mtime != self._manifest_mtime:
+            with self._manifest_lock:
+                loaded = self._load_manifest()
+                if loaded is not None:
+                    self._manifest, self._manifest_mtime = loaded
+            if loaded is None:
+                return self.rebuild_manifest()
+        return self._manifest
+
+    def _entries(self, username: str, kind: str) -> Dict[str, Dict]:
+        return self._current_manifest()['profiles'].get(username, {}).get(kind, {})
+
+    def _latest(self, username: str, kind: str) -> Optional[Path]:
+        entries = self._entries(username, kind)
+        if not entries:
+            return None
+        return self.output_dir / entries[max(entries)]['file']
+
+    def _read(self, path: Path) -> Dict:
+        return read_json(path)
+
+    def _read_latest(self, username: str, kind: str) -> Optional[Tuple[Path, Dict]]:
+        """Legge il file più recente; se l'indice punta a un file sparito lo ricostruisce e riprova"""
+        for attempt in range(2):
+            path = self._latest(username, kind)
+            if path is None:
+                return None
+            try:
+                return path, self._read(path)
+            except FileNotFoundError:
+                if attempt:
+                    raise
+                logger.warning(f"Output manifest is stale ({path.name} missing), rebuilding")
+                self.rebuild_manifest()
+        return None
+
+    def _write(self, kind: str, username: str, date_key: str, data: Dict) -> str:
+        stem = f"{username}_{date_key}_report" if kind == 'reports' else f"{username}_{date_key}"
+        path = self.output_dir / f"{stem}{json_extension()}"
+        write_json(path, data)
+        # Un file dello stesso giorno nell'altro formato sarebbe letto come uno snapshot in più
+        for extension in EXTENSIONS:
+            sibling = self.output_dir / f"{stem}{extension}"
+            if sibling != path and sibling.exists():
+                sibling.unlink()
+
+        # Lettura e scrittura dell'indice sotto un lock tra processi: CLI, worker e API scrivono in OUTPUT_DIR
+        # e senza il lock ognuno sovrascriverebbe le voci aggiunte dagli altri
+        with self._manifest_lock, file_lock(str(self.manifest_path)):
+            loaded = self._load_manifest()
+            self._manifest = loaded[0] if loaded else self._scan()
+            entries = self._manifest['profiles'].setdefault(username, {'snapshots': {}, 'reports': {}})[kind]
+            entries[date_key] = self._file_entry(path)
+            self._save_manifest()
+        return path.name
+
+    def save_snapshot(self, profile_data: Dict) -> str:
+        """Salva lo snapshot giornaliero di un profilo"""
+        return self._write('snapshots', profile_data['username'], _date_suffix(profile_data.get('timestamp')), profile_data)
+
+    def load_latest_snapshot(self, username: str) -> Optional[Dict]:
+        """Carica lo snapshot più recente di un profilo"""
+        latest = self._read_latest(username, 'snapshots')
+        if latest is None:
+            return None
+        path, snapshot = latest
+        snapshot['_source'] = path.name
+        return snapshot
+
+    def load_snapshots(self, username: str, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None) -> List[Dict]:
+        """Carica gli snapshot di un profilo compresi nell'intervallo di date"""
+        start_key = start.strftime('%Y%m%d') if start else '00000000'
+        end_key = end.strftime('%Y%m%d') if end else '99999999'
+        for attempt in range(2):
+            entries = self._entries(username, 'snapshots')
+            try:
+                return [self._read(self.output_dir / entries[date_key]['file']) for date_key in sorted(entries)
+                        if start_key <= date_key <= end_key]
+            except FileNotFoundError as e:
+                if attempt:
+                    raise
+                logger.warning(f"Output manifest is stale ({Path(e.filename).name} missing), rebuilding")
+                self.rebuild_manifest()
+        return []
+
+    def save_report(self, report: Dict) -> str:
+        """Salva il report giornaliero di un profilo"""
+        return self._write('reports', report['username'], _date_suffix(report.get('timestamp')), report)
+
+    def load_latest_report(self, username: str) -> Optional[Dict]:
+        """Carica il report più recente di un profilo"""
+        latest = self._read_latest(username, 'reports')
+        return latest[1] if latest else None
+
+    def get_status(self, username: str) -> Dict:
+        """Indica se per un profilo esistono dati e report, e quando sono stati aggiornati"""
+        snapshots = self._entries(username, 'snapshots')
+        reports = self._entries(username, 'reports')
+        updates = [entry['mtime'] for entry in list(snapshots.values()) + list(reports.values())]
+        return {
+            'data_collected': len(snapshots) > 0,
+            'analysis_completed': len(reports) > 0,
+            'last_update': max(updates) if updates else None
+        }
+
+    def list_profiles(self) -> List[str]:
+        """Elenca i profili con almeno uno snapshot"""
+        return sorted(username for username, entries in self._current_manifest()['profiles'].items()
+                      if entries['snapshots'])
+
+    def list_reported_profiles(self) -> List[str]:
+        """Elenca i profili con almeno un report"""
+        return sorted(username for username, entries in self._current_manifest()['profiles'].items()
+                      if entries['reports'])
+
+    def find_post_history(self, post_url: str) -> List[Dict]:
+        """Restituisce i valori di un post in ogni snapshot in cui compare"""
+        history = []
+        for username in self.list_profiles():
+            for snapshot in self.load_snapshots(username):
+                for post in snapshot.get('posts', []):
+                    if post.get('url') == post_url:
+                        history.append({'timestamp': snapshot.get('timestamp'), **post})
+        return sorted(history, key=lambda entry: entry.get('timestamp') or '')
+
+class SQLStorage:
+    """Snapshot e report in tabelle normalizzate e indicizzate su DATABASE_URL"""
+
+    def __init__(self, database_url: str = DATABASE_URL):
+        self.Session = get_session_factory(database_url)
+
+    def _get_or_create_profile(self, session, username: str) -> Profile:
+        profile = session.scalar(select(Profile).where(Profile.username == username))
+        if profile is None:
+            profile = Profile(username=username)
+            session.add(profile)
+            session.flush()
+        return profile
+
+    def _profile_id(self, session, username: str) -> Optional[int]:
+        return session.scalar(select(Profile.id).where(Profile.username == username))
+
+    def save_snapshot(self, profile_data: Dict) -> str:
+        """Salva lo snapshot di un profilo con post e commenti normalizzati"""
+        captured_at = datetime.fromisoformat(profile_data['timestamp'])
+        with self.Session() as session:
+            profile = self._get_or_create_profile(session, profile_data['username'])
+            existing = session.scalar(select(Snapshot).where(
+                Snapshot.profile_id == profile.id, Snapshot.captured_at == captured_at))
+            if existing is not None:
+                return str(existing.id)
+
+            snapshot = Snapshot(
+                profile_id=profile.id,
+                captured_at=captured_at,
+                snapshot_date=captured_at.strftime('%Y%m%d'),
+                profile_info=profile_data.get('profile_info', {}),
+                refresh=profile_data.get('refresh')
+            )
+            interactions = profile_data.get('interactions', {})
+            for position, post_data in enumerate(profile_data.get('posts', [])):
+                post_interactions = interactions.get(post_data['url']) or {}
+                post = Post(
+                    position=position,
+                    url=post_data['url'],
+                    description=post_data.get('description', ''),
+                    thumbnail=post_data.get('thumbnail', ''),
+                    posted_at=post_data.get('date', ''),
+                    likes=post_data.get('likes'),
+                    comments_count=post_data.get('comments'),
+                    shares=post_data.get('shares'),
+                    has_interactions=bool(post_interactions)
+                )
+                post.comments = [
+                    Comment(
+                        position=comment_position,
+                        username=comment.get('username', ''),
+                        text=comment.get('text', ''),
+                        likes=comment.get('likes'),
+                        posted_at=comment.get('date', '')
+                    )
+                    for comment_position, comment in enumerate(post_interactions.get('comments', []))
+                ]
+                snapshot.posts.append(post)
+
+            session.add(snapshot)
+            session.commit()
+            return str(snapshot.id)
+
+    def _snapshot_to_dict(self, username: str, snapshot: Snapshot) -> Dict:
+        posts = []
+        interactions = {}
+        for post in snapshot.posts:
+            posts.append({
+                'url': post.url,
+                'thumbnail': post.thumbnail,
+                'description': post.description,
+                'likes': post.likes,
+                'comments': post.comments_count,
+                'shares': post.shares,
+                'date': post.posted_at
+            })
+            interactions[post.url] = {
+                'comments': [
+                    {'username': c.username, 'text': c.text, 'likes': c.likes, 'date': c.posted_at}
+                    for c in post.comments
+                ]
+            } if post.has_interactions else {}
+
+        data = {
+            'username': username,
+            'timestamp': snapshot.captured_at.isoformat(),
+            'profile_info': snapshot.profile_info,
+            'posts': posts,
+            'interactions': interactions
+        }
+        if snapshot.refresh is not None:
+            data['refresh'] = snapshot.refresh
+        return data
+
+    def _snapshot_query(self, profile_id: int):
+        return (
+            select(Snapshot)
+            .where(Snapshot.profile_id == profile_id)
+            .options(selectinload(Snapshot.posts).selectinload(Post.comments))
+        )
+
+    def load_latest_snapshot(self, username: str) -> Optional[Dict]:
+        """Carica lo snapshot più recente di un profilo"""
+        with self.Session() as session:
+            profile_id = self._profile_id(session, username)
+            if profile_id is None:
+                return None
+            snapshot = session.scalar(self._snapshot_query(profile_id).order_by(Snapshot.captured_at.desc()).limit(1))
+            if snapshot is None:
+                return None
+            data = self._snapshot_to_dict(username, snapshot)
+            data['_source'] = f"snapshot:{snapshot.id}"
+            return data
+
+    def load_snapshots(self, username: str, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None) -> List[Dict]:
+        """Carica gli snapshot di un profilo compresi nell'intervallo di date"""
+        with self.Session() as session:
+            profile_id = self._profile_id(session, username)
+            if profile_id is None:
+                return []
+            query = self._snapshot_query(profile_id).order_by(Snapshot.captured_at)
+            if start:
+                query = query.where(Snapshot.captured_at >= start)
+            if end:
+                query = query.where(Snapshot.captured_at <= end)
+            return [self._snapshot_to_dict(username, snapshot) for snapshot in session.scalars(query)]
+
+    def save_report(self, report: Dict) -> str:
+        """Salva il report di un profilo"""
+        created_at = datetime.fromisoformat(report['timestamp'])
+        with self.Session() as session:
+            profile = self._get_or_create_profile(session, report['username'])
+            existing_id = session.scalar(select(Report.id).where(
+                Report.profile_id == profile.id, Report.created_at == created_at))
+            if existing_id is not None:
+                return str(existing_id)
+
+            row = Report(profile_id=profile.id, created_at=created_at,
+                         report_date=created_at.strftime('%Y%m%d'), data=report)
+            session.add(row)
+            session.commit()
+            return str(row.id)
+
+    def load_latest_report(self, username: str) -> Optional[Dict]:
+        """Carica il report più recente di un profilo"""
+        with self.Session() as session:
+            return session.scalar(
+                select(Report.data)
+                .join(Profile, Report.profile_id == Profile.id)
+                .where(Profile.username == username)
+                .order_by(Report.created_at.desc())
+                .limit(1)
+            )
+
+    def get_status(self, username: str) -> Dict:
+        """Indica se per un profilo esistono dati e report, e quando sono stati aggiornati"""
+        with self.Session() as session:
+            profile_id = self._profile_id(session, username)
+            last_snapshot = session.scalar(
+                select(func.max(Snapshot.captured_at)).where(Snapshot.profile_id == profile_id))
+            last_report = session.scalar(
+                select(func.max(Report.created_at)).where(Report.profile_id == profile_id))
+
+        updates = [moment.timestamp() for moment in (last_snapshot, last_report) if moment is not None]
+        return {
+            'data_collected': last_snapshot is not None,
+            'analysis_completed': last_report is not None,
+            'last_update': max(updates) if updates else None
+        }
+
+    def list_profiles(self) -> List[str]:
+        """Elenca i profili con almeno uno snapshot"""
+        with self.Session() as session:
+            return list(session.scalars(
+                select(Profile.username).where(Profile.snapshots.any()).order_by(Profile.username)))
+
+    def list_reported_profiles(self) -> List[str]:
+        """Elenca i profili con almeno un report"""
+        with self.Session() as session:
+            return list(session.scalars(
+                select(Profile.username).where(Profile.reports.any()).order_by(Profile.username)))
+
+    def find_post_history(self, post_url: str) -> List[Dict]:
+        """Restituisce i valori di un post in ogni snapshot in cui compare"""
+        with self.Session() as session:
+            rows = session.execute(
+                select(Post, Snapshot.captured_at)
+                .join(Snapshot, Post.snapshot_id == Snapshot.id)
+                .where(Post.url == post_url)
+                .order_by(Snapshot.captured_at)
+            ).all()
+            return [
+                {
+                    'timestamp': captured_at.isoformat(),
+                    'url': post.url,
+                    'description': post.description,
+                    'likes': post.likes,
+                    'comments': post.comments_count,
+                    'shares': post.shares,
+                    'date': post.posted_at
+                }
+                for post, captured_at in rows
+            ]
+
+@lru_cache(maxsize=None)
+def get_storage(backend: str = STORAGE_BACKEND):
+    """Restituisce il backend di storage configurato ('file' o 'sql')"""
+    if backend == 'sql':
+        return SQLStorage()
+    return FileStorage()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Manutenzione dello storage su file')
+    parser.add_argument('command', choices=['rebuild-manifest'])
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    FileStorage(args.output_dir).rebuild_manifest()
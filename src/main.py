@@ -1,6 +1,8 @@
 import asyncio
 import logging
+from datetime import datetime
 from pathlib import Path
+from typing import Optional
 import sys
 import os
 
@@ -14,11 +16,20 @@ from config.config import (
     MODEL_DIR,
     LOG_LEVEL,
     LOG_FORMAT,
-    LOG_FILE
+    LOG_FILE,
+    INCREMENTAL_SCRAPING,
+    STREAM_MAX_POSTS,
+    STREAM_MAX_COMMENTS,
+    STREAM_TIME_BUDGET,
+    JOB_LEASE_SECONDS,
+    JOB_POLL_INTERVAL
 )
 
 from src.scraper.tiktok_scraper import TikTokScraper
+from src.scraper.stream_harvester import StreamHarvester
 from src.analyzer.ai_analyzer import AIAnalyzer
+from src.analyzer.sentiment_service import close_sentiment_service
+from src.database.job_queue import ScrapeJobQueue, default_worker_id
 from src.api.main import app
 
 # Setup logging
@@ -33,9 +44,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class TikTokAnalyzer:
-    def __init__(self):
+    def __init__(self, incremental: bool = INCREMENTAL_SCRAPING):
         self.scraper = None
         self.analyzer = AIAnalyzer()
+        self.incremental = incremental
         
         # Assicura che tutte le directory necessarie esistano
         for directory in [OUTPUT_DIR, CACHE_DIR, MODEL_DIR]:
@@ -45,7 +57,8 @@ class TikTokAnalyzer:
         """Inizializza lo scraper"""
         self.scraper = TikTokScraper()
         await self.scraper.init_browser()
-        await self.scraper.login()
+        await self.scraper.ensure_logged_in()
+        await self.scraper.init_context_pool()
 
     async def close_scraper(self):
         """Chiude lo scraper"""
@@ -53,50 +66,95 @@ class TikTokAnalyzer:
             await self.scraper.close()
 
     async def analyze_profiles(self, usernames: list[str]):
-        """Analizza una lista di profili"""
+        """Analizza una lista di profili in parallelo sul pool di contesti dello scraper"""
         try:
-            for username in usernames:
-                logger.info(f"Starting analysis for profile: {username}")
-                
-                # Scraping del profilo
-                try:
-                    profile_data = await self.scraper.analyze_profile(username)
-                    logger.info(f"Scraping completed for {username}")
-                except Exception as e:
-                    logger.error(f"Error scraping profile {username}: {str(e)}")
-                    continue
-
-                # Analisi AI del profilo
-                try:
-                    report = await self.analyzer.generate_profile_report(username)
-                    logger.info(f"AI analysis completed for {username}")
-                except Exception as e:
-                    logger.error(f"Error analyzing profile {username}: {str(e)}")
-                    continue
+            await asyncio.gather(*(self.analyze_single_profile(username) for username in usernames))
 
         except Exception as e:
             logger.error(f"Error in profile analysis: {str(e)}")
         finally:
             await self.close_scraper()
 
-async def main():
+    async def analyze_single_profile(self, username: str) -> bool:
+        """Esegue scraping e analisi AI di un singolo profilo, restituendo l'esito"""
+        logger.info(f"Starting analysis for profile: {username}")
+
+        # Scraping del profilo
+        try:
+            profile_data = await self.scraper.analyze_profile(username, incremental=self.incremental)
+        except Exception as e:
+            logger.error(f"Error scraping profile {username}: {str(e)}")
+            return False
+        # analyze_profile non solleva eccezioni: uno snapshot senza profilo o post è uno scraping fallito
+        if not profile_data.get('profile_info') or not profile_data.get('posts'):
+            logger.error(f"Scraping of {username} returned no profile info or posts")
+            return False
+        logger.info(f"Scraping completed for {username}")
+
+        # Analisi AI del profilo
+        try:
+            report = await self.analyzer.generate_profile_report(username)
+        except Exception as e:
+            logger.error(f"Error analyzing profile {username}: {str(e)}")
+            return False
+        # Anche generate_profile_report segnala gli errori nel report invece di sollevarli
+        if 'error' in report:
+            logger.error(f"Error analyzing profile {username}: {report['error']}")
+            return False
+        logger.info(f"AI analysis completed for {username}")
+
+        return True
+
+    async def process_queue(self, queue: ScrapeJobQueue, worker_id: str):
+        """Elabora i job della coda condivisa finché ne restano in attesa o in lavorazione"""
+        while True:
+            job = await asyncio.to_thread(queue.claim, worker_id)
+            if job is None:
+                # I tentativi ritardati e i lease ancora attivi (che possono scadere) vanno attesi, non abbandonati,
+                # anche se appartengono al ciclo precedente perché il worker è ancora attivo dopo la mezzanotte
+                if not await asyncio.to_thread(queue.open_jobs):
+                    return
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+                continue
+
+            heartbeat = asyncio.create_task(self._keep_lease(queue, job['id'], worker_id))
+            try:
+                succeeded = await self.analyze_single_profile(job['username'])
+            finally:
+                heartbeat.cancel()
+
+            if succeeded:
+                await asyncio.to_thread(queue.complete, job['id'], worker_id)
+            else:
+                await asyncio.to_thread(queue.fail, job['id'], worker_id, 'Profile analysis failed, see worker logs')
+
+    async def _keep_lease(self, queue: ScrapeJobQueue, job_id: int, worker_id: str):
+        """Rinnova periodicamente il lease del job in lavorazione"""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            if not await asyncio.to_thread(queue.heartbeat, job_id, worker_id):
+                logger.warning(f"Lost lease on job {job_id}")
+                return
+
+def read_usernames() -> list[str]:
+    """Legge gli username da analizzare dal file di input"""
+    if not Path(INPUT_FILE_PATH).exists():
+        logger.error(f"Input file not found: {INPUT_FILE_PATH}")
+        return []
+    with open(INPUT_FILE_PATH, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+async def main(incremental: bool = INCREMENTAL_SCRAPING):
     """Funzione principale"""
     try:
-        # Verifica se il file di input esiste
-        if not Path(INPUT_FILE_PATH).exists():
-            logger.error(f"Input file not found: {INPUT_FILE_PATH}")
-            return
-
         # Legge gli username da analizzare
-        with open(INPUT_FILE_PATH, 'r') as f:
-            usernames = [line.strip() for line in f if line.strip()]
-
+        usernames = read_usernames()
         if not usernames:
             logger.error("No usernames found in input file")
             return
 
         # Inizializza l'analizzatore
-        analyzer = TikTokAnalyzer()
+        analyzer = TikTokAnalyzer(incremental=incremental)
         await analyzer.init_scraper()
 
         # Avvia l'analisi
@@ -104,6 +162,40 @@ async def main():
 
     except Exception as e:
         logger.error(f"Error in main execution: {str(e)}")
+    finally:
+        close_sentiment_service()
+
+async def run_queue_worker(incremental: bool = INCREMENTAL_SCRAPING):
+    """Worker che preleva gli username dalla coda condivisa su DATABASE_URL"""
+    queue = ScrapeJobQueue()
+    worker_id = default_worker_id()
+    analyzer = TikTokAnalyzer(incremental=incremental)
+    try:
+        await analyzer.init_scraper()
+        logger.info(f"Worker {worker_id} started with {analyzer.scraper.pool_size} slots")
+        await asyncio.gather(*(analyzer.process_queue(queue, worker_id) for _ in range(analyzer.scraper.pool_size)))
+        logger.info(f"Queue drained, job stats: {queue.stats()}")
+    except Exception as e:
+        logger.error(f"Error in queue worker: {str(e)}")
+    finally:
+        await analyzer.close_scraper()
+        close_sentiment_service()
+
+async def run_stream(usernames: list[str], max_posts: int = STREAM_MAX_POSTS, max_comments: int = STREAM_MAX_COMMENTS,
+                     since: Optional[datetime] = None, time_budget: float = STREAM_TIME_BUDGET):
+    """Scarica post e commenti dei profili in streaming su file JSONL"""
+    scraper = TikTokScraper()
+    try:
+        await scraper.init_browser()
+        await scraper.ensure_logged_in()
+        harvester = StreamHarvester(scraper)
+        for username in usernames:
+            summary = await harvester.harvest_profile(username, max_posts, max_comments, since, time_budget)
+            logger.info(f"Stream harvest completed for {username}: {summary}")
+    except Exception as e:
+        logger.error(f"Error in stream harvest: {str(e)}")
+    finally:
+        await scraper.close()
 
 def run_api():
     """Avvia il server API"""
@@ -114,12 +206,33 @@ if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description='TikTok Profile Analyzer')
-    parser.add_argument('--mode', choices=['scrape', 'api'], default='scrape',
-                      help='Modalità di esecuzione: scrape per analizzare profili, api per avviare il server')
+    parser.add_argument('--mode', choices=['scrape', 'stream', 'enqueue', 'api'], default='scrape',
+                      help='Modalità di esecuzione: scrape per analizzare profili, stream per scaricare '
+                           'post e commenti su JSONL, enqueue per caricare i profili nella coda condivisa, '
+                           'api per avviare il server')
+    parser.add_argument('--queue', action='store_true',
+                      help='In modalità scrape preleva gli username dalla coda condivisa su DATABASE_URL')
+    parser.add_argument('--incremental', action=argparse.BooleanOptionalAction, default=INCREMENTAL_SCRAPING,
+                      help="Riscarica solo i post nuovi o modificati rispetto all'ultimo snapshot")
+    parser.add_argument('--since', type=datetime.fromisoformat,
+                      help='In modalità stream ignora post e commenti precedenti a questa data ISO '
+                           '(es. 2024-01-31 o 2024-01-31T12:00:00+00:00; senza fuso è ora locale)')
+    parser.add_argument('--max-posts', type=int, default=STREAM_MAX_POSTS,
+                      help='In modalità stream numero massimo di post per profilo')
+    parser.add_argument('--max-comments', type=int, default=STREAM_MAX_COMMENTS,
+                      help='In modalità stream numero massimo di commenti per post')
+    parser.add_argument('--time-budget', type=float, default=STREAM_TIME_BUDGET,
+                      help='In modalità stream tempo massimo per profilo, in secondi')
     
     args = parser.parse_args()
     
     if args.mode == 'api':
         run_api()
+    elif args.mode == 'stream':
+        asyncio.run(run_stream(read_usernames(), args.max_posts, args.max_comments, args.since, args.time_budget))
+    elif args.mode == 'enqueue':
+        ScrapeJobQueue().enqueue(read_usernames())
+    elif args.queue:
+        asyncio.run(run_queue_worker(incremental=args.incremental))
     else:
-        asyncio.run(main()) 
\ No newline at end of file
+        asyncio.run(main(incremental=args.incremental)) 
\ No newline at end of file
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
+from playwright.async_api import Page, Response
+
+from config.config import NETWORK_CAPTURE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Endpoint JSON interrogati dalla web app di TikTok
+USER_DETAIL_API = '/api/user/detail'
+POST_LIST_API = '/api/post/item_list'
+COMMENT_LIST_API = '/api/comment/list'
+
+REHYDRATION_SCRIPT_ID = '__UNIVERSAL_DATA_FOR_REHYDRATION__'
+
+@contextmanager
+def json_listener(page: Page, api_path: str) -> Iterator[asyncio.Queue]:
+    """Coda dei payload JSON di api_path ricevuti dalla pagina, in ordine di arrivo, mentre il contesto è attivo"""
+    payloads = asyncio.Queue()
+
+    async def on_response(response: Response):
+        if api_path not in response.url or response.request.resource_type not in ('xhr', 'fetch'):
+            return
+        try:
+            payload = await response.json()
+        except Exception as e:
+            logger.debug(f"Ignoring non-JSON response from {response.url}: {str(e)}")
+            return
+        payloads.put_nowait(payload)
+
+    page.on('response', on_response)
+    try:
+        yield payloads
+    finally:
+        page.remove_listener('response', on_response)
+
+async def wait_json(payloads: asyncio.Queue, url: str, api_path: str,
+                    timeout: float = NETWORK_CAPTURE_TIMEOUT) -> Optional[Dict]:
+    """Attende il prossimo payload di json_listener; None se non arriva entro timeout"""
+    try:
+        return await asyncio.wait_for(payloads.get(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"No {api_path} payload captured for {url} within {timeout}s")
+        return None
+
+async def capture_json(page: Page, url: str, api_path: str,
+                       navigate: Callable[..., Awaitable] = None,
+                       timeout: float = NETWORK_CAPTURE_TIMEOUT) -> Optional[Dict]:
+    """Naviga verso url e restituisce il primo payload JSON di api_path appena arriva"""
+    navigate = navigate or (lambda page, url, **kwargs: page.goto(url, **kwargs))
+    with json_listener(page, api_path) as payloads:
+        await navigate(page, url, wait_until='domcontentloaded')
+        return await wait_json(payloads, url, api_path, timeout)
+
+async def read_rehydration_data(page: Page) -> Optional[Dict]:
+    """Legge il JSON di idratazione che TikTok incorpora nella pagina renderizzata dal server"""
+    raw = await page.evaluate(f'''() => {{
+        const script = document.getElementById('{REHYDRATION_SCRIPT_ID}');
+        return script ? script.textContent : null;
+    }}''')
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        logger.warning(f"Invalid rehydration payload: {str(e)}")
+        return None
+
+def _timestamp_to_iso(value) -> str:
+    """Converte un timestamp Unix di TikTok in stringa ISO"""
+    try:
+        return datetime.fromtimestamp(int(value)).isoformat()
+    except (TypeError, ValueError):
+        return ''
+
+def parse_user_detail(payload: Dict) -> Optional[Dict]:
+    """Estrae le informazioni del profilo da /api/user/detail o dai dati di idratazione"""
+    user_info = payload.get('userInfo')
+    if user_info is None:
+        scope = payload.get('__DEFAULT_SCOPE__', {})
+        user_info = scope.get('webapp.user-detail', {}).get('userInfo')
+    if not user_info:
+        return None
+
+    user = user_info.get('user', {})
+    stats = user_info.get('stats', {})
+    return {
+        'username': user.get('uniqueId', ''),
+        'bio': user.get('signature', ''),
+        'followers': int(stats.get('followerCount', 0)),
+        'following': int(stats.get('followingCount', 0)),
+        'likes': int(stats.get('heartCount', stats.get('heart', 0)))
+    }
+
+def parse_post_list(payload: Dict, max_posts: int) -> List[Dict]:
+    """Estrae i post da /api/post/item_list nello stesso formato dello scraping DOM"""
+    posts = []
+    for item in (payload.get('itemList') or [])[:max_posts]:
+        author = item.get('author', {})
+        stats = item.get('stats', {})
+        posts.append({
+            'url': f"https://www.tiktok.com/@{author.get('uniqueId', '')}/video/{item.get('id', '')}",
+            'thumbnail': item.get('video', {}).get('cover', ''),
+            'description': item.get('desc', ''),
+            'likes': int(stats.get('diggCount', 0)),
+            'comments': int(stats.get('commentCount', 0)),
+            'shares': int(stats.get('shareCount', 0)),
+            'date': _timestamp_to_iso(item.get('createTime'))
+        })
+    return posts
+
+def parse_comment_list(payload: Dict) -> Dict:
+    """Estrae i commenti da /api/comment/list nello stesso formato dello scraping DOM"""
+    comments = []
+    for comment in payload.get('comments') or []:
+        comments.append({
+            'username': comment.get('user', {}).get('unique_id', ''),
+            'text': comment.get('text', ''),
+            'likes': int(comment.get('digg_count', 0)),
+            'date': _timestamp_to_iso(comment.get('create_time'))
+        })
+    return {'comments': comments}
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from config.config import (
+    RATE_LIMIT_CALLS,
+    RATE_LIMIT_PERIOD,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_BACKOFF_BASE,
+    RATE_LIMIT_BACKOFF_MAX,
+    RATE_LIMIT_MIN_FACTOR
+)
+
+logger = logging.getLogger(__name__)
+
+class ThrottledError(Exception):
+    """Navigazione ancora rifiutata (throttling, captcha o errore del server) dopo tutti i tentativi"""
+
+    def __init__(self, url: str, reason: str):
+        super().__init__(f"Navigation to {url} still throttled ({reason}) after all retries")
+        self.url = url
+        self.reason = reason
+
+class AdaptiveRateLimiter:
+    """Token bucket condiviso che rallenta su throttling e captcha e recupera gradualmente"""
+
+    def __init__(self, calls: float = RATE_LIMIT_CALLS, period: float = RATE_LIMIT_PERIOD,
+                 burst: int = RATE_LIMIT_BURST, backoff_base: float = RATE_LIMIT_BACKOFF_BASE,
+                 backoff_max: float = RATE_LIMIT_BACKOFF_MAX, min_factor: float = RATE_LIMIT_MIN_FACTOR):
+        self.base_rate = calls / period
+        self.rate = self.base_rate
+        self.min_rate = self.base_rate * min_factor
+        self.capacity = max(1, burst)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Lock di thread e non di asyncio: il limiter è condiviso tra event loop diversi dello stesso processo
+        self._lock = threading.Lock()
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._backoff_until = 0.0
+        self._consecutive_throttles = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.throttle_events: Counter = Counter()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Attende il proprio turno prima di una navigazione"""
+        with self._lock:
+            start = time.monotonic()
+            self._refill(start)
+            # Prenota il token subito: un saldo negativo rappresenta la coda di chi è in attesa
+            self._tokens -= 1
+            ready_at = start + (-self._tokens / self.rate if self._tokens < 0 else 0.0)
+            self.waiting += 1
+
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    wait = ready_at - now
+                    if self._backoff_until > now:
+                        # Jitter per ogni attesa, così chi era in coda non riparte nello stesso istante
+                        wait = max(wait, self._backoff_until - now + random.uniform(0, self.backoff_base))
+                if wait <= 0:
+                    break
+                # Dopo il risveglio si ricontrolla: un throttling segnalato nel frattempo può aver esteso il backoff
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # Chi rinuncia restituisce il token prenotato: altrimenti chi arriva dopo attenderebbe un turno inutilizzato
+            with self._lock:
+                self._refill(time.monotonic())
+                self._tokens = min(self.capacity, self._tokens + 1)
+                self.waiting -= 1
+            raise
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self.waiting -= 1
+            self.acquired += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def report_success(self):
+        """Segnala una navigazione riuscita e riporta gradualmente il rate al valore configurato"""
+        with self._lock:
+            self._consecutive_throttles = 0
+            self._refill(time.monotonic())
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.1)
+
+    def report_slowdown(self):
+        """Segnala una risposta lenta riducendo il rate senza sospendere le richieste"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate * 0.8)
+            self.throttle_events['slow'] += 1
+
+    def report_throttle(self, reason: str) -> float:
+        """Segnala throttling, captcha o pagina di errore: dimezza il rate e sospende con backoff esponenziale"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._consecutive_throttles += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (self._consecutive_throttles - 1))
+            # Full jitter per evitare che tutte le pagine riprendano nello stesso istante
+            delay = random.uniform(delay / 2, delay)
+            self._backoff_until = max(self._backoff_until, now + delay)
+            self.throttle_events[reason] += 1
+
+        logger.warning(f"Scraping throttled ({reason}): backing off {delay:.1f}s, rate now {self.rate:.4f}/s")
+        return delay
+
+    def metrics(self) -> Dict:
+        """Restituisce le metriche correnti del limiter"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                'current_rate_per_s': self.rate,
+                'base_rate_per_s': self.base_rate,
+                'available_tokens': max(0.0, self._tokens),
+                'queued': self.waiting,
+                'acquired': self.acquired,
+                'average_wait_s': self.total_wait / self.acquired if self.acquired else 0.0,
+                'max_wait_s': self.max_wait,
+                'backoff_remaining_s': max(0.0, self._backoff_until - now),
+                'throttle_events': dict(self.throttle_events)
+            }
+
+_shared_limiter: Optional[AdaptiveRateLimiter] = None
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """Restituisce il limiter condiviso da tutte le pagine e i contesti del processo"""
+    global _shared_limiter
+    if _shared_limiter is None:
+        _shared_limiter = AdaptiveRateLimiter()
+    return _shared_limiter
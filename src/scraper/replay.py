@@ -0,0 +1,153 @@
+import asyncio
+import base64
+import json
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urldefrag, urlsplit
+from playwright.async_api import BrowserContext, Route
+
+from config.config import (
+    REPLAY_DIR,
+    REPLAY_MAX_POSTS
+)
+from src.scraper.tiktok_scraper import TikTokScraper
+
+logger = logging.getLogger(__name__)
+
+# Header che non possono essere riprodotti così come sono stati registrati
+SKIPPED_HEADERS = {
+    'content-encoding', 'content-length', 'transfer-encoding', 'connection',
+    'set-cookie', 'content-security-policy', 'strict-transport-security'
+}
+
+async def record_profiles(usernames: List[str], replay_dir: str = REPLAY_DIR,
+                          max_posts: int = REPLAY_MAX_POSTS) -> List[Path]:
+    """Registra in un file HAR per profilo tutte le risposte necessarie allo scraping"""
+    replay_path = Path(replay_dir)
+    replay_path.mkdir(parents=True, exist_ok=True)
+    scraper = TikTokScraper(pool_size=1)
+    # La registrazione deve passare dalla rete, non dalla cache
+    scraper.scrape_cache = None
+    har_files = []
+
+    try:
+        await scraper.init_browser()
+        await scraper.ensure_logged_in()
+        storage_state = await scraper.context.storage_state()
+
+        for username in usernames:
+            har_file = replay_path / f"{username}.har"
+            # Il file HAR viene scritto alla chiusura del contesto
+            context = await scraper._new_context(storage_state=storage_state, record_har_path=str(har_file),
+                                                 record_har_content='embed')
+            try:
+                page = await context.new_page()
+                await scraper.get_profile_info(username, page=page)
+                posts = await scraper.get_recent_posts(username, max_posts=max_posts, page=page)
+                for post in posts:
+                    await scraper.get_post_interactions(post['url'], page=page)
+                logger.info(f"Recorded profile {username} with {len(posts)} posts")
+            finally:
+                await context.close()
+            har_files.append(har_file)
+
+    finally:
+        await scraper.close()
+
+    return har_files
+
+class HarReplay:
+    """
+    Riproduce nei contesti del browser le risposte registrate nei file HAR, per URL completo e su tutti gli host
+    (pagine, API e bundle delle CDN), così le pagine si idratano come online. Le richieste non registrate vengono
+    interrotte: il replay non esce mai in rete.
+    """
+
+    def __init__(self, replay_dir: str = REPLAY_DIR):
+        self.replay_dir = Path(replay_dir)
+        self._exact: Dict[Tuple[str, str], Dict] = {}
+        self._by_path: Dict[Tuple[str, str, str], Dict] = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Azzera i contatori del run corrente"""
+        self.hits = 0
+        self.misses = 0
+        self.hits_by_path: Counter = Counter()
+        self.misses_by_host: Counter = Counter()
+
+    def load(self) -> int:
+        """Indicizza le voci dei file HAR per metodo e URL completo"""
+        entries = 0
+        for har_file in sorted(self.replay_dir.glob('*.har')):
+            with open(har_file, 'r', encoding='utf-8') as f:
+                har = json.load(f)
+            for entry in har['log']['entries']:
+                request = entry['request']
+                parts = urlsplit(request['url'])
+                if parts.scheme not in ('http', 'https'):
+                    continue
+                self._exact[(request['method'], urldefrag(request['url']).url)] = entry['response']
+                # Le API di TikTok firmano la query a ogni richiesta: host e path da soli fanno da ripiego
+                self._by_path.setdefault((request['method'], parts.netloc, parts.path), entry['response'])
+                entries += 1
+        logger.info(f"Loaded {entries} recorded responses from {self.replay_dir}")
+        return entries
+
+    def lookup(self, method: str, url: str) -> Optional[Dict]:
+        """Restituisce la risposta registrata per una richiesta, oppure None"""
+        parts = urlsplit(url)
+        return self._exact.get((method, urldefrag(url).url)) or \
+            self._by_path.get((method, parts.netloc, parts.path))
+
+    def _body(self, response: Dict) -> bytes:
+        content = response.get('content', {})
+        text = content.get('text', '')
+        if content.get('encoding') == 'base64':
+            return base64.b64decode(text)
+        return text.encode('utf-8')
+
+    async def install(self, context: BrowserContext):
+        """Instrada tutte le richieste del contesto verso le risposte registrate"""
+        if not self._exact:
+            self.load()
+        await context.route('**/*', self._handle_route)
+
+    async def _handle_route(self, route: Route):
+        request = route.request
+        recorded = self.lookup(request.method, request.url)
+        if recorded is None:
+            self.misses += 1
+            self.misses_by_host[urlsplit(request.url).netloc] += 1
+            logger.debug(f"No recorded response for {request.method} {request.url}")
+            await route.abort('internetdisconnected')
+            return
+
+        self.hits += 1
+        self.hits_by_path[urlsplit(request.url).path] += 1
+        headers = {
+            header['name']: header['value'] for header in recorded.get('headers', [])
+            if header['name'].lower() not in SKIPPED_HEADERS
+        }
+        await route.fulfill(status=recorded.get('status', 200), headers=headers, body=self._body(recorded))
+
+    def get_stats(self) -> Dict:
+        """Restituisce i contatori del run corrente"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'top_missed_hosts': dict(self.misses_by_host.most_common(10))
+        }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Registrazione delle pagine TikTok per il replay offline')
+    parser.add_argument('usernames', nargs='+', help='Profili da registrare')
+    parser.add_argument('--replay-dir', default=REPLAY_DIR)
+    parser.add_argument('--max-posts', type=int, default=REPLAY_MAX_POSTS)
+    args = parser.parse_args()
+
+    asyncio.run(record_profiles(args.usernames, args.replay_dir, args.max_posts))
@@ -0,0 +1,142 @@
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from playwright.async_api import BrowserContext, Request, Response, Route
+
+from config.config import (
+    BLOCK_RESOURCES,
+    BLOCKED_RESOURCE_TYPES,
+    BLOCKED_URL_PATTERNS,
+    RESOURCE_SIZES_FILE
+)
+from src.utils.file_lock import file_lock
+from src.utils.json_io import read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+class RequestFilter:
+    """
+    Blocca le risorse non necessarie allo scraping e conta il traffico di ogni run. I byte risparmiati
+    non sono osservabili (le richieste bloccate non ricevono risposta): vengono stimati dalla dimensione
+    media di ogni tipo di risorsa osservata nei run senza filtro, conservata in RESOURCE_SIZES_FILE.
+    """
+
+    def __init__(self, enabled: bool = BLOCK_RESOURCES,
+                 resource_types: List[str] = BLOCKED_RESOURCE_TYPES,
+                 url_patterns: List[str] = BLOCKED_URL_PATTERNS,
+                 sizes_path: str = RESOURCE_SIZES_FILE):
+        self.enabled = enabled
+        self.resource_types = set(resource_types)
+        self.url_patterns = [pattern for pattern in url_patterns if pattern]
+        self.sizes_path = Path(sizes_path)
+        # Byte e risposte con Content-Length per tipo di risorsa: salvati e non salvati in RESOURCE_SIZES_FILE
+        self.observed_bytes: Counter = Counter()
+        self.observed_responses: Counter = Counter()
+        self._new_bytes: Counter = Counter()
+        self._new_responses: Counter = Counter()
+        self._load_sizes()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Azzera i contatori del run corrente"""
+        self.blocked_requests = 0
+        self.allowed_requests = 0
+        self.responses = 0
+        self.transferred_bytes = 0
+        self.blocked_by_type: Counter = Counter()
+        self.blocked_by_host: Counter = Counter()
+        # Tipo di risorsa delle richieste bloccate, anche quando il motivo è un pattern dell'URL
+        self.blocked_resource_types: Counter = Counter()
+
+    def _load_sizes(self):
+        try:
+            saved = read_json(self.sizes_path)
+        except (FileNotFoundError, ValueError):
+            return
+        self.observed_bytes = Counter(saved.get('bytes', {})) + self._new_bytes
+        self.observed_responses = Counter(saved.get('responses', {})) + self._new_responses
+
+    def save_sizes(self):
+        """Aggiunge le dimensioni osservate in questo processo a quelle salvate da tutti i run senza filtro"""
+        if not self._new_responses:
+            return
+        with file_lock(str(self.sizes_path)):
+            self._load_sizes()
+            write_json(self.sizes_path, {'bytes': dict(self.observed_bytes),
+                                         'responses': dict(self.observed_responses)}, compression='none')
+        self._new_bytes, self._new_responses = Counter(), Counter()
+
+    def average_bytes(self, resource_type: str) -> Optional[float]:
+        """Dimensione media osservata di un tipo di risorsa; None se mai osservato"""
+        count = self.observed_responses[resource_type]
+        return self.observed_bytes[resource_type] / count if count else None
+
+    async def install(self, context: BrowserContext):
+        """Installa il filtro e il conteggio del traffico su un contesto del browser"""
+        context.on('response', self._record_response)
+        if self.enabled:
+            await context.route('**/*', self._handle_route)
+
+    def block_reason(self, request: Request) -> Optional[str]:
+        """Restituisce il motivo del blocco, oppure None se la richiesta va lasciata passare"""
+        if request.resource_type in self.resource_types:
+            return request.resource_type
+        for pattern in self.url_patterns:
+            if pattern in request.url:
+                return 'url_pattern'
+        return None
+
+    async def _handle_route(self, route: Route):
+        request = route.request
+        reason = self.block_reason(request)
+        if reason is None:
+            self.allowed_requests += 1
+            # Passa la richiesta alle route installate prima del filtro (es. il replay), altrimenti alla rete
+            await route.fallback()
+            return
+
+        self.blocked_requests += 1
+        self.blocked_by_type[reason] += 1
+        self.blocked_resource_types[request.resource_type] += 1
+        self.blocked_by_host[urlparse(request.url).netloc] += 1
+        await route.abort('blockedbyclient')
+
+    def _record_response(self, response: Response):
+        self.responses += 1
+        # Content-Length è assente per le risposte chunked: il totale è quindi un limite inferiore
+        content_length = response.headers.get('content-length')
+        if content_length and content_length.isdigit():
+            self.transferred_bytes += int(content_length)
+            if not self.enabled:
+                # Solo senza filtro si osservano anche i tipi che il filtro bloccherebbe
+                resource_type = response.request.resource_type
+                for counter in (self.observed_bytes, self._new_bytes):
+                    counter[resource_type] += int(content_length)
+                for counter in (self.observed_responses, self._new_responses):
+                    counter[resource_type] += 1
+
+    def estimated_blocked_bytes(self) -> Dict:
+        """Byte risparmiati stimati dalle dimensioni medie; le richieste di tipi mai osservati restano escluse"""
+        estimated, unestimated = 0.0, 0
+        for resource_type, count in self.blocked_resource_types.items():
+            average = self.average_bytes(resource_type)
+            if average is None:
+                unestimated += count
+            else:
+                estimated += average * count
+        return {'estimated_blocked_bytes': int(estimated), 'blocked_requests_without_estimate': unestimated}
+
+    def get_stats(self) -> Dict:
+        """Restituisce i contatori del run corrente"""
+        return {
+            'enabled': self.enabled,
+            'blocked_requests': self.blocked_requests,
+            'allowed_requests': self.allowed_requests,
+            'responses': self.responses,
+            'transferred_bytes': self.transferred_bytes,
+            **self.estimated_blocked_bytes(),
+            'blocked_by_type': dict(self.blocked_by_type),
+            'top_blocked_hosts': dict(self.blocked_by_host.most_common(10))
+        }
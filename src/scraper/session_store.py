@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config.config import (
+    SESSION_STATE_FILE,
+    SESSION_MAX_AGE
+)
+
+logger = logging.getLogger(__name__)
+
+# Cookie che TikTok imposta solo per le sessioni autenticate
+SESSION_COOKIE_NAMES = ('sessionid', 'sessionid_ss')
+
+def has_valid_session_cookie(cookies: List[Dict], now: Optional[float] = None) -> bool:
+    """Verifica la presenza di un cookie di sessione non scaduto"""
+    now = now or time.time()
+    for cookie in cookies:
+        if cookie.get('name') not in SESSION_COOKIE_NAMES or not cookie.get('value'):
+            continue
+        expires = cookie.get('expires', -1)
+        # expires = -1 indica un cookie di sessione senza scadenza esplicita
+        if expires == -1 or expires > now:
+            return True
+    return False
+
+class SessionStore:
+    """Salva e ricarica lo storage state (cookie e localStorage) di una sessione autenticata"""
+
+    def __init__(self, path: str = SESSION_STATE_FILE, max_age: int = SESSION_MAX_AGE):
+        self.path = Path(path)
+        self.max_age = max_age
+
+    def load(self) -> Optional[Dict]:
+        """Restituisce lo storage state salvato se ancora valido, altrimenti None"""
+        try:
+            if not self.path.exists():
+                return None
+            if time.time() - self.path.stat().st_mtime > self.max_age:
+                logger.info("Saved session is older than SESSION_MAX_AGE, ignoring it")
+                return None
+
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+
+            if not has_valid_session_cookie(state.get('cookies', [])):
+                logger.info("Saved session has no valid session cookie, ignoring it")
+                return None
+            return state
+
+        except Exception as e:
+            logger.error(f"Error loading saved session: {str(e)}")
+            return None
+
+    def save(self, state: Dict):
+        """Salva lo storage state in modo atomico e leggibile solo dal proprietario"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f'.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+            logger.info(f"Session saved to {self.path}")
+        except Exception as e:
+            logger.error(f"Error saving session: {str(e)}")
+
+    def invalidate(self):
+        """Elimina la sessione salvata, forzando un nuovo login"""
+        try:
+            self.path.unlink(missing_ok=True)
+        except Exception as e:
+            logger.error(f"Error invalidating saved session: {str(e)}")
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+from playwright.async_api import Page
+
+from config.config import (
+    OUTPUT_DIR,
+    POST_INTERACTION_WORKERS,
+    STREAM_MAX_POSTS,
+    STREAM_MAX_COMMENTS,
+    STREAM_TIME_BUDGET,
+    STREAM_SCROLL_PAUSE,
+    STREAM_MAX_IDLE_SCROLLS
+)
+
+logger = logging.getLogger(__name__)
+
+# Estrae solo gli elementi caricati dopo l'indice già letto, per non rileggere l'intera lista a ogni scroll
+POST_TILES_JS = '''(start) => {
+    const tiles = Array.from(document.querySelectorAll('div[data-e2e="user-post-item"]')).slice(start);
+    return tiles.map(video => ({
+        url: video.querySelector('a')?.href || '',
+        thumbnail: video.querySelector('img')?.src || '',
+        description: video.querySelector('div[data-e2e="user-post-item-desc"]')?.innerText || '',
+        likes: video.querySelector('strong[data-e2e="like-count"]')?.innerText || '0',
+        comments: video.querySelector('strong[data-e2e="comment-count"]')?.innerText || '0',
+        shares: video.querySelector('strong[data-e2e="share-count"]')?.innerText || '0',
+        date: video.querySelector('time')?.dateTime || ''
+    }));
+}'''
+
+COMMENT_ITEMS_JS = '''(start) => {
+    const items = Array.from(document.querySelectorAll('div[data-e2e="comment-item"]')).slice(start);
+    return items.map(comment => ({
+        username: comment.querySelector('.user-username')?.innerText || '',
+        text: comment.querySelector('.comment-text')?.innerText || '',
+        likes: comment.querySelector('.comment-like-count')?.innerText || '0',
+        date: comment.querySelector('time')?.dateTime || ''
+    }));
+}'''
+
+SCROLL_POSTS_JS = '() => window.scrollTo(0, document.body.scrollHeight)'
+
+SCROLL_COMMENTS_JS = '''() => {
+    const items = document.querySelectorAll('div[data-e2e="comment-item"]');
+    if (items.length) {
+        items[items.length - 1].scrollIntoView();
+    } else {
+        window.scrollTo(0, document.body.scrollHeight);
+    }
+}'''
+
+def _is_older_than(item: Dict, since: Optional[datetime]) -> bool:
+    """Verifica se un post o commento è precedente alla data limite"""
+    if since is None or not item.get('date'):
+        return False
+    try:
+        item_date = datetime.fromisoformat(item['date'].replace('Z', '+00:00'))
+    except ValueError:
+        return False
+    # Le date senza fuso (es. quelle dei payload JSON e spesso --since) sono ora locale: si confrontano in UTC
+    return item_date.astimezone(timezone.utc) < since.astimezone(timezone.utc)
+
+class StreamHarvester:
+    """Scorre e pagina post e commenti di un profilo restituendoli man mano che vengono caricati"""
+
+    def __init__(self, scraper, output_dir: str = OUTPUT_DIR):
+        self.scraper = scraper
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    async def _iter_scrolled(self, page: Page, extract_js: str, scroll_js: str, max_items: int,
+                             since: Optional[datetime], deadline: float) -> AsyncIterator[Dict]:
+        """Estrae gli elementi nuovi dopo ogni scroll finché non si raggiunge una condizione di stop"""
+        loop = asyncio.get_running_loop()
+        offset = 0
+        yielded = 0
+        idle_scrolls = 0
+
+        while True:
+            items = await self.scraper.evaluate(page, extract_js, offset)
+            offset += len(items)
+            idle_scrolls = idle_scrolls + 1 if not items else 0
+
+            # Gli elementi sono ordinati dal più recente: un blocco interamente più vecchio chiude lo stream
+            if items and all(_is_older_than(item, since) for item in items):
+                return
+
+            for item in items:
+                if _is_older_than(item, since):
+                    continue
+                yield item
+                yielded += 1
+                if yielded >= max_items:
+                    return
+
+            if idle_scrolls >= STREAM_MAX_IDLE_SCROLLS:
+                return
+            if loop.time() >= deadline:
+                logger.info("Stream time budget exhausted")
+                return
+
+            await page.evaluate(scroll_js)
+            await page.wait_for_timeout(STREAM_SCROLL_PAUSE * 1000)
+
+    async def iter_posts(self, username: str, max_posts: int = STREAM_MAX_POSTS, since: Optional[datetime] = None,
+                         time_budget: float = STREAM_TIME_BUDGET, page: Optional[Page] = None) -> AsyncIterator[Dict]:
+        """Restituisce i post di un profilo scorrendo la griglia fino alle condizioni di stop"""
+        deadline = asyncio.get_running_loop().time() + time_budget
+        async with self.scraper.page_scope(page) as page:
+            await self.scraper.navigate(page, f'https://www.tiktok.com/@{username}', wait_until='domcontentloaded')
+            async for post in self._iter_scrolled(page, POST_TILES_JS, SCROLL_POSTS_JS, max_posts, since, deadline):
+                if post['url']:
+                    yield post
+
+    async def iter_post_comments(self, post_url: str, max_comments: int = STREAM_MAX_COMMENTS,
+                                 since: Optional[datetime] = None, time_budget: float = STREAM_TIME_BUDGET,
+                                 page: Optional[Page] = None) -> AsyncIterator[Dict]:
+        """Restituisce i commenti di un post scorrendo la lista fino alle condizioni di stop"""
+        deadline = asyncio.get_running_loop().time() + time_budget
+        async with self.scraper.page_scope(page) as page:
+            await self.scraper.navigate(page, post_url, wait_until='domcontentloaded')
+            async for comment in self._iter_scrolled(page, COMMENT_ITEMS_JS, SCROLL_COMMENTS_JS,
+                                                     max_comments, since, deadline):
+                yield comment
+
+    async def harvest_profile(self, username: str, max_posts: int = STREAM_MAX_POSTS,
+                              max_comments_per_post: int = STREAM_MAX_COMMENTS, since: Optional[datetime] = None,
+                              time_budget: float = STREAM_TIME_BUDGET,
+                              workers: int = POST_INTERACTION_WORKERS) -> Dict:
+        """Scrive post e commenti di un profilo in file JSONL man mano che vengono caricati"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + time_budget
+        date_suffix = datetime.now().strftime('%Y%m%d')
+        posts_file = self.output_dir / f"{username}_{date_suffix}_posts.jsonl"
+        comments_file = self.output_dir / f"{username}_{date_suffix}_comments.jsonl"
+        summary = {
+            'username': username,
+            'posts_file': str(posts_file),
+            'comments_file': str(comments_file),
+            'posts': 0,
+            'comments': 0
+        }
+
+        try:
+            with open(posts_file, 'w', encoding='utf-8') as f:
+                async for post in self.iter_posts(username, max_posts, since, time_budget):
+                    f.write(json.dumps(post, ensure_ascii=False) + '\n')
+                    summary['posts'] += 1
+
+            semaphore = asyncio.Semaphore(max(1, workers))
+            with open(comments_file, 'w', encoding='utf-8') as comments_out:
+
+                async def harvest_comments(post_url: str):
+                    async with semaphore:
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            return
+                        try:
+                            async for comment in self.iter_post_comments(post_url, max_comments_per_post,
+                                                                         since, remaining):
+                                comment['post_url'] = post_url
+                                comments_out.write(json.dumps(comment, ensure_ascii=False) + '\n')
+                                summary['comments'] += 1
+                        except Exception as e:
+                            logger.error(f"Error streaming comments for post {post_url}: {str(e)}")
+
+                # Rilegge gli URL dal file JSONL invece di tenere in memoria i post
+                with open(posts_file, 'r', encoding='utf-8') as posts_in:
+                    post_urls = [json.loads(line)['url'] for line in posts_in]
+                await asyncio.gather(*(harvest_comments(post_url) for post_url in post_urls))
+
+            logger.info(f"Streamed {summary['posts']} posts and {summary['comments']} comments for {username}")
+
+        except Exception as e:
+            logger.error(f"Error streaming profile {username}: {str(e)}")
+            summary['error'] = str(e)
+
+        return summary
@@ -1,28 +1,108 @@
 import asyncio
 import logging
+import time
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from playwright.async_api import async_playwright, Browser, Page
-import json
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Dict, Optional
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright, Response
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 import os
 from pathlib import Path
 
 from config.config import (
     TIKTOK_USERNAME,
     TIKTOK_PASSWORD,
+    TIKTOK_BASE_URL,
     BROWSER_HEADLESS,
+    SCRAPER_CONCURRENCY,
+    POST_INTERACTION_WORKERS,
+    SCRAPER_EXTRACTION_MODE,
+    INCREMENTAL_SCRAPING,
+    INCREMENTAL_REFRESH_MAX_AGE,
+    PARQUET_EXPORT,
+    TRENDING_ENABLED,
+    INTERACTION_GRAPH_ENABLED,
     MAX_POSTS_PER_PROFILE,
+    RATE_LIMIT_MAX_RETRIES,
+    RATE_LIMIT_SLOW_RESPONSE,
     OUTPUT_DIR,
-    CACHE_DIR
+    CACHE_DIR,
+    CACHE_TYPE
 )
+from src.scraper.network_capture import (
+    USER_DETAIL_API,
+    POST_LIST_API,
+    COMMENT_LIST_API,
+    capture_json,
+    json_listener,
+    wait_json,
+    read_rehydration_data,
+    parse_user_detail,
+    parse_post_list,
+    parse_comment_list
+)
+from src.scraper.stream_harvester import SCROLL_POSTS_JS
+from src.scraper.request_filter import RequestFilter
+from src.scraper.rate_limiter import AdaptiveRateLimiter, ThrottledError, get_rate_limiter
+from src.scraper.session_store import SessionStore, has_valid_session_cookie
+from src.database.storage import get_storage
+from src.database.parquet_store import ParquetStore
+from src.analyzer.trending import get_trending_engine
+from src.analyzer.interaction_graph import get_interaction_graph
+from src.utils.disk_cache import DiskCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+VIEWPORT = {"width": 1920, "height": 1080}
+CANONICAL_BASE_URL = 'https://www.tiktok.com'
+CAPTCHA_SELECTOR = '#captcha-verify-image, .captcha_verify_container, #captcha_container'
+# Elementi dell'header presenti solo per gli utenti autenticati, o solo per quelli anonimi
+LOGGED_IN_SELECTOR = '[data-e2e="profile-icon"]'
+LOGGED_OUT_SELECTOR = '[data-e2e="top-login-button"]'
+SESSION_CHECK_TIMEOUT = 15000  # in millisecondi
+
+_scrape_cache: Optional[DiskCache] = None
+
+def get_scrape_cache() -> Optional[DiskCache]:
+    """Restituisce la cache dei risultati di scraping condivisa dal processo (None con CACHE_TYPE='none')"""
+    global _scrape_cache
+    if CACHE_TYPE == 'none':
+        return None
+    if _scrape_cache is None:
+        _scrape_cache = DiskCache(os.path.join(CACHE_DIR, 'scrape'))
+    return _scrape_cache
+
 class TikTokScraper:
-    def __init__(self):
+    def __init__(self, pool_size: int = SCRAPER_CONCURRENCY, extraction_mode: str = SCRAPER_EXTRACTION_MODE,
+                 base_url: str = TIKTOK_BASE_URL, rate_limiter: Optional[AdaptiveRateLimiter] = None):
+        self.playwright: Optional[Playwright] = None
         self.browser: Optional[Browser] = None
+        self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
+        self.pool_size = max(1, pool_size)
+        self.extraction_mode = extraction_mode
+        self.base_url = base_url.rstrip('/')
+        self.stage_timings: Dict[str, List[float]] = defaultdict(list)
+        # Payload JSON catturati e ripieghi sul DOM in modalità network, per tipo di dato
+        self.capture_stats: Counter = Counter()
+        # Configurazioni aggiuntive di ogni nuovo contesto (es. il replay dei file HAR), installate prima del filtro
+        self.context_setup: List[Callable[[BrowserContext], Awaitable[None]]] = []
+        self.request_filter = RequestFilter()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.session_store = SessionStore()
+        self.storage = get_storage()
+        self.parquet_store = ParquetStore() if PARQUET_EXPORT else None
+        self.trending = get_trending_engine() if TRENDING_ENABLED else None
+        self.interaction_graph = get_interaction_graph() if INTERACTION_GRAPH_ENABLED else None
+        self.scrape_cache = get_scrape_cache()
+        self.session_restored = False
+        # Sessione già verificata sul server (o appena ottenuta con il login) in questo processo
+        self.session_verified = False
+        self._pool_contexts: List[BrowserContext] = []
+        self._page_pool: Optional[asyncio.Queue] = None
+        self._pool_lock = asyncio.Lock()
         self.cache_dir = Path(CACHE_DIR)
         self.output_dir = Path(OUTPUT_DIR)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
@@ -30,47 +110,344 @@ class TikTokScraper:
 
     async def init_browser(self):
         """Inizializza il browser Playwright"""
-        playwright = await async_playwright().start()
-        self.browser = await playwright.chromium.launch(headless=BROWSER_HEADLESS)
-        self.page = await self.browser.new_page()
-        await self.page.set_viewport_size({"width": 1920, "height": 1080})
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(headless=BROWSER_HEADLESS)
+        self.request_filter.reset_stats()
+
+        # Riusa la sessione autenticata salvata, se ancora valida
+        storage_state = self.session_store.load()
+        self.session_restored = storage_state is not None
+        self.session_verified = False
+        if self.session_restored:
+            self.context = await self._new_context(storage_state=storage_state)
+            logger.info("Restored saved TikTok session")
+        else:
+            self.context = await self._new_context()
+        self.page = await self.context.new_page()
+
+    async def _new_context(self, **kwargs) -> BrowserContext:
+        """Crea un contesto del browser con il filtro delle richieste installato"""
+        context = await self.browser.new_context(viewport=VIEWPORT, **kwargs)
+        for setup in self.context_setup:
+            await setup(context)
+        await self.request_filter.install(context)
+        return context
+
+    async def init_context_pool(self):
+        """Crea il pool di contesti condividendo lo stato di login del contesto principale"""
+        async with self._pool_lock:
+            if self._page_pool is not None:
+                return
+            if self.browser is None:
+                # Avvio pigro: con la cache calda il browser non serve affatto
+                await self.init_browser()
+                await self.ensure_logged_in()
+
+            storage_state = await self.context.storage_state()
+            page_pool = asyncio.Queue()
+            for _ in range(self.pool_size):
+                context = await self._new_context(storage_state=storage_state)
+                self._pool_contexts.append(context)
+                page_pool.put_nowait(await context.new_page())
+
+            self._page_pool = page_pool
+            logger.info(f"Context pool ready with {self.pool_size} pages")
+
+    @asynccontextmanager
+    async def checkout_page(self) -> AsyncIterator[Page]:
+        """Preleva una pagina dal pool e la restituisce al termine dell'uso"""
+        if self._page_pool is None:
+            await self.init_context_pool()
+
+        page = await self._page_pool.get()
+        try:
+            yield page
+        finally:
+            try:
+                page = await self._recycle_page(page)
+            finally:
+                # Lo slot torna sempre nel pool, anche se il ripristino fallisce o viene annullato
+                self._page_pool.put_nowait(page)
+
+    async def _recycle_page(self, page: Page) -> Page:
+        """
+        Riporta una pagina in uno stato pulito, sostituendola se non è più utilizzabile. Non solleva eccezioni:
+        se nemmeno un nuovo contesto è disponibile restituisce la pagina originale, ritentata al prossimo uso.
+        """
+        try:
+            await page.goto('about:blank')
+            return page
+        except Exception as e:
+            logger.warning(f"Replacing broken pooled page: {str(e)}")
+
+        context = page.context
+        try:
+            await page.close()
+        except Exception:
+            pass
+        try:
+            return await context.new_page()
+        except Exception as e:
+            logger.warning(f"Replacing broken pooled context: {str(e)}")
+
+        # Il contesto guasto viene chiuso e sostituito nella stessa posizione, così il pool non cresce
+        try:
+            await context.close()
+        except Exception:
+            pass
+        try:
+            storage_state = await self.context.storage_state()
+            replacement = await self._new_context(storage_state=storage_state)
+        except Exception as e:
+            logger.error(f"Could not replace pooled context: {str(e)}")
+            return page
+        if context in self._pool_contexts:
+            self._pool_contexts[self._pool_contexts.index(context)] = replacement
+        else:
+            self._pool_contexts.append(replacement)
+        try:
+            return await replacement.new_page()
+        except Exception as e:
+            logger.error(f"Could not open a page in the replacement context: {str(e)}")
+            return page
+
+    @asynccontextmanager
+    async def page_scope(self, page: Optional[Page]) -> AsyncIterator[Page]:
+        """Usa la pagina indicata oppure ne preleva una dal pool"""
+        if page is not None:
+            yield page
+        else:
+            async with self.checkout_page() as pooled_page:
+                yield pooled_page
+
+    @contextmanager
+    def _timed(self, stage: str) -> Iterator[None]:
+        """Registra la durata di una fase (goto, networkidle, evaluate) per il benchmark"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_timings[stage].append(time.perf_counter() - start)
+
+    def site_url(self, url: str) -> str:
+        """Riscrive un URL di TikTok verso il sito configurato (es. un mirror di test)"""
+        if self.base_url != CANONICAL_BASE_URL and url.startswith(CANONICAL_BASE_URL):
+            return self.base_url + url[len(CANONICAL_BASE_URL):]
+        return url
+
+    async def _throttle_reason(self, page: Page, response: Optional[Response]) -> Optional[str]:
+        """Riconosce throttling, captcha e pagine di errore dopo una navigazione"""
+        if response is not None:
+            if response.status == 429:
+                return 'http_429'
+            if response.status == 403:
+                return 'http_403'
+            if response.status >= 500:
+                return 'http_5xx'
+        if await page.query_selector(CAPTCHA_SELECTOR):
+            return 'captcha'
+        return None
+
+    async def navigate(self, page: Page, url: str, **kwargs) -> Optional[Response]:
+        """
+        Naviga verso un URL di TikTok: punto unico per tutte le navigazioni dello scraper.
+        Solleva ThrottledError se la navigazione è ancora rifiutata dopo RATE_LIMIT_MAX_RETRIES tentativi.
+        """
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            await self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                with self._timed('goto'):
+                    response = await page.goto(self.site_url(url), **kwargs)
+                reason = await self._throttle_reason(page, response)
+            except PlaywrightTimeoutError:
+                if attempt == RATE_LIMIT_MAX_RETRIES:
+                    raise
+                response, reason = None, 'timeout'
+
+            if reason is None:
+                if time.perf_counter() - start > RATE_LIMIT_SLOW_RESPONSE:
+                    self.rate_limiter.report_slowdown()
+                else:
+                    self.rate_limiter.report_success()
+                return response
+
+            self.rate_limiter.report_throttle(reason)
+            logger.warning(f"Navigation to {url} throttled ({reason}), attempt {attempt + 1}")
+
+        # La pagina rimasta è un captcha o una pagina di errore: estrarne dati darebbe risultati vuoti o sbagliati
+        raise ThrottledError(url, reason)
+
+    async def wait_for_idle(self, page: Page):
+        """Attende che la rete della pagina sia inattiva"""
+        with self._timed('networkidle'):
+            await page.wait_for_load_state('networkidle')
+
+    async def evaluate(self, page: Page, script: str, arg=None):
+        """Esegue uno script di estrazione nella pagina"""
+        with self._timed('evaluate'):
+            return await page.evaluate(script, arg)
 
     async def login(self):
         """Effettua il login su TikTok"""
         try:
-            await self.page.goto('https://www.tiktok.com/login')
+            await self.navigate(self.page, f'{CANONICAL_BASE_URL}/login')
             # Implementa qui la logica di login
             # Nota: TikTok potrebbe richiedere verifiche aggiuntive
             await self.page.fill('input[name="username"]', TIKTOK_USERNAME)
             await self.page.fill('input[name="password"]', TIKTOK_PASSWORD)
             await self.page.click('button[type="submit"]')
-            await self.page.wait_for_load_state('networkidle')
+            await self.wait_for_idle(self.page)
             
             # Verifica se il login è avvenuto con successo
             if await self.page.query_selector('.login-error'):
                 raise Exception("Login failed")
             
             logger.info("Login successful")
+            self.session_store.save(await self.context.storage_state())
             
         except Exception as e:
             logger.error(f"Login failed: {str(e)}")
             raise
 
-    async def get_profile_info(self, username: str) -> Dict:
+    async def is_logged_in(self) -> bool:
+        """Verifica che il contesto principale abbia una sessione non scaduta"""
+        return has_valid_session_cookie(await self.context.cookies())
+
+    async def session_accepted(self) -> bool:
+        """
+        Verifica sul server che la sessione ripristinata sia ancora autenticata: i cookie possono essere
+        validi localmente anche dopo che TikTok ha revocato o fatto scadere la sessione.
+        """
+        await self.navigate(self.page, CANONICAL_BASE_URL)
+        try:
+            marker = await self.page.wait_for_selector(f'{LOGGED_IN_SELECTOR}, {LOGGED_OUT_SELECTOR}',
+                                                       timeout=SESSION_CHECK_TIMEOUT)
+        except PlaywrightTimeoutError:
+            return False
+        return await marker.evaluate('(element, selector) => element.matches(selector)', LOGGED_IN_SELECTOR)
+
+    async def ensure_logged_in(self):
+        """Effettua il login solo se la sessione salvata manca, è scaduta o non è più accettata dal server"""
+        if self.browser is None:
+            await self.init_browser()
+
+        if self.session_verified and await self.is_logged_in():
+            return
+
+        if self.session_restored:
+            if await self.is_logged_in() and await self.session_accepted():
+                logger.info("Skipping login, saved session is still valid")
+                self.session_verified = True
+                return
+            logger.info("Saved session expired or revoked, logging in again")
+            self.session_store.invalidate()
+            await self.context.clear_cookies()
+        await self.login()
+        self.session_verified = True
+
+    async def _capture_profile_info(self, page: Page, profile_url: str) -> Optional[Dict]:
+        """Ricava le informazioni del profilo dai payload JSON invece che dal DOM"""
+        with json_listener(page, USER_DETAIL_API) as payloads:
+            await self.navigate(page, profile_url, wait_until='domcontentloaded')
+            # Il dettaglio utente è di solito già incorporato nella pagina renderizzata dal server, e in quel caso
+            # l'XHR spesso non parte: lo si attende solo se i dati di idratazione mancano
+            rehydration_data = await read_rehydration_data(page)
+            profile_info = parse_user_detail(rehydration_data) if rehydration_data else None
+            if profile_info is None:
+                payload = await wait_json(payloads, profile_url, USER_DETAIL_API)
+                profile_info = parse_user_detail(payload) if payload else None
+        return profile_info
+
+    async def _capture_posts(self, page: Page, profile_url: str, max_posts: int) -> Optional[List[Dict]]:
+        """
+        Ricava i post dalle risposte di /api/post/item_list: ogni risposta ne contiene circa 30, quindi la griglia
+        viene scorsa per far richiedere alla pagina le successive (cursor) finché hasMore lo consente o si
+        raggiungono max_posts. None se non arriva nessuna risposta.
+        """
+        posts: List[Dict] = []
+        urls = set()
+        cursors = set()
+        received = False
+        with json_listener(page, POST_LIST_API) as payloads:
+            await self.navigate(page, profile_url, wait_until='domcontentloaded')
+            while len(posts) < max_posts:
+                payload = await wait_json(payloads, profile_url, POST_LIST_API)
+                if payload is None:
+                    break
+                received = True
+                for post in parse_post_list(payload, max_posts):
+                    if post['url'] not in urls and len(posts) < max_posts:
+                        urls.add(post['url'])
+                        posts.append(post)
+                cursor = payload.get('cursor')
+                # Un cursor già visto è una risposta ripetuta: la pagina non ne richiederà altre
+                if not payload.get('hasMore') or cursor in cursors:
+                    break
+                cursors.add(cursor)
+                await self.evaluate(page, SCROLL_POSTS_JS)
+        return posts if received else None
+
+    def _cache_key(self, kind: str, url: str, *extra) -> str:
+        return ':'.join([self.extraction_mode, kind, self.site_url(url), *map(str, extra)])
+
+    async def _cached(self, key: str, fetch: Callable[[], Awaitable]):
+        """Restituisce il risultato in cache, altrimenti lo scarica e lo salva se non vuoto"""
+        if self.scrape_cache is None:
+            return await fetch()
+        cached = self.scrape_cache.get(key)
+        if cached is not None:
+            return cached
+
+        result = await fetch()
+        # I risultati vuoti sono quasi sempre errori di estrazione: non vanno riproposti per tutto il TTL
+        if result:
+            self.scrape_cache.set(key, result)
+        return result
+
+    async def get_profile_info(self, username: str, page: Optional[Page] = None) -> Dict:
+        """Ottiene le informazioni del profilo, dalla cache se ancora valide"""
+        profile_url = f'{CANONICAL_BASE_URL}/@{username}'
+        return await self._cached(self._cache_key('profile_info', profile_url),
+                                  lambda: self._fetch_profile_info(username, page))
+
+    async def get_recent_posts(self, username: str, max_posts: int = MAX_POSTS_PER_PROFILE,
+                               page: Optional[Page] = None) -> List[Dict]:
+        """Ottiene i post recenti di un profilo, dalla cache se ancora validi"""
+        profile_url = f'{CANONICAL_BASE_URL}/@{username}'
+        return await self._cached(self._cache_key('posts', profile_url, max_posts),
+                                  lambda: self._fetch_recent_posts(username, max_posts, page))
+
+    async def get_post_interactions(self, post_url: str, page: Optional[Page] = None) -> Dict:
+        """Analizza le interazioni di un singolo post, dalla cache se ancora valide"""
+        return await self._cached(self._cache_key('interactions', post_url),
+                                  lambda: self._fetch_post_interactions(post_url, page))
+
+    async def _fetch_profile_info(self, username: str, page: Optional[Page] = None) -> Dict:
         """Ottiene le informazioni del profilo"""
         try:
-            await self.page.goto(f'https://www.tiktok.com/@{username}')
-            await self.page.wait_for_load_state('networkidle')
+            async with self.page_scope(page) as page:
+                profile_url = f'{CANONICAL_BASE_URL}/@{username}'
+                if self.extraction_mode == 'network':
+                    profile_info = await self._capture_profile_info(page, profile_url)
+                    if profile_info is not None:
+                        self.capture_stats['profile_info'] += 1
+                        return profile_info
+                    self.capture_stats['profile_info_fallback'] += 1
+                    logger.warning(f"Falling back to DOM extraction for profile info of {username}")
+                else:
+                    await self.navigate(page, profile_url)
+                await self.wait_for_idle(page)
 
-            profile_info = await self.page.evaluate('''() => {
-                const info = {};
-                info.username = document.querySelector('h1.tiktok-1d3qdok').innerText;
-                info.bio = document.querySelector('h2.tiktok-1d3qdok')?.innerText || '';
-                info.followers = document.querySelector('strong[title="Followers"]').innerText;
-                info.following = document.querySelector('strong[title="Following"]').innerText;
-                info.likes = document.querySelector('strong[title="Likes"]').innerText;
-                return info;
-            }''')
+                profile_info = await self.evaluate(page, '''() => {
+                    const info = {};
+                    info.username = document.querySelector('h1.tiktok-1d3qdok').innerText;
+                    info.bio = document.querySelector('h2.tiktok-1d3qdok')?.innerText || '';
+                    info.followers = document.querySelector('strong[title="Followers"]').innerText;
+                    info.following = document.querySelector('strong[title="Following"]').innerText;
+                    info.likes = document.querySelector('strong[title="Likes"]').innerText;
+                    return info;
+                }''')
 
             return profile_info
 
@@ -78,30 +455,41 @@ class TikTokScraper:
             logger.error(f"Error getting profile info for {username}: {str(e)}")
             return {}
 
-    async def get_recent_posts(self, username: str, max_posts: int = MAX_POSTS_PER_PROFILE) -> List[Dict]:
+    async def _fetch_recent_posts(self, username: str, max_posts: int = MAX_POSTS_PER_PROFILE,
+                                  page: Optional[Page] = None) -> List[Dict]:
         """Ottiene i post recenti di un profilo"""
         try:
-            await self.page.goto(f'https://www.tiktok.com/@{username}')
-            await self.page.wait_for_load_state('networkidle')
-
-            posts = await self.page.evaluate(f'''() => {{
-                const posts = [];
-                const videoElements = document.querySelectorAll('div[data-e2e="user-post-item"]');
-                
-                for (let i = 0; i < Math.min(videoElements.length, {max_posts}); i++) {{
-                    const video = videoElements[i];
-                    posts.push({{
-                        url: video.querySelector('a').href,
-                        thumbnail: video.querySelector('img')?.src || '',
-                        description: video.querySelector('div[data-e2e="user-post-item-desc"]')?.innerText || '',
-                        likes: video.querySelector('strong[data-e2e="like-count"]')?.innerText || '0',
-                        comments: video.querySelector('strong[data-e2e="comment-count"]')?.innerText || '0',
-                        shares: video.querySelector('strong[data-e2e="share-count"]')?.innerText || '0',
-                        date: video.querySelector('time')?.dateTime || ''
-                    }});
-                }}
-                return posts;
-            }}''')
+            async with self.page_scope(page) as page:
+                profile_url = f'{CANONICAL_BASE_URL}/@{username}'
+                if self.extraction_mode == 'network':
+                    posts = await self._capture_posts(page, profile_url, max_posts)
+                    if posts is not None:
+                        self.capture_stats['post_list'] += 1
+                        return posts
+                    self.capture_stats['post_list_fallback'] += 1
+                    logger.warning(f"Falling back to DOM extraction for posts of {username}")
+                else:
+                    await self.navigate(page, profile_url)
+                await self.wait_for_idle(page)
+
+                posts = await self.evaluate(page, f'''() => {{
+                    const posts = [];
+                    const videoElements = document.querySelectorAll('div[data-e2e="user-post-item"]');
+
+                    for (let i = 0; i < Math.min(videoElements.length, {max_posts}); i++) {{
+                        const video = videoElements[i];
+                        posts.push({{
+                            url: video.querySelector('a').href,
+                            thumbnail: video.querySelector('img')?.src || '',
+                            description: video.querySelector('div[data-e2e="user-post-item-desc"]')?.innerText || '',
+                            likes: video.querySelector('strong[data-e2e="like-count"]')?.innerText || '0',
+                            comments: video.querySelector('strong[data-e2e="comment-count"]')?.innerText || '0',
+                            shares: video.querySelector('strong[data-e2e="share-count"]')?.innerText || '0',
+                            date: video.querySelector('time')?.dateTime || ''
+                        }});
+                    }}
+                    return posts;
+                }}''')
 
             return posts
 
@@ -109,29 +497,38 @@ class TikTokScraper:
             logger.error(f"Error getting posts for {username}: {str(e)}")
             return []
 
-    async def get_post_interactions(self, post_url: str) -> Dict:
+    async def _fetch_post_interactions(self, post_url: str, page: Optional[Page] = None) -> Dict:
         """Analizza le interazioni di un singolo post"""
         try:
-            await self.page.goto(post_url)
-            await self.page.wait_for_load_state('networkidle')
-
-            interactions = await self.page.evaluate('''() => {
-                const interactions = {};
-                interactions.comments = [];
-                
-                // Raccoglie i commenti
-                const commentElements = document.querySelectorAll('div[data-e2e="comment-item"]');
-                for (const comment of commentElements) {
-                    interactions.comments.push({
-                        username: comment.querySelector('.user-username')?.innerText || '',
-                        text: comment.querySelector('.comment-text')?.innerText || '',
-                        likes: comment.querySelector('.comment-like-count')?.innerText || '0',
-                        date: comment.querySelector('time')?.dateTime || ''
-                    });
-                }
-                
-                return interactions;
-            }''')
+            async with self.page_scope(page) as page:
+                if self.extraction_mode == 'network':
+                    payload = await capture_json(page, post_url, COMMENT_LIST_API, self.navigate)
+                    if payload is not None:
+                        self.capture_stats['comment_list'] += 1
+                        return parse_comment_list(payload)
+                    self.capture_stats['comment_list_fallback'] += 1
+                    logger.warning(f"Falling back to DOM extraction for interactions of {post_url}")
+                else:
+                    await self.navigate(page, post_url)
+                await self.wait_for_idle(page)
+
+                interactions = await self.evaluate(page, '''() => {
+                    const interactions = {};
+                    interactions.comments = [];
+
+                    // Raccoglie i commenti
+                    const commentElements = document.querySelectorAll('div[data-e2e="comment-item"]');
+                    for (const comment of commentElements) {
+                        interactions.comments.push({
+                            username: comment.querySelector('.user-username')?.innerText || '',
+                            text: comment.querySelector('.comment-text')?.innerText || '',
+                            likes: comment.querySelector('.comment-like-count')?.innerText || '0',
+                            date: comment.querySelector('time')?.dateTime || ''
+                        });
+                    }
+
+                    return interactions;
+                }''')
 
             return interactions
 
@@ -139,28 +536,47 @@ class TikTokScraper:
             logger.error(f"Error getting interactions for post {post_url}: {str(e)}")
             return {}
 
-    def save_to_cache(self, data: Dict, filename: str):
-        """Salva i dati nella cache"""
+    async def get_posts_interactions(self, post_urls: List[str],
+                                     workers: int = POST_INTERACTION_WORKERS) -> List[Dict]:
+        """Raccoglie le interazioni di più post su un numero limitato di pagine del pool"""
+        semaphore = asyncio.Semaphore(max(1, workers))
+
+        async def fetch(post_url: str) -> Dict:
+            async with semaphore:
+                return await self.get_post_interactions(post_url)
+
+        return await asyncio.gather(*(fetch(post_url) for post_url in post_urls))
+
+    def load_previous_snapshot(self, username: str) -> Optional[Dict]:
+        """Carica lo snapshot giornaliero più recente di un profilo"""
         try:
-            cache_file = self.cache_dir / filename
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            return self.storage.load_latest_snapshot(username)
+
         except Exception as e:
-            logger.error(f"Error saving to cache: {str(e)}")
+            logger.error(f"Error loading previous snapshot for {username}: {str(e)}")
+            return None
+
+    def _refresh_reason(self, post: Dict, previous_post: Optional[Dict], previous_interactions: Optional[Dict],
+                        max_age: timedelta) -> Optional[str]:
+        """Decide se il thread dei commenti di un post va riscaricato e perché"""
+        if previous_post is None:
+            return 'new'
+        if not previous_interactions:
+            return 'missing'
+        if str(post.get('comments')) != str(previous_post.get('comments')):
+            return 'comments_changed'
 
-    def load_from_cache(self, filename: str) -> Optional[Dict]:
-        """Carica i dati dalla cache"""
         try:
-            cache_file = self.cache_dir / filename
-            if cache_file.exists():
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading from cache: {str(e)}")
+            post_date = datetime.fromisoformat(post.get('date', '').replace('Z', '+00:00'))
+            now = datetime.now(post_date.tzinfo)
+            if now - post_date < max_age:
+                return 'recent'
+        except ValueError:
+            pass
         return None
 
-    async def analyze_profile(self, username: str) -> Dict:
-        """Analizza un profilo completo"""
+    async def analyze_profile(self, username: str, incremental: bool = INCREMENTAL_SCRAPING) -> Dict:
+        """Analizza un profilo completo usando le pagine del pool"""
         profile_data = {
             'username': username,
             'timestamp': datetime.now().isoformat(),
@@ -170,27 +586,68 @@ class TikTokScraper:
         }
 
         try:
-            # Ottiene le informazioni del profilo
+            # Ottiene le informazioni del profilo; una pagina del pool viene presa solo se manca in cache
             profile_data['profile_info'] = await self.get_profile_info(username)
-            
+
             # Ottiene i post recenti
             posts = await self.get_recent_posts(username)
             profile_data['posts'] = posts
 
-            # Analizza le interazioni per ogni post
-            for post in posts:
-                post_url = post['url']
-                interactions = await self.get_post_interactions(post_url)
-                profile_data['interactions'][post_url] = interactions
+            post_urls = [post['url'] for post in posts]
+            previous = self.load_previous_snapshot(username) if incremental else None
 
-            # Salva i dati nella cache
-            cache_filename = f"{username}_{datetime.now().strftime('%Y%m%d')}.json"
-            self.save_to_cache(profile_data, cache_filename)
+            if previous is None:
+                urls_to_fetch = post_urls
+            else:
+                # Riscarica solo i commenti dei post nuovi, modificati o ancora recenti
+                previous_posts = {post['url']: post for post in previous.get('posts', [])}
+                previous_interactions = previous.get('interactions', {})
+                max_age = timedelta(seconds=INCREMENTAL_REFRESH_MAX_AGE)
+                refreshed = {}
+                for post in posts:
+                    reason = self._refresh_reason(post, previous_posts.get(post['url']),
+                                                  previous_interactions.get(post['url']), max_age)
+                    if reason:
+                        refreshed[post['url']] = reason
+
+                urls_to_fetch = [url for url in post_urls if url in refreshed]
+                profile_data['refresh'] = {
+                    'mode': 'incremental',
+                    'base_snapshot': previous['_source'],
+                    'refreshed': refreshed,
+                    'carried_forward': [url for url in post_urls if url not in refreshed]
+                }
+                logger.info(f"Incremental scrape of {username}: {len(refreshed)} posts refreshed, "
+                            f"{len(post_urls) - len(refreshed)} carried forward")
 
-            # Salva i dati nella directory di output
-            output_filename = self.output_dir / cache_filename
-            with open(output_filename, 'w', encoding='utf-8') as f:
-                json.dump(profile_data, f, ensure_ascii=False, indent=2)
+            # Analizza le interazioni dei post in parallelo, mantenendo l'ordine dei post
+            fetched = dict(zip(urls_to_fetch, await self.get_posts_interactions(urls_to_fetch)))
+            carried = previous.get('interactions', {}) if previous else {}
+            profile_data['interactions'] = {
+                url: fetched[url] if url in fetched else carried[url]
+                for url in post_urls
+            }
+
+            # Salva lo snapshot una sola volta, nel backend di storage configurato
+            self.storage.save_snapshot(profile_data)
+            if self.parquet_store:
+                try:
+                    self.parquet_store.write_snapshot(profile_data)
+                except Exception as e:
+                    logger.error(f"Error exporting {username} to Parquet: {str(e)}")
+            if self.trending:
+                try:
+                    self.trending.ingest_snapshot(profile_data)
+                    # Lo stato dei trend viene riscritto al più ogni TRENDING_SAVE_INTERVAL, non a ogni profilo
+                    self.trending.save_if_due()
+                except Exception as e:
+                    logger.error(f"Error updating trending topics with {username}: {str(e)}")
+            if self.interaction_graph:
+                try:
+                    self.interaction_graph.ingest_snapshot(profile_data)
+                    self.interaction_graph.save()
+                except Exception as e:
+                    logger.error(f"Error updating interaction graph with {username}: {str(e)}")
 
             return profile_data
 
@@ -198,25 +655,52 @@ class TikTokScraper:
             logger.error(f"Error analyzing profile {username}: {str(e)}")
             return profile_data
 
+    async def analyze_profiles(self, usernames: List[str]) -> List[Dict]:
+        """Analizza più profili in parallelo, limitati dalla dimensione del pool"""
+        return await asyncio.gather(*(self.analyze_profile(username) for username in usernames))
+
     async def close(self):
-        """Chiude il browser"""
+        """Chiude i contesti del pool, il browser e Playwright"""
+        for context in self._pool_contexts:
+            try:
+                await context.close()
+            except Exception as e:
+                logger.warning(f"Error closing browser context: {str(e)}")
+        self._pool_contexts = []
+        self._page_pool = None
+
         if self.browser:
+            logger.info(f"Request filter stats: {self.request_filter.get_stats()}")
+            try:
+                self.request_filter.save_sizes()
+            except Exception as e:
+                logger.warning(f"Error saving observed resource sizes: {str(e)}")
+            logger.info(f"Rate limiter metrics: {self.rate_limiter.metrics()}")
             await self.browser.close()
+        if self.trending:
+            try:
+                self.trending.save_if_due(interval=0)
+            except Exception as e:
+                logger.error(f"Error saving trending topics: {str(e)}")
+        if self.scrape_cache:
+            logger.info(f"Scrape cache stats: {self.scrape_cache.stats()}")
+        if self.playwright:
+            await self.playwright.stop()
 
 async def main():
     scraper = TikTokScraper()
     try:
         await scraper.init_browser()
-        await scraper.login()
-        
+        await scraper.ensure_logged_in()
+        await scraper.init_context_pool()
+
         # Leggi gli username da analizzare dal file
         with open(os.path.join(OUTPUT_DIR, 'profiles.txt'), 'r') as f:
             usernames = [line.strip() for line in f if line.strip()]
 
-        # Analizza ogni profilo
-        for username in usernames:
-            logger.info(f"Analyzing profile: {username}")
-            await scraper.analyze_profile(username)
+        # Analizza i profili in parallelo
+        logger.info(f"Analyzing {len(usernames)} profiles with {scraper.pool_size} concurrent pages")
+        await scraper.analyze_profiles(usernames)
 
     except Exception as e:
         logger.error(f"Error in main execution: {str(e)}")
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config.config import (
+    CACHE_TTL,
+    CACHE_MAX_SIZE_MB
+)
+
+logger = logging.getLogger(__name__)
+
+class DiskCache:
+    """Cache JSON su disco con scadenza (TTL) e rimozione LRU oltre una dimensione massima"""
+
+    def __init__(self, cache_dir: str, ttl: float = CACHE_TTL, max_bytes: int = CACHE_MAX_SIZE_MB * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.writes = 0
+        self.evictions = 0
+        self.size_bytes = sum(path.stat().st_size for path in self._entries())
+
+    def _entries(self):
+        return self.cache_dir.glob('*/*.json')
+
+    def _path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return self.cache_dir / digest[:2] / f"{digest}.json"
+
+    def _remove(self, path: Path) -> int:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return 0
+        with self._lock:
+            self.size_bytes = max(0, self.size_bytes - size)
+        return size
+
+    def get(self, key: str) -> Optional[Any]:
+        """Restituisce il valore in cache, oppure None se assente o scaduto"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            entry = None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable cache entry {path.name}: {str(e)}")
+            self._remove(path)
+            entry = None
+
+        if entry is not None and entry.get('key') == key and time.time() - entry['created_at'] <= self.ttl:
+            # L'mtime segna l'ultimo accesso ed è il criterio della rimozione LRU
+            os.utime(path)
+            with self._lock:
+                self.hits += 1
+            return entry['value']
+
+        with self._lock:
+            self.misses += 1
+            if entry is not None:
+                self.expired += 1
+        if entry is not None:
+            self._remove(path)
+        return None
+
+    def set(self, key: str, value: Any):
+        """Salva un valore serializzabile in JSON"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'created_at': time.time(), 'value': value}, f, ensure_ascii=False)
+
+        size = tmp_path.stat().st_size
+        previous = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.writes += 1
+            self.size_bytes += size - previous
+            over_limit = self.size_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        """Rimuove le voci scadute e poi quelle usate meno di recente fino a scendere sotto la soglia"""
+        now = time.time()
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        with self._lock:
+            self.size_bytes = sum(size for _, size, _ in entries)
+        # Si scende al 90% della soglia per non ripetere la scansione a ogni scrittura
+        target = self.max_bytes * 0.9
+        removed = 0
+        for mtime, _, path in entries:
+            if self.size_bytes <= target and now - mtime <= self.ttl:
+                break
+            if self._remove(path):
+                removed += 1
+
+        with self._lock:
+            self.evictions += removed
+        if removed:
+            logger.info(f"Evicted {removed} cache entries from {self.cache_dir}")
+
+    def clear(self):
+        """Svuota la cache"""
+        for path in list(self._entries()):
+            self._remove(path)
+
+    def stats(self) -> Dict:
+        """Restituisce hit, miss e occupazione della cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'expired': self.expired,
+                'writes': self.writes,
+                'evictions': self.evictions,
+                'size_bytes': self.size_bytes,
+                'max_bytes': self.max_bytes
+            }
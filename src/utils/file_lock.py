@@ -0,0 +1,13 @@
+import fcntl
+from contextlib import contextmanager
+from typing import Iterator
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Lock esclusivo tra processi su path, tramite il file accanto path.lock (fcntl, solo POSIX)"""
+    with open(f"{path}.lock", 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
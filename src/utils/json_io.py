@@ -0,0 +1,57 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+import zstandard
+
+from config.config import (
+    SNAPSHOT_COMPRESSION,
+    SNAPSHOT_COMPRESSION_LEVEL
+)
+
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+EXTENSIONS = ('.json.zst', '.json')
+
+def json_extension(compression: str = SNAPSHOT_COMPRESSION) -> str:
+    """Estensione dei file scritti con la compressione indicata"""
+    return '.json.zst' if compression == 'zstd' else '.json'
+
+def json_stem(path: Path) -> Optional[str]:
+    """Nome del file senza estensione JSON (compressa o no); None se non è un file JSON"""
+    for extension in EXTENSIONS:
+        if path.name.endswith(extension):
+            return path.name[:-len(extension)]
+    return None
+
+def encode_json(data: Any, compression: str = SNAPSHOT_COMPRESSION, level: int = SNAPSHOT_COMPRESSION_LEVEL) -> bytes:
+    """Serializza in JSON compatto, compresso con zstd se richiesto"""
+    raw = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(raw)
+    return raw
+
+def decode_json(raw: bytes) -> Any:
+    """Deserializza JSON semplice o compresso, riconoscendo il formato dal contenuto"""
+    if raw[:4] == ZSTD_MAGIC:
+        raw = zstandard.ZstdDecompressor().decompress(raw)
+    return json.loads(raw)
+
+def write_json(path: Path, data: Any, compression: str = SNAPSHOT_COMPRESSION) -> int:
+    """Scrive su un file temporaneo e lo rinomina, così i lettori non vedono mai un file parziale"""
+    payload = encode_json(data, compression)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return len(payload)
+
+def read_json(path: Path) -> Any:
+    """Legge un file JSON semplice o compresso con zstd"""
+    with open(path, 'rb') as f:
+        return decode_json(f.read())
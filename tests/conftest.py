@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Rende importabili i pacchetti config e src come in src/main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from src.analyzer import chunking
+from src.analyzer.chunking import chunk_texts, ensure_fits, estimate_tokens, prompt_budget
+
+def engagement_metrics(count):
+    """Metriche nel formato inviato da analyze_engagement: URL, cifre e chiavi JSON"""
+    return [
+        json.dumps({
+            'post_url': f'https://www.tiktok.com/@creator_{i}/video/73{i:017d}',
+            'engagement_rate': 0.0123456789 * i,
+            'rolling_engagement': 0.98765 * i,
+            'metrics': {'likes': 123456 + i, 'comments': 7890 + i, 'shares': 4321 + i}
+        })
+        for i in range(count)
+    ]
+
+@pytest.fixture
+def without_tiktoken(monkeypatch):
+    monkeypatch.setattr(chunking, '_encoding', lambda: None)
+
+def test_fallback_estimate_covers_dense_json(without_tiktoken):
+    text = ', '.join(engagement_metrics(200))
+
+    # JSON con URL e numeri: circa 2,5 caratteri per token reali, la stima non deve scendere sotto
+    assert estimate_tokens(text) >= len(text) / 2.5
+
+def test_ensure_fits_rejects_json_over_the_context(without_tiktoken):
+    prompt = "Analizza le metriche di engagement e fornisci insights strategici."
+    # Appena oltre il contesto a 2,8 caratteri per token: la vecchia stima (4 caratteri) la lasciava passare
+    metrics = engagement_metrics(1000)
+    count = next(n for n in range(len(metrics)) if len(', '.join(metrics[:n])) / 2.8 > prompt_budget(prompt))
+    payload = ', '.join(metrics[:count])
+
+    with pytest.raises(ValueError):
+        ensure_fits(prompt, payload)
+
+def test_chunks_of_json_stay_within_budget(without_tiktoken):
+    chunks = chunk_texts(engagement_metrics(300), 1000, separator=', ')
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 1000 for chunk in chunks)
+
+def test_tiktoken_counts_are_exact_when_available():
+    encoding = chunking._encoding()
+    if encoding is None:
+        pytest.skip("tiktoken or its encoding is not available")
+    text = ', '.join(engagement_metrics(20))
+
+    assert estimate_tokens(text) == len(encoding.encode(text))
@@ -0,0 +1,53 @@
+import os
+import time
+
+from src.utils import disk_cache
+from src.utils.disk_cache import DiskCache
+
+VALUE = 'x' * 200
+
+def entry_size(cache):
+    return cache._path('a').stat().st_size
+
+def age(cache, key, seconds):
+    """Sposta indietro l'ultimo accesso di una voce"""
+    moment = time.time() - seconds
+    os.utime(cache._path(key), (moment, moment))
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), ttl=60)
+    cache.set('a', VALUE)
+    assert cache.get('a') == VALUE
+
+    now = time.time()
+    monkeypatch.setattr(disk_cache.time, 'time', lambda: now + 61)
+
+    assert cache.get('a') is None
+    assert not cache._path('a').exists()
+    assert cache.stats()['expired'] == 1
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=3600)
+    for key, seconds in (('a', 300), ('b', 200), ('c', 100)):
+        cache.set(key, VALUE)
+        age(cache, key, seconds)
+    # La lettura rende 'a' la voce usata più di recente: la più vecchia diventa 'b'
+    assert cache.get('a') == VALUE
+
+    cache.max_bytes = int(entry_size(cache) * 3.5)
+    cache.set('d', VALUE)
+
+    assert [key for key in 'abcd' if cache.get(key) is not None] == ['a', 'c', 'd']
+    assert cache.stats()['evictions'] == 1
+
+def test_size_stays_under_the_cap(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=3600)
+    cache.set('a', VALUE)
+    cache.max_bytes = entry_size(cache) * 10
+
+    for i in range(50):
+        cache.set(f'key-{i:02d}', VALUE)
+
+    on_disk = sum(path.stat().st_size for path in cache._entries())
+    assert on_disk == cache.stats()['size_bytes'] <= cache.max_bytes
+    assert cache.get('key-49') == VALUE
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from src.database.job_queue import DONE, FAILED, LEASED, PENDING, ScrapeJob, ScrapeJobQueue
+
+def make_queue(tmp_path, **kwargs):
+    return ScrapeJobQueue(f"sqlite:///{tmp_path / 'jobs.db'}", **kwargs)
+
+def expire_leases(queue):
+    with queue.Session() as session:
+        session.execute(update(ScrapeJob).values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        session.commit()
+
+def test_claim_leases_each_job_once(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue(['alice', 'bob', 'alice'])
+
+    first, second = queue.claim('worker-1'), queue.claim('worker-2')
+
+    assert {first['username'], second['username']} == {'alice', 'bob'}
+    assert queue.claim('worker-3') is None
+    assert queue.stats() == {LEASED: 2}
+    assert not queue.complete(first['id'], 'worker-2')
+    assert queue.complete(first['id'], 'worker-1')
+    assert queue.stats() == {DONE: 1, LEASED: 1}
+
+def test_expired_lease_is_requeued_and_the_old_owner_loses_it(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue(['alice'])
+    job = queue.claim('worker-1')
+
+    expire_leases(queue)
+    reclaimed = queue.claim('worker-2')
+
+    assert reclaimed['id'] == job['id'] and reclaimed['attempts'] == 2
+    assert not queue.heartbeat(job['id'], 'worker-1')
+    assert not queue.fail(job['id'], 'worker-1', 'late failure')
+    assert queue.heartbeat(job['id'], 'worker-2')
+
+def test_jobs_fail_after_the_last_attempt(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2, retry_delay=0)
+    queue.enqueue(['alice'])
+
+    job = queue.claim('worker-1')
+    assert queue.fail(job['id'], 'worker-1', 'boom')
+    assert queue.stats() == {PENDING: 1}
+    job = queue.claim('worker-1')
+    expire_leases(queue)
+
+    assert queue.claim('worker-1') is None
+    assert queue.stats() == {FAILED: 1}
+    assert queue.open_jobs() == 0
+
+def test_open_jobs_span_cycles(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue(['alice'], cycle='20240101')
+
+    assert queue.stats() == {}
+    assert queue.open_jobs() == 1
+    assert queue.claim('worker-1')['cycle'] == '20240101'
+    assert queue.open_jobs() == 1
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+from src.analyzer.llm_batcher import LLMBatcher
+
+PROMPT = "Classifica il sentiment"
+
+class FakeGPT:
+    """Sostituto di GPT che registra le richieste e risponde con batch_response ai gruppi"""
+
+    def __init__(self, batch_response=None):
+        self.batch_response = batch_response
+        self.calls = []
+
+    async def __call__(self, system_prompt, user_content):
+        self.calls.append((system_prompt, user_content))
+        if system_prompt != PROMPT:
+            return self.batch_response(json.loads(user_content)), {'total_tokens': 10}
+        return f"single:{user_content}", {'total_tokens': 5}
+
+def run(batcher, contents, response_tokens=None):
+    async def submit_all():
+        return await asyncio.gather(*(batcher.submit(PROMPT, content, response_tokens) for content in contents))
+    return asyncio.run(submit_all())
+
+def test_short_answers_share_one_request():
+    gpt = FakeGPT(lambda items: json.dumps({'results': [{'id': item['id'], 'result': item['content'].upper()}
+                                                         for item in items]}))
+    batcher = LLMBatcher(gpt, batch_size=10, max_response_tokens=1024)
+
+    results = run(batcher, ['a', 'b', 'c'], response_tokens=8)
+
+    assert [content for content, _ in results] == ['A', 'B', 'C']
+    assert len(gpt.calls) == 1
+
+def test_truncated_batched_answer_falls_back_to_single_requests():
+    # Risposta interrotta a max_tokens: JSON non valido, nessun risultato decodificabile
+    gpt = FakeGPT(lambda items: '{"results": [{"id": 0, "result": "posi')
+    batcher = LLMBatcher(gpt, batch_size=10, max_response_tokens=1024)
+
+    results = run(batcher, ['a', 'b'], response_tokens=8)
+
+    assert [content for content, _ in results] == ['single:a', 'single:b']
+    assert len(gpt.calls) == 3
+    assert batcher.stats()['fallbacks'] == 2
+
+def test_batches_are_capped_by_the_response_budget():
+    gpt = FakeGPT(lambda items: json.dumps({'results': [{'id': item['id'], 'result': 'ok'} for item in items]}))
+    # 100 token di risposta per elemento (più l'involucro): solo 4 elementi per richiesta
+    batcher = LLMBatcher(gpt, batch_size=10, max_response_tokens=500)
+
+    run(batcher, [str(i) for i in range(8)], response_tokens=100)
+
+    assert [len(json.loads(content)) for _, content in gpt.calls] == [4, 4]
+
+def test_long_answers_are_never_batched():
+    gpt = FakeGPT()
+    batcher = LLMBatcher(gpt, batch_size=10, max_response_tokens=1024, item_response_tokens=1024)
+
+    results = run(batcher, ['a', 'b'])
+
+    assert [content for content, _ in results] == ['single:a', 'single:b']
+    assert batcher.stats()['batched_requests'] == 0
+
+def test_report_analyses_of_several_profiles_share_requests():
+    from src.analyzer.ai_analyzer import AIAnalyzer
+
+    analyzer = AIAnalyzer(use_cache=False)
+    calls = []
+
+    async def client(system_prompt, user_content):
+        calls.append(system_prompt)
+        if 'results' in system_prompt:
+            items = json.loads(user_content)
+            return json.dumps({'results': [{'id': item['id'], 'result': 'ok'} for item in items]}), {}
+        return 'ok', {}
+
+    analyzer.batcher.complete = client
+    profiles = [
+        {
+            'username': f'creator{i}',
+            'posts': [{'url': f'https://www.tiktok.com/@creator{i}/video/{i}', 'description': '@friend #fyp'}],
+            'interactions': {f'https://www.tiktok.com/@creator{i}/video/{i}': {
+                'comments': [{'username': 'fan', 'text': 'bello', 'likes': 1}]
+            }}
+        }
+        for i in range(4)
+    ]
+
+    async def analyze_all():
+        return await asyncio.gather(*(analyzer.analyze_profile_interactions(profile) for profile in profiles))
+    results = asyncio.run(analyze_all())
+
+    assert [result['analysis'] for result in results] == ['ok'] * 4
+    assert len(calls) < len(profiles)
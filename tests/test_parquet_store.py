@@ -0,0 +1,22 @@
+from src.database.parquet_store import ParquetStore
+
+def snapshot():
+    post_url = 'https://www.tiktok.com/@creator/video/1'
+    return {
+        'username': 'creator',
+        'timestamp': '2024-01-31T12:00:00',
+        'profile_info': {'followers': 100},
+        'posts': [{'url': post_url, 'description': '#fyp', 'likes': 10, 'comments': 1, 'shares': 0,
+                   'date': '2024-01-30T00:00:00'}],
+        'interactions': {post_url: {'comments': [{'username': 'fan', 'text': 'ciao', 'likes': 0, 'date': ''}]}}
+    }
+
+def test_partial_writes_are_invisible_to_readers(tmp_path):
+    store = ParquetStore(str(tmp_path))
+    store.write_snapshot(snapshot())
+    partition = tmp_path / 'posts' / 'snapshot_date=20240131' / 'username=creator'
+    # File temporaneo di una scrittura interrotta nella stessa partizione
+    (partition / '.part-0.parquet.123.456.tmp').write_bytes(b'not parquet')
+
+    assert store.read('posts').num_rows == 1
+    assert sorted(path.name for path in partition.iterdir()) == ['.part-0.parquet.123.456.tmp', 'part-0.parquet']
@@ -0,0 +1,24 @@
+import asyncio
+
+import pytest
+
+from src.scraper.rate_limiter import AdaptiveRateLimiter
+
+def test_cancelled_waiter_returns_its_token():
+    limiter = AdaptiveRateLimiter(calls=1, period=10, burst=1)
+
+    async def scenario():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.metrics()['queued'] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(scenario())
+
+    # Senza il rimborso il saldo resterebbe a -1 e il prossimo chiamante attenderebbe due turni
+    assert limiter._tokens > -0.5
+    assert limiter.metrics()['queued'] == 0
+    assert limiter.acquired == 1
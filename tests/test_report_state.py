@@ -0,0 +1,42 @@
+from src.analyzer.report_state import ProfileAggregates
+
+POST_URL = 'https://www.tiktok.com/@creator/video/1'
+
+def snapshot(*texts):
+    return {
+        'username': 'creator',
+        'profile_info': {'followers': 100},
+        'posts': [{'url': POST_URL, 'description': '#fyp', 'likes': 10, 'comments': len(texts), 'shares': 0,
+                   'date': '2024-01-01T00:00:00'}],
+        'interactions': {POST_URL: {'comments': [{'username': 'fan', 'text': text, 'likes': 0} for text in texts]}}
+    }
+
+def ingest(state, profile_data):
+    new_posts, new_comments = state.new_content(profile_data)
+    scores = [0.5] * (len(new_posts) + len(new_comments))
+    state.update(profile_data, new_posts, new_comments, scores)
+    return len(new_posts) + len(new_comments)
+
+def test_concurrent_saves_do_not_count_contents_twice(tmp_path):
+    first = ProfileAggregates.load('creator', str(tmp_path))
+    second = ProfileAggregates.load('creator', str(tmp_path))
+
+    assert ingest(first, snapshot('ciao')) == 2
+    first.save()
+    # Il secondo processo ha caricato lo stato prima del salvataggio: solo il commento nuovo va aggiunto
+    assert ingest(second, snapshot('ciao', 'bello')) == 3
+    second.save()
+
+    merged = ProfileAggregates.load('creator', str(tmp_path))
+    assert merged.sentiment['count'] == 3
+    assert ingest(merged, snapshot('ciao', 'bello')) == 0
+
+def test_seen_comments_expire_with_their_post(tmp_path):
+    state = ProfileAggregates.load('creator', str(tmp_path))
+    ingest(state, snapshot('ciao'))
+    state.comments_seen_at[POST_URL] -= 10 ** 9
+
+    # Uno snapshot senza il post non ne rinnova i commenti visti
+    ingest(state, {'username': 'creator', 'profile_info': {}, 'posts': [], 'interactions': {}})
+
+    assert POST_URL not in state.seen_comments
@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('playwright')
+
+from src.scraper.request_filter import RequestFilter
+
+def response(resource_type, size):
+    return SimpleNamespace(headers={'content-length': str(size)}, request=SimpleNamespace(resource_type=resource_type))
+
+def test_blocked_bytes_are_estimated_from_unfiltered_runs(tmp_path):
+    sizes_path = str(tmp_path / 'resource_sizes.json')
+    unfiltered = RequestFilter(enabled=False, sizes_path=sizes_path)
+    for size in (1000, 3000):
+        unfiltered._record_response(response('image', size))
+    unfiltered.save_sizes()
+
+    # Un processo successivo, con il filtro attivo, stima i byte delle richieste bloccate
+    filtered = RequestFilter(enabled=True, sizes_path=sizes_path)
+    filtered.blocked_resource_types.update({'image': 3, 'font': 2})
+
+    stats = filtered.get_stats()
+    assert stats['estimated_blocked_bytes'] == 6000
+    assert stats['blocked_requests_without_estimate'] == 2
@@ -0,0 +1,56 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from src.database.storage import FileStorage, parse_output_filename
+from src.utils.json_io import write_json
+
+@pytest.mark.parametrize('name, expected', [
+    ('creator_20240131.json', ('snapshots', 'creator', '20240131')),
+    ('creator_20240131_report.json.zst', ('reports', 'creator', '20240131')),
+    ('my_report_20240131.json', ('snapshots', 'my_report', '20240131')),
+    ('my_report_20240131_report.json', ('reports', 'my_report', '20240131')),
+    ('user_12345678_20240131.json', ('snapshots', 'user_12345678', '20240131')),
+    ('user_12345678_20240131_report.json', ('reports', 'user_12345678', '20240131')),
+    ('manifest.json', None),
+    ('notes.txt', None),
+])
+def test_parse_output_filename_with_underscored_usernames(name, expected):
+    assert parse_output_filename(Path(name)) == expected
+
+def test_legacy_report_names_are_told_apart_by_content(tmp_path):
+    report, snapshot = tmp_path / 'creator_report_20240131.json', tmp_path / 'team_report_20240130.json'
+    write_json(report, {'username': 'creator', 'raw_data': {}}, compression='none')
+    write_json(snapshot, {'username': 'team_report', 'posts': []}, compression='none')
+
+    assert parse_output_filename(report) == ('reports', 'creator', '20240131')
+    assert parse_output_filename(snapshot) == ('snapshots', 'team_report', '20240130')
+
+def snapshot(username, day):
+    return {'username': username, 'timestamp': f'2024-01-{day:02d}T12:00:00', 'posts': []}
+
+def test_reports_of_underscored_usernames_do_not_shadow_snapshots(tmp_path):
+    storage = FileStorage(str(tmp_path))
+    storage.save_snapshot(snapshot('my_report', 30))
+    storage.save_report({'username': 'my', 'timestamp': '2024-01-31T12:00:00', 'raw_data': {}})
+
+    rebuilt = FileStorage(str(tmp_path)).rebuild_manifest()['profiles']
+    assert list(rebuilt['my_report']['snapshots']) == ['20240130']
+    assert list(rebuilt['my']['reports']) == ['20240131']
+
+def test_stale_manifest_is_rebuilt(tmp_path):
+    writer, reader = FileStorage(str(tmp_path)), FileStorage(str(tmp_path))
+    writer.save_snapshot(snapshot('creator', 30))
+    writer.save_snapshot(snapshot('creator', 31))
+    assert reader.load_latest_snapshot('creator')['timestamp'].startswith('2024-01-31')
+
+    # Un file sparito dietro l'indice (es. cancellato a mano) fa ricostruire l'indice invece di fallire
+    latest = next(tmp_path.glob('creator_20240131.json*'))
+    os.remove(latest)
+    assert reader.load_latest_snapshot('creator')['timestamp'].startswith('2024-01-30')
+    assert [s['timestamp'][:10] for s in reader.load_snapshots('creator')] == ['2024-01-30']
+
+    # Un indice cancellato viene ricostruito dai file presenti
+    os.remove(tmp_path / 'manifest.json')
+    assert FileStorage(str(tmp_path)).list_profiles() == ['creator']
@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip('playwright')
+
+from src.scraper.stream_harvester import _is_older_than
+
+def test_aware_and_naive_dates_are_compared_in_utc():
+    since = datetime(2024, 1, 31, tzinfo=timezone.utc)
+    older = (since - timedelta(hours=1)).astimezone().replace(tzinfo=None).isoformat()
+    newer = (since + timedelta(hours=1)).astimezone().replace(tzinfo=None).isoformat()
+
+    assert _is_older_than({'date': older}, since)
+    assert not _is_older_than({'date': newer}, since)
+    local_since = datetime(2024, 1, 31)
+    aware_older = (local_since.astimezone() - timedelta(hours=1)).astimezone(timezone.utc).isoformat()
+    assert _is_older_than({'date': aware_older}, local_since)
+    assert not _is_older_than({'date': ''}, since)
@@ -0,0 +1,36 @@
+import time
+
+from src.analyzer.trending import TrendingEngine
+
+def profile(username, count):
+    return {
+        'username': username,
+        'posts': [{'url': f'https://www.tiktok.com/@{username}/video/{i}', 'description': '#fyp @friend'}
+                  for i in range(count)],
+        'interactions': {}
+    }
+
+def test_contents_are_counted_once_across_processes(tmp_path):
+    path = str(tmp_path / 'trending.npz')
+    now = time.time()
+    first, second = TrendingEngine(path, seen_bits=2 ** 16), TrendingEngine(path, seen_bits=2 ** 16)
+
+    assert first.ingest_snapshot(profile('creator', 5), now) == 5
+    assert first.ingest_snapshot(profile('creator', 5), now) == 0
+    first.save()
+    # Il secondo processo non ha visto il salvataggio: al suo salvataggio si conta solo il post nuovo
+    second.ingest_snapshot(profile('creator', 6), now)
+    second.save()
+
+    merged = TrendingEngine.load(path, seen_bits=2 ** 16)
+    assert merged.estimate('#fyp', 86400, now) == 6
+    assert merged.ingest_snapshot(profile('creator', 6), now) == 0
+
+def test_seen_filters_have_a_fixed_size_and_expire(tmp_path):
+    engine = TrendingEngine(str(tmp_path / 'trending.npz'), seen_bits=2 ** 16)
+    now = time.time()
+
+    engine.ingest_snapshot(profile('creator', 1000), now)
+    assert engine.stats()['seen_bytes'] == 2 ** 13
+    # Dopo TRENDING_RETENTION senza comparire i contenuti vengono dimenticati
+    assert engine.ingest_snapshot(profile('creator', 1), now + engine.retention + engine.seen_span) == 1